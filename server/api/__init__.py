@@ -2,9 +2,15 @@ from . import printers
 from . import gcode
 from . import product
 from . import scheduled_print
+from . import spool
+from . import metrics
+from . import analytics
 
 def register_blueprints(app):
     app.register_blueprint(printers.printer_bp)
     app.register_blueprint(gcode.gcode_bp)
     app.register_blueprint(product.product_bp)
-    app.register_blueprint(scheduled_print.scheduled_print_bp)
\ No newline at end of file
+    app.register_blueprint(scheduled_print.scheduled_print_bp)
+    app.register_blueprint(spool.spool_bp)
+    app.register_blueprint(metrics.metrics_bp)
+    app.register_blueprint(analytics.analytics_bp)
\ No newline at end of file
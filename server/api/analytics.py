@@ -0,0 +1,180 @@
+from flask import Blueprint, request, jsonify, abort
+from sqlalchemy import func
+from models import db
+from models.analytics import GRANULARITIES, UsageRollup, QueueWaitRollup, ProductOnTime
+from models.printers import Printer
+from models.product import Product
+from datetime import datetime, timedelta
+
+analytics_bp = Blueprint('analytics', __name__, url_prefix='/analytics')
+
+# Window used when 'from' is not given, and the longest window served.
+DEFAULT_WINDOW = {"hour": timedelta(hours=24), "day": timedelta(days=7)}
+MAX_BUCKETS = {"hour": 24 * 31, "day": 366}
+USAGE_GROUPS = {
+    "printer": UsageRollup.printer_id,
+    "material": UsageRollup.material,
+    "bucket": UsageRollup.bucket_start,
+}
+
+def _window():
+    """
+    (granularity, bucket seconds, start, end) from the query string, with
+    start/end (UTC, ISO format) widened to whole buckets.
+    """
+    granularity = request.args.get("granularity", "day")
+    if granularity not in GRANULARITIES:
+        abort(400, description=f"granularity must be one of {sorted(GRANULARITIES)}")
+    bucket_seconds = GRANULARITIES[granularity]
+
+    try:
+        end = datetime.fromisoformat(request.args["to"]) if request.args.get("to") else datetime.utcnow()
+        start = (datetime.fromisoformat(request.args["from"]) if request.args.get("from")
+                 else end - DEFAULT_WINDOW[granularity])
+    except ValueError:
+        abort(400, description="'from' and 'to' must be in ISO format (YYYY-MM-DDTHH:MM:SS, UTC)")
+
+    epoch = datetime(1970, 1, 1)
+    start_bucket = int((start - epoch).total_seconds() // bucket_seconds)
+    end_bucket = -int(-(end - epoch).total_seconds() // bucket_seconds)
+    if end_bucket <= start_bucket:
+        abort(400, description="'to' must be after 'from'")
+    if end_bucket - start_bucket > MAX_BUCKETS[granularity]:
+        abort(400, description=f"At most {MAX_BUCKETS[granularity]} {granularity} buckets per request")
+    return (granularity, bucket_seconds,
+            epoch + timedelta(seconds=start_bucket * bucket_seconds),
+            epoch + timedelta(seconds=end_bucket * bucket_seconds))
+
+def _elapsed(start, end):
+    """Seconds of the window that have already happened."""
+    return max((min(end, datetime.utcnow()) - start).total_seconds(), 0.0)
+
+def _ratio(part, whole):
+    return round(part / whole, 4) if whole else None
+
+@analytics_bp.route('/utilization', methods=['GET'])
+def get_utilization():
+    """
+    Share of time printers spent printing, from the hourly/daily rollups.
+
+    Query parameters:
+       granularity - "hour" or "day" (default "day")
+       from, to    - UTC window (ISO format); default the last 24 hours / 7 days
+       group_by    - "printer" (default), "material" or "bucket"
+
+    Per printer, utilization is busy time over the elapsed window. Per
+    material and per bucket it is busy time over the whole fleet's capacity
+    (printer count x time).
+    """
+    granularity, bucket_seconds, start, end = _window()
+    group_by = request.args.get("group_by", "printer")
+    if group_by not in USAGE_GROUPS:
+        abort(400, description=f"group_by must be one of {sorted(USAGE_GROUPS)}")
+    column = USAGE_GROUPS[group_by]
+
+    rows = (
+        db.session.query(column, func.sum(UsageRollup.busy_seconds), func.sum(UsageRollup.jobs))
+        .filter(UsageRollup.granularity == granularity,
+                UsageRollup.bucket_start >= start,
+                UsageRollup.bucket_start < end)
+        .group_by(column)
+        .order_by(column)
+        .all()
+    )
+    elapsed = _elapsed(start, end)
+    fleet = Printer.query.count()
+
+    groups = []
+    if group_by == "printer":
+        names = dict(Printer.query.with_entities(Printer.printer_id, Printer.printer_name))
+        for printer_id, busy, jobs in rows:
+            groups.append({"printer_id": printer_id, "printer_name": names.get(printer_id),
+                           "busy_seconds": round(busy, 1), "jobs": int(jobs),
+                           "utilization": _ratio(busy, elapsed)})
+    elif group_by == "material":
+        for material, busy, jobs in rows:
+            groups.append({"material": material, "busy_seconds": round(busy, 1), "jobs": int(jobs),
+                           "utilization": _ratio(busy, fleet * elapsed)})
+    else:
+        for bucket_start, busy, jobs in rows:
+            capacity = fleet * _elapsed(bucket_start, bucket_start + timedelta(seconds=bucket_seconds))
+            groups.append({"bucket_start": bucket_start.isoformat(), "busy_seconds": round(busy, 1),
+                           "jobs": int(jobs), "utilization": _ratio(busy, capacity)})
+
+    busy_total = sum(busy for _, busy, _ in rows)
+    return jsonify({
+        "granularity": granularity,
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "elapsed_seconds": elapsed,
+        "printers": fleet,
+        "fleet_utilization": _ratio(busy_total, fleet * elapsed),
+        "group_by": group_by,
+        "groups": groups,
+    }), 200
+
+@analytics_bp.route('/queue_wait', methods=['GET'])
+def get_queue_wait():
+    """
+    Average time scheduled prints waited between becoming ready (created and
+    due) and starting, bucketed by start time.
+
+    Query parameters: granularity, from, to (as for /analytics/utilization).
+    """
+    granularity, _, start, end = _window()
+    rows = (
+        QueueWaitRollup.query
+        .filter(QueueWaitRollup.granularity == granularity,
+                QueueWaitRollup.bucket_start >= start,
+                QueueWaitRollup.bucket_start < end)
+        .order_by(QueueWaitRollup.bucket_start)
+        .all()
+    )
+    wait_total = sum(r.wait_seconds for r in rows)
+    jobs_total = sum(r.jobs for r in rows)
+    return jsonify({
+        "granularity": granularity,
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "jobs": jobs_total,
+        "average_wait_seconds": round(wait_total / jobs_total, 1) if jobs_total else None,
+        "buckets": [
+            {"bucket_start": r.bucket_start.isoformat(), "jobs": r.jobs,
+             "average_wait_seconds": round(r.wait_seconds / r.jobs, 1) if r.jobs else None}
+            for r in rows
+        ],
+    }), 200
+
+@analytics_bp.route('/on_time', methods=['GET'])
+def get_on_time():
+    """
+    Share of each product's completed scheduled prints that finished by their
+    deadline. Optional query parameter: product_id.
+    """
+    query = (
+        db.session.query(ProductOnTime, Product.product_name)
+        .join(Product, Product.product_id == ProductOnTime.product_id)
+    )
+    product_id = request.args.get("product_id", type=int)
+    if product_id is not None:
+        query = query.filter(ProductOnTime.product_id == product_id)
+
+    products = [
+        {"product_id": row.product_id, "product_name": name, "completed": row.completed,
+         "on_time": row.on_time, "on_time_rate": _ratio(row.on_time, row.completed)}
+        for row, name in query.order_by(ProductOnTime.product_id)
+    ]
+    return jsonify({"products": products}), 200
+
+@analytics_bp.route('/refresh', methods=['POST'])
+def refresh_analytics():
+    """Fold new history into the rollups now instead of waiting for the refresher."""
+    from services import analytics
+
+    try:
+        counts = analytics.refresh()
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    if counts is None:
+        return jsonify({"message": "A refresh is already running."}), 409
+    return jsonify({"processed": counts}), 200
@@ -1,11 +1,13 @@
-from flask import Blueprint, request, jsonify, abort
+from flask import Blueprint, request, jsonify, abort, current_app
 from models.printers import Printer
 from models.gcode import Gcode
+from models.gcode_store import GcodeBlob, GcodePlacement
 from models import db
+from services import metadata_cache
 from datetime import datetime, timedelta
 import json
+import os
 import random
-import requests
 
 gcode_bp = Blueprint('gcode', __name__, url_prefix='/gcode')
 
@@ -33,13 +35,16 @@ def combined_bulk_fetch_and_history(printer_ip):
     """
     Combined bulk endpoint:
     - Deletes existing Gcode records for the printer.
-    - Uses HTTP GET requests to fetch the list of Gcode files from the printer.
-    - Uses HTTP GET requests to fetch printer job history.
-    - For each file, retrieves metadata via HTTP GET (e.g., estimated_time, filament_total, filament_type)
+    - Fetches the list of Gcode files from the printer (Moonraker JSON-RPC websocket
+      or HTTP, see services.moonraker_rpc) and pulls new jobs into print_jobs.
+    - For each file, retrieves metadata (e.g., estimated_time, filament_total, filament_type)
       and looks up the historical print time from the job history (if any).
     - Creates complete Gcode objects and bulk-inserts them into the database.
     - Returns a combined JSON response with both added and updated records.
     """
+    # Moonraker client is only needed once a sync actually runs.
+    from services import moonraker_rpc, job_history
+
     # 1. Look up the printer by its IP.
     printer = Printer.query.filter_by(ip_address=printer_ip).first()
     if not printer:
@@ -50,49 +55,54 @@ def combined_bulk_fetch_and_history(printer_ip):
     db.session.commit()
     print(f"Deleted {deleted} existing gcodes for printer {printer_ip}.")
 
-    # 3. Build the base URL for HTTP endpoints.
-    base_url = f"http://{printer.ip_address}:{printer.port}/server"
-
-    # 4. Fetch the list of Gcode files via HTTP GET.
+    # 3. Fetch the list of Gcode files.
     try:
-        response_list = requests.get(f"{base_url}/files/list", params={"root": "gcodes"}, timeout=5)
-        response_list.raise_for_status()
-    except Exception as e:
+        file_list = moonraker_rpc.call(printer.ip_address, printer.port, "server.files.list",
+                                       {"root": "gcodes"}, timeout=5)
+    except moonraker_rpc.MoonrakerError as e:
         return jsonify({"error": f"Error connecting to printer for file list: {str(e)}"}), 500
 
-    data = response_list.json()
-    if "result" not in data:
+    # 4. Check the file list.
+    if not isinstance(file_list, list):
         return jsonify({"error": "Invalid response from printer for file list"}), 500
 
-    file_list = data["result"]
-
-    # 5. Fetch printer job history via HTTP GET.
+    # 5. Bring the local job archive up to date (only jobs newer than the
+    #    printer's cursor are pulled) and read historical durations from it.
     try:
-        response_history = requests.get(f"{base_url}/history/list", params={"limit": 50, "start": 10, "order": "asc"}, timeout=10)
-        response_history.raise_for_status()
-    except Exception as e:
+        job_history.ingest_printer(printer.printer_id, printer.ip_address, printer.port)
+    except moonraker_rpc.MoonrakerError as e:
+        db.session.rollback()
         return jsonify({"error": f"Error connecting to printer history: {str(e)}"}), 500
 
-    history_data = response_history.json()
-    if "result" not in history_data or "jobs" not in history_data["result"]:
-        return jsonify({"error": "Invalid history response from printer"}), 500
+    durations = job_history.latest_durations(printer.printer_id)
 
-    jobs = history_data["result"]["jobs"]
+    # 6. Resolve metadata: files whose (path, modified, size) match the persistent
+    #    cache skip the network; only new or changed files hit /files/metadata,
+    #    pipelined on one connection when the websocket is enabled.
+    cached_metadata, stale_files = metadata_cache.load_cached_metadata(printer.printer_id, file_list)
+    hit_paths = list(cached_metadata)
+    fetched = []
+    responses = moonraker_rpc.call_many(
+        printer.ip_address, printer.port,
+        [("server.files.metadata", {"filename": f["path"]}) for f in stale_files],
+        timeout=5
+    )
+    for file_info, result in zip(stale_files, responses):
+        if isinstance(result, moonraker_rpc.MoonrakerError) or not isinstance(result, dict):
+            print(f"Error fetching metadata for {file_info['path']}: {result}")
+            result = {}
+        else:
+            fetched.append((file_info, result))
+        cached_metadata[file_info["path"]] = result
 
-    # 6. Process each file: for each file in the file list, fetch metadata via HTTP GET and then match with job history.
+    # 7. Process each file and match it with job history.
     new_gcodes = []
     for file_info in file_list:
         file_path = file_info.get("path")
         if not file_path:
             continue
 
-        try:
-            response_metadata = requests.get(f"{base_url}/files/metadata", params={"filename": file_path}, timeout=5)
-            response_metadata.raise_for_status()
-            result = response_metadata.json().get("result", {})
-        except Exception as e:
-            print(f"Error fetching metadata for {file_path}: {e}")
-            result = {}
+        result = cached_metadata.get(file_path, {})
 
         # Process metadata.
         est_print_time = (
@@ -107,19 +117,11 @@ def combined_bulk_fetch_and_history(printer_ip):
         )
         material = result['filament_type'] if 'filament_type' in result else "unknown"
 
-        # Look up matching completed jobs for this gcode (by filename) to determine historical_print_time.
+        # The latest completed job for this gcode (by filename) gives historical_print_time.
         historical_print_time = None
-        matching_jobs = [
-            job for job in jobs
-            if job.get("filename") == file_path
-            and job.get("status") == "completed"
-            and job.get("end_time") is not None
-        ]
-        if matching_jobs:
-            latest_job = max(matching_jobs, key=lambda j: j.get("end_time", 0))
-            total_duration = latest_job.get("total_duration")
-            if total_duration is not None and total_duration != "":
-                historical_print_time = timedelta(seconds=int(total_duration))
+        total_duration = durations.get(file_path)
+        if total_duration is not None:
+            historical_print_time = timedelta(seconds=int(total_duration))
 
         # Create a new Gcode record.
         new_gcode = Gcode(
@@ -132,9 +134,16 @@ def combined_bulk_fetch_and_history(printer_ip):
         )
         new_gcodes.append(new_gcode)
 
-    # 7. Bulk insert new Gcode records.
+    # 8. Bulk insert new Gcode records and record the metadata cache outcome.
     try:
         db.session.bulk_save_objects(new_gcodes)
+        metadata_cache.store_metadata(
+            printer.printer_id,
+            fetched,
+            hit_paths,
+            [f["path"] for f in file_list if f.get("path")]
+        )
+        metadata_cache.prune()
         db.session.commit()
     except Exception as e:
         db.session.rollback()
@@ -143,5 +152,137 @@ def combined_bulk_fetch_and_history(printer_ip):
     inserted = [g.to_dict() for g in new_gcodes]
     return jsonify({
         "added": inserted,
-        "total_files_found": len(file_list)
+        "total_files_found": len(file_list),
+        "metadata_fetched": len(stale_files),
+        "metadata_cached": len(file_list) - len(stale_files)
     }), 200
+
+@gcode_bp.route('/metadata_cache', methods=['GET'])
+def metadata_cache_stats():
+    """Hit/miss counters and table size for the gcode metadata cache."""
+    return jsonify(metadata_cache.summary()), 200
+
+@gcode_bp.route('/store', methods=['POST'])
+def store_gcode():
+    """
+    Add a gcode file to the central store. Accepts a multipart upload
+    (field "file") or a raw body with ?filename=. The content is streamed to
+    disk while hashing; storing identical content again returns the existing
+    entry with 200 instead of 201.
+    """
+    from services.gcode_store import get_distribution_manager
+
+    upload = request.files.get("file")
+    if upload is not None:
+        filename, stream = upload.filename, upload.stream
+    else:
+        filename, stream = request.args.get("filename"), request.stream
+    filename = os.path.basename(filename or "")
+    if not filename:
+        abort(400, description="A gcode file and filename are required")
+
+    store = get_distribution_manager(current_app._get_current_object()).store
+    digest, size = store.ingest(stream)
+    if size == 0:
+        abort(400, description="Uploaded file is empty")
+
+    blob = GcodeBlob.query.get(digest)
+    if blob is not None:
+        return jsonify(blob.to_dict()), 200
+    blob = GcodeBlob(content_hash=digest, filename=filename, size=size, created_at=datetime.utcnow())
+    db.session.add(blob)
+    try:
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+    return jsonify(blob.to_dict()), 201
+
+@gcode_bp.route('/store', methods=['GET'])
+def list_stored_gcodes():
+    """Stored gcodes with the printers each one has been distributed to."""
+    placements = {}
+    for p in GcodePlacement.query.all():
+        placements.setdefault(p.content_hash, []).append(p.to_dict())
+    return jsonify([
+        dict(b.to_dict(), placements=placements.get(b.content_hash, []))
+        for b in GcodeBlob.query.order_by(GcodeBlob.created_at.desc())
+    ]), 200
+
+@gcode_bp.route('/store/<string:content_hash>/distribute', methods=['POST'])
+def distribute_gcode(content_hash):
+    """
+    Upload a stored gcode to many printers concurrently. Returns 202 with a
+    distribution id; poll GET /gcode/distributions/<id> for per-printer progress.
+
+    Sample JSON payload:
+    {
+      "printers": [1, 2, "192.168.1.50"],   // ids and/or IP addresses
+      "path": "parts",                      // optional subdirectory under gcodes
+      "concurrency": 8,
+      "force": false                        // re-upload to printers that already hold it
+    }
+
+    A printer is skipped only if this store placed the same content at the same
+    path there; a file that merely shares its name and size is replaced.
+    """
+    from services.gcode_store import get_distribution_manager, DEFAULT_CONCURRENCY
+    from services.printer_commands import MAX_CONCURRENCY
+
+    blob = GcodeBlob.query.get(content_hash)
+    if blob is None:
+        return jsonify({"error": f"No stored gcode with hash {content_hash}"}), 404
+
+    data = request.get_json() or {}
+    selectors = data.get("printers")
+    if not isinstance(selectors, list) or not selectors:
+        abort(400, description="'printers' must be a non-empty list of ids or IP addresses")
+    path = (data.get("path") or "").strip("/")
+    if ".." in path.split("/"):
+        abort(400, description="Invalid path")
+    try:
+        concurrency = max(1, min(int(data.get("concurrency", DEFAULT_CONCURRENCY)), MAX_CONCURRENCY))
+    except (TypeError, ValueError):
+        abort(400, description="concurrency must be an integer")
+
+    ids = [s for s in selectors if isinstance(s, int) and not isinstance(s, bool)]
+    ips = [s for s in selectors if isinstance(s, str)]
+    printers = Printer.query.filter(
+        db.or_(Printer.printer_id.in_(ids), Printer.ip_address.in_(ips))
+    ).all()
+    found = {p.printer_id for p in printers} | {p.ip_address for p in printers}
+    missing = [s for s in selectors if isinstance(s, bool) or s not in found]
+    if missing:
+        return jsonify({"error": f"Unknown printers: {missing}"}), 404
+
+    remote = f"{path}/{blob.filename}" if path else blob.filename
+    skip = []
+    if not data.get("force"):
+        skip = [
+            pid for (pid,) in db.session.query(GcodePlacement.printer_id).filter(
+                GcodePlacement.content_hash == content_hash,
+                GcodePlacement.path == remote,
+                GcodePlacement.printer_id.in_([p.printer_id for p in printers])
+            )
+        ]
+
+    manager = get_distribution_manager(current_app._get_current_object())
+    if not manager.store.exists(content_hash):
+        return jsonify({"error": f"File for {content_hash} is missing from the store"}), 410
+    targets = [
+        {"printer_id": p.printer_id, "ip_address": p.ip_address, "port": p.port}
+        for p in printers
+    ]
+    dist = manager.start(blob, targets, path=path, skip_printers=skip, concurrency=concurrency,
+                         force=bool(data.get("force")))
+    return jsonify(dist.to_dict()), 202
+
+@gcode_bp.route('/distributions/<string:distribution_id>', methods=['GET'])
+def distribution_progress(distribution_id):
+    """Per-printer state (pending/skipped/uploading/done/failed) and bytes sent."""
+    from services.gcode_store import get_distribution_manager
+
+    dist = get_distribution_manager(current_app._get_current_object()).get(distribution_id)
+    if dist is None:
+        return jsonify({"error": f"Distribution {distribution_id} not found"}), 404
+    return jsonify(dist.to_dict()), 200
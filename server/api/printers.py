@@ -1,15 +1,21 @@
-from flask import Blueprint, request, jsonify, abort
+from flask import Blueprint, request, jsonify, abort, Response, current_app
 from models.printers import Printer
 from models import db
 from datetime import datetime
 import csv
 from io import StringIO
-import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from services import metrics
 
 printer_bp = Blueprint('printer', __name__, url_prefix='/printers')
 
 # Global dictionary to store active HTTPPoller instances keyed by printer IP.
 printerPollers = {}
+metrics.gauge("printer_pollers_active", "HTTP pollers running in this process.", lambda: len(printerPollers))
+
+POLL_INTERVAL = 2
+# Upper bound on simultaneous connectivity checks when restoring connections.
+RESTORE_CONCURRENCY = 64
 
 def _parse_bool(val):
     """Utility to parse various boolean representations."""
@@ -19,6 +25,80 @@ def _parse_bool(val):
         return val.strip().lower() in ('1', 'true', 'yes', 'y', 't')
     return False
 
+def _check_printer(ip, port, timeout=2):
+    """Raise if the printer's Moonraker API does not answer."""
+    from services import moonraker_rpc  # loaded on first use to keep imports light
+    moonraker_rpc.call(ip, port, "server.files.list", {"root": "gcodes"}, timeout=timeout)
+
+def _start_poller(printer):
+    """Start (or reuse) the HTTPPoller for a printer and register it."""
+    # Lazy import to avoid startup-time circulars
+    from http_poller import HTTPPoller, update_printer_status_callback
+
+    poller = printerPollers.get(printer.ip_address)
+    if poller is None:
+        poller = HTTPPoller(
+            printer,
+            poll_interval=POLL_INTERVAL,
+            request_method="GET",
+            callback=update_printer_status_callback
+        )
+        poller.start()
+        printerPollers[printer.ip_address] = poller
+    return poller
+
+def attach_printers(app, printers, max_workers=RESTORE_CONCURRENCY):
+    """
+    Run connectivity checks for detached Printer instances concurrently and
+    start each poller as soon as its printer answers. Statuses are written
+    back with one UPDATE per outcome. Returns the ids that were attached.
+    """
+    if not printers:
+        return []
+
+    def check(printer):
+        try:
+            _check_printer(printer.ip_address, printer.port)
+            return printer, True
+        except Exception:
+            return printer, False
+
+    online, offline = [], []
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(printers))) as pool:
+        for future in as_completed([pool.submit(check, p) for p in printers]):
+            printer, reachable = future.result()
+            if reachable:
+                printer.status = "online"
+                _start_poller(printer)
+                online.append(printer.printer_id)
+            else:
+                printer.status = "offline"
+                offline.append(printer.printer_id)
+
+    with app.app_context():
+        for status, ids in (("online", online), ("offline", offline)):
+            if ids:
+                Printer.query.filter(Printer.printer_id.in_(ids)).update(
+                    {"status": status}, synchronize_session=False
+                )
+        db.session.commit()
+    return online
+
+def restore_printer_connections(app, max_workers=RESTORE_CONCURRENCY):
+    """
+    Re-attach every printer flagged with auto_connect. Connectivity checks run
+    concurrently and each poller starts as soon as its printer answers, so
+    telemetry comes back within roughly one check timeout plus one poll
+    interval regardless of farm size. Meant to run in a background thread.
+    """
+    with app.app_context():
+        printers = Printer.query.filter_by(auto_connect=True).all()
+        # Detach with attributes loaded; pollers keep these instances.
+        db.session.expunge_all()
+    online = attach_printers(app, printers, max_workers)
+    if printers:
+        print(f"[Startup] Restored {len(online)} printer connection(s); {len(printers) - len(online)} unreachable.")
+
 @printer_bp.route('/', methods=['GET'])
 def get_printers():
     printers = Printer.query.all()
@@ -142,29 +222,22 @@ def connect_printer():
 
     # Connectivity check
     try:
-        test_url = f"http://{ip}:{printer.port}/server/files/list"
-        resp = requests.get(test_url, params={"root": "gcodes"}, timeout=2)
-        resp.raise_for_status()
+        _check_printer(ip, printer.port)
         printer.status = "online"
     except Exception as e:
         printer.status = "offline"
         db.session.commit()
         return jsonify({"error": f"Printer unreachable: {e}"}), 500
 
-    # Lazy import to avoid startup-time circulars
-    from http_poller import HTTPPoller, update_printer_status_callback
-
-    if ip in printerPollers:
-        poller = printerPollers[ip]
+    printer.auto_connect = True
+    from services.poller_leases import get_lease_manager
+    lease_manager = get_lease_manager()
+    if lease_manager is None:
+        _start_poller(printer)
     else:
-        poller = HTTPPoller(
-            printer,
-            poll_interval=2,
-            request_method="GET",
-            callback=update_printer_status_callback
-        )
-        poller.start()
-        printerPollers[ip] = poller
+        # Scale-out mode: the poller runs here only if this worker wins the
+        # lease; otherwise another worker is already polling the printer.
+        lease_manager.try_acquire(printer)
 
     db.session.commit()
     return jsonify({
@@ -189,8 +262,11 @@ def disconnect_printer():
     poller = printerPollers.pop(ip, None)
     if poller:
         poller.stop()
+    from services import moonraker_rpc
+    moonraker_rpc.close(ip)
 
     printer.status = "disconnected"
+    printer.auto_connect = False
     db.session.commit()
     return jsonify({"message": "Printer disconnected successfully."}), 200
 
@@ -314,9 +390,7 @@ def update_printers_status():
     updated = []
     for p in printers:
         try:
-            url = f"http://{p.ip_address}:{p.port}/server/files/list"
-            res = requests.get(url, params={"root": "gcodes"}, timeout=2)
-            res.raise_for_status()
+            _check_printer(p.ip_address, p.port)
             p.status = "online"
         except Exception:
             p.status = "offline"
@@ -328,3 +402,201 @@ def update_printers_status():
         db.session.rollback()
 
     return jsonify({"printers_status": updated}), 200
+
+# Printer statuses that count as "idle" in command filters.
+IDLE_STATUSES = ("online", "standby", "complete", "cancelled")
+
+def _command_targets(data):
+    """
+    Resolve the printers a bulk command applies to, from either
+    "printers" (ids and/or IP addresses) or "filter" ({status, material,
+    model}); "status": "idle" expands to IDLE_STATUSES.
+    """
+    query = Printer.query.with_entities(
+        Printer.printer_id, Printer.ip_address, Printer.port, Printer.supported_materials
+    )
+    if "printers" in data:
+        selectors = data["printers"]
+        if not isinstance(selectors, list) or not selectors:
+            abort(400, description="'printers' must be a non-empty list of ids or IP addresses")
+        # bool is an int subclass, but true/false are not printer ids.
+        ids = [s for s in selectors if isinstance(s, int) and not isinstance(s, bool)]
+        ips = [s for s in selectors if isinstance(s, str)]
+        rows = query.filter(db.or_(Printer.printer_id.in_(ids), Printer.ip_address.in_(ips))).all()
+        found = {r.printer_id for r in rows} | {r.ip_address for r in rows}
+        missing = [s for s in selectors if isinstance(s, bool) or s not in found]
+        if missing:
+            abort(404, description=f"Unknown printers: {missing}")
+        return rows
+
+    filters = data.get("filter")
+    if not isinstance(filters, dict):
+        abort(400, description="Provide either 'printers' or 'filter'")
+    status = filters.get("status")
+    if status is not None:
+        statuses = status if isinstance(status, list) else [status]
+        if "idle" in statuses:
+            statuses = [s for s in statuses if s != "idle"] + list(IDLE_STATUSES)
+        query = query.filter(Printer.status.in_(statuses))
+    if filters.get("model"):
+        query = query.filter(Printer.printer_model == filters["model"])
+    rows = query.all()
+    material = (filters.get("material") or "").strip().upper()
+    if material:
+        rows = [
+            r for r in rows
+            if material in [m.strip().upper() for m in (r.supported_materials or "").split(",")]
+        ]
+    return rows
+
+@printer_bp.route('/commands', methods=['POST'])
+def bulk_printer_command():
+    """
+    Send one job-control command to many printers concurrently.
+
+    Sample JSON payload:
+    {
+      "command": "pause",                   // start|pause|resume|cancel|emergency_stop|gcode
+      "printers": [1, 2, "192.168.1.50"],   // or "filter": {"status": "idle", "material": "PLA", "model": "..."}
+      "filename": "part.gcode",             // required for start
+      "script": "M104 S0",                  // required for gcode
+      "timeout": 5,                         // per-printer seconds
+      "concurrency": 32,
+      "stream": false                       // true: NDJSON lines as each printer answers
+    }
+    """
+    from services.printer_commands import (
+        COMMANDS, DEFAULT_TIMEOUT, MIN_TIMEOUT, MAX_TIMEOUT, MAX_CONCURRENCY, fan_out
+    )
+
+    data = request.get_json()
+    if not data:
+        abort(400, description="No input data provided")
+    command = data.get("command")
+    if command not in COMMANDS:
+        abort(400, description=f"Unknown command '{command}'; expected one of {sorted(COMMANDS)}")
+    params = {}
+    for name in COMMANDS[command]["params"]:
+        if not data.get(name):
+            abort(400, description=f"Command '{command}' requires '{name}'")
+        params[name] = data[name]
+    try:
+        timeout = max(MIN_TIMEOUT, min(float(data.get("timeout", DEFAULT_TIMEOUT)), MAX_TIMEOUT))
+        concurrency = max(1, min(int(data.get("concurrency", MAX_CONCURRENCY)), MAX_CONCURRENCY))
+    except (TypeError, ValueError):
+        abort(400, description="timeout and concurrency must be numbers")
+
+    targets = [
+        {"printer_id": r.printer_id, "ip_address": r.ip_address, "port": r.port}
+        for r in _command_targets(data)
+    ]
+    results = fan_out(targets, command, params, timeout, concurrency)
+
+    if _parse_bool(data.get("stream", False)):
+        import json
+        # The fan-out needs no database; don't hold a pooled connection while
+        # it streams (up to ceil(n / concurrency) * timeout seconds).
+        db.session.remove()
+        return Response(
+            (json.dumps(r) + "\n" for r in results),
+            mimetype="application/x-ndjson",
+            headers={"X-Accel-Buffering": "no"}
+        )
+
+    results = sorted(results, key=lambda r: r["printer_id"])
+    succeeded = sum(1 for r in results if r["ok"])
+    return jsonify({
+        "command": command,
+        "targets": len(results),
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        "results": results,
+    }), 200
+
+@printer_bp.route('/<string:ip_address>/webcam', methods=['GET'])
+def printer_webcam_stream(ip_address):
+    """
+    Proxied MJPEG stream for a printer camera. All viewers share one upstream
+    connection, frames are downscaled once (to camera_resolution_width/height,
+    then by camera_scaling_factor), and slow viewers skip to the newest frame
+    instead of buffering.
+    """
+    printer = Printer.query.filter_by(ip_address=ip_address).first()
+    if not printer:
+        return jsonify({"error": f"Printer with IP {ip_address} not found"}), 404
+
+    from services.webcam_proxy import webcam_proxy, BOUNDARY
+    stream = webcam_proxy.mjpeg(printer)
+    # The stream can stay open for hours: give the pooled DB connection back
+    # now instead of holding the request's session until the viewer leaves.
+    db.session.remove()
+    return Response(
+        stream,
+        mimetype=f"multipart/x-mixed-replace; boundary={BOUNDARY}",
+        headers={"Cache-Control": "no-cache, no-store", "X-Accel-Buffering": "no"}
+    )
+
+@printer_bp.route('/webcams', methods=['GET'])
+def webcam_proxy_stats():
+    """Viewer and frame counts for the currently open camera streams."""
+    from services.webcam_proxy import webcam_proxy
+    return jsonify(webcam_proxy.stats()), 200
+
+@printer_bp.route('/socket_clients', methods=['GET'])
+def socket_client_stats():
+    """Outbound buffering counters: delivered, replaced, merged, dropped and deferred updates."""
+    from services.outbox import outbox
+    return jsonify(outbox.stats()), 200
+
+@printer_bp.route('/snapshots', methods=['GET'])
+def printer_snapshots():
+    """
+    Cached webcam thumbnails for the farm overview.
+
+    Default: JSON index {ip: {"etag", "captured_at", "url"}}.
+    ?format=multipart: every thumbnail in one multipart/mixed response, each
+    part carrying X-Printer-Ip and ETag headers. The response ETag covers all
+    parts, so If-None-Match returns 304 until any thumbnail changes.
+    """
+    from services.webcam_snapshots import get_snapshot_sampler
+    entries = get_snapshot_sampler(current_app._get_current_object()).cache.snapshot()
+
+    if request.args.get("format") != "multipart":
+        return jsonify({
+            ip: {
+                "etag": e["etag"],
+                "captured_at": datetime.utcfromtimestamp(e["captured_at"]).isoformat(),
+                "url": f"{printer_bp.url_prefix}/snapshots/{ip}",
+            }
+            for ip, e in entries.items()
+        }), 200
+
+    import hashlib
+    ordered = sorted(entries.items())
+    etag = hashlib.sha1("".join(ip + e["etag"] for ip, e in ordered).encode()).hexdigest()[:16]
+    if etag in request.if_none_match:
+        return Response(status=304, headers={"ETag": f'"{etag}"'})
+
+    boundary = "snapshot"
+    body = b"".join(
+        (
+            f"--{boundary}\r\nContent-Type: image/jpeg\r\nX-Printer-Ip: {ip}\r\n"
+            f"ETag: \"{e['etag']}\"\r\nContent-Length: {len(e['image'])}\r\n\r\n"
+        ).encode() + e["image"] + b"\r\n"
+        for ip, e in ordered
+    ) + f"--{boundary}--\r\n".encode()
+    return Response(body, mimetype=f"multipart/mixed; boundary={boundary}",
+                    headers={"ETag": f'"{etag}"', "Cache-Control": "no-cache"})
+
+@printer_bp.route('/snapshots/<string:ip_address>', methods=['GET'])
+def printer_snapshot(ip_address):
+    """A single cached thumbnail as image/jpeg, with ETag / If-None-Match support."""
+    from services.webcam_snapshots import get_snapshot_sampler
+    entry = get_snapshot_sampler(current_app._get_current_object()).cache.get(ip_address)
+    if entry is None:
+        return jsonify({"error": f"No snapshot available for {ip_address}"}), 404
+
+    if entry["etag"] in request.if_none_match:
+        return Response(status=304, headers={"ETag": f'"{entry["etag"]}"'})
+    return Response(entry["image"], mimetype="image/jpeg",
+                    headers={"ETag": f'"{entry["etag"]}"', "Cache-Control": "no-cache"})
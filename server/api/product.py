@@ -1,4 +1,5 @@
-from flask import Blueprint, request, jsonify, abort
+import os
+from flask import Blueprint, request, jsonify, abort, current_app
 from models.product import Product, ProductComponent
 from models.gcode import Gcode
 from models import db
@@ -225,3 +226,64 @@ def update_product(product_id):
         abort(400, description=str(e))
 
     return jsonify(product.to_dict()), 200
+
+_analysis_cache = None
+
+def _get_analysis_cache():
+    global _analysis_cache
+    if _analysis_cache is None:
+        from services.gcode_analyzer import AnalysisCache
+        _analysis_cache = AnalysisCache(current_app.config.get("GCODE_ANALYSIS_CACHE"))
+    return _analysis_cache
+
+def _resolve_gcode_path(file_path):
+    """Absolute path for a component file_path, or None if it escapes GCODE_ROOT."""
+    root = os.path.realpath(current_app.config.get("GCODE_ROOT", "."))
+    path = os.path.realpath(os.path.join(root, file_path))
+    if os.path.commonpath([root, path]) != root:
+        return None
+    return path
+
+@product_bp.route('/<int:product_id>/analysis', methods=['GET'])
+def analyze_product_gcodes(product_id):
+    """
+    Analyze the local gcode file behind each component's file_path: slicer
+    settings, material, total extrusion, layer count, max temperatures and a
+    kinematic time estimate. Results are cached by file content hash, and
+    uncached files in the batch are scanned in parallel processes.
+
+    Pass ?settings=true to include the raw slicer settings.
+    """
+    product = Product.query.get(product_id)
+    if not product:
+        abort(404, description="Product not found.")
+
+    from services.gcode_analyzer import analyze_many
+
+    paths, components = {}, []
+    for component in product.components:
+        entry = {"id": component.id, "component_name": component.component_name,
+                 "file_path": component.file_path}
+        if not component.file_path:
+            entry["error"] = "Component has no file_path"
+        else:
+            path = _resolve_gcode_path(component.file_path)
+            if path is None:
+                entry["error"] = "file_path is outside GCODE_ROOT"
+            else:
+                paths[component.id] = path
+        components.append(entry)
+
+    results = analyze_many(sorted(set(paths.values())), cache=_get_analysis_cache())
+    include_settings = request.args.get("settings", "").lower() in ("1", "true", "yes")
+    for entry in components:
+        path = paths.get(entry["id"])
+        if path is None:
+            continue
+        result = dict(results[path])
+        result.pop("path", None)
+        if not include_settings:
+            result.pop("settings", None)
+        entry["analysis"] = result
+
+    return jsonify({"product_id": product.product_id, "components": components}), 200
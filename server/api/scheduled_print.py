@@ -1,7 +1,10 @@
 from flask import Blueprint, request, jsonify, abort
+from sqlalchemy import case, func, literal, select, Interval
 from models.scheduled_print import ScheduledPrint
+from models.gcode import Gcode
 from models import db
-from datetime import datetime
+from services.dispatcher import schedule_changed
+from datetime import datetime, timedelta
 
 scheduled_print_bp = Blueprint('scheduled_print', __name__, url_prefix='/scheduled_prints')
 
@@ -14,6 +17,107 @@ def get_scheduled_prints():
     scheduled_list = [sp.to_dict() for sp in scheduled_prints]
     return jsonify(scheduled_list), 200
 
+TIMELINE_FIELDS = ["scheduled_id", "gcode_id", "gcode_name", "start", "end", "status", "product_id"]
+# Prints estimated longer than this are found through their gcodes by /timeline.
+TIMELINE_LONG_PRINT = timedelta(hours=12)
+
+def timeline_query(window_start, window_end, printer_ids=None):
+    """
+    Rows (printer id, scheduled id, gcode id, gcode name, start, end, status,
+    product id) of the scheduled prints overlapping the window, by lane.
+    """
+    zero = literal(timedelta(0), Interval)
+    duration = func.coalesce(Gcode.estimated_print_time, zero)
+    end_time = (ScheduledPrint.scheduled_start_time + duration).label("end_time")
+
+    def overlapping():
+        query = (
+            db.session.query(
+                ScheduledPrint.assigned_printer_id,
+                ScheduledPrint.scheduled_id,
+                ScheduledPrint.gcode_id,
+                Gcode.gcode_name,
+                ScheduledPrint.scheduled_start_time,
+                end_time,
+                ScheduledPrint.status,
+                ScheduledPrint.product_id,
+            )
+            .join(Gcode, Gcode.gcode_id == ScheduledPrint.gcode_id)
+            .filter(ScheduledPrint.assigned_printer_id.isnot(None))
+            .filter(ScheduledPrint.scheduled_start_time < window_end)
+            .filter(ScheduledPrint.scheduled_start_time + duration > window_start)
+        )
+        if printer_ids is not None:
+            query = query.filter(ScheduledPrint.assigned_printer_id.in_(printer_ids))
+        return query
+
+    short_bound = window_start - TIMELINE_LONG_PRINT
+    query = overlapping().filter(ScheduledPrint.scheduled_start_time >= short_bound)
+    # An index-only lookup with ix_gcodes_estimated_print_time.
+    longest = db.session.query(func.max(Gcode.estimated_print_time)).scalar() or timedelta(0)
+    if longest > TIMELINE_LONG_PRINT:
+        query = query.union_all(
+            overlapping()
+            .filter(Gcode.estimated_print_time > TIMELINE_LONG_PRINT)
+            .filter(ScheduledPrint.scheduled_start_time >= window_start - longest)
+            .filter(ScheduledPrint.scheduled_start_time < short_bound)
+        )
+    return query.order_by(ScheduledPrint.assigned_printer_id, ScheduledPrint.scheduled_start_time)
+
+@scheduled_print_bp.route('/timeline', methods=['GET'])
+def get_timeline():
+    """
+    Scheduled prints overlapping a time window, grouped into per-printer lanes.
+
+    Query parameters:
+       from      - window start (ISO format), required
+       to        - window end (ISO format), required
+       printers  - optional comma-separated printer ids
+
+    End times are computed in SQL as scheduled_start_time plus the gcode's
+    estimated_print_time. Prints up to TIMELINE_LONG_PRINT long can only
+    overlap the window if they start at most that long before it, so the
+    scheduled_start_time indexes bound the scan to the window. Longer prints
+    are looked up through their gcodes (few, via the estimated_print_time
+    index), so one very long estimate does not widen the main scan.
+
+    Response:
+    {
+       "from": "...", "to": "...",
+       "fields": ["scheduled_id", "gcode_id", "gcode_name", "start", "end", "status", "product_id"],
+       "lanes": {"2": [[41, 10, "part.gcode", "2025-06-02T09:00:00", "2025-06-02T11:30:00", "pending", 5], ...]}
+    }
+    """
+    try:
+        window_start = datetime.fromisoformat(request.args.get("from", ""))
+        window_end = datetime.fromisoformat(request.args.get("to", ""))
+    except ValueError:
+        abort(400, description="'from' and 'to' are required in ISO format (YYYY-MM-DDTHH:MM:SS)")
+    if window_end <= window_start:
+        abort(400, description="'to' must be after 'from'")
+
+    printer_ids = None
+    if request.args.get("printers"):
+        try:
+            printer_ids = [int(p) for p in request.args["printers"].split(",") if p.strip()]
+        except ValueError:
+            abort(400, description="'printers' must be a comma-separated list of printer ids")
+
+    query = timeline_query(window_start, window_end, printer_ids)
+
+    lanes = {}
+    for printer_id, sid, gcode_id, gcode_name, start, end, status, product_id in query:
+        lanes.setdefault(str(printer_id), []).append([
+            sid, gcode_id, gcode_name, start.isoformat(), end.isoformat(), status, product_id
+        ])
+
+    return jsonify({
+        "from": window_start.isoformat(),
+        "to": window_end.isoformat(),
+        "fields": TIMELINE_FIELDS,
+        "lanes": lanes,
+    }), 200
+
 @scheduled_print_bp.route('/<int:scheduled_id>', methods=['GET'])
 def get_scheduled_print(scheduled_id):
     """
@@ -77,6 +181,7 @@ def add_scheduled_print():
     except Exception as e:
         db.session.rollback()
         abort(400, description=str(e))
+    schedule_changed()
 
     return jsonify(new_sp.to_dict()), 201
 
@@ -126,8 +231,10 @@ def update_scheduled_print(scheduled_id):
         else:
             scheduled_print.scheduled_start_time = None
 
-    if "status" in data:
+    if "status" in data and data.get("status") != scheduled_print.status:
         scheduled_print.status = data.get("status")
+        for column, value in ScheduledPrint.lifecycle_values(scheduled_print.status).items():
+            setattr(scheduled_print, column, value)
 
     if "product_id" in data:
         scheduled_print.product_id = data.get("product_id")
@@ -137,6 +244,7 @@ def update_scheduled_print(scheduled_id):
     except Exception as e:
         db.session.rollback()
         abort(400, description=str(e))
+    schedule_changed()
 
     return jsonify(scheduled_print.to_dict()), 200
 
@@ -155,4 +263,275 @@ def delete_scheduled_print(scheduled_id):
     except Exception as e:
         db.session.rollback()
         abort(400, description=str(e))
+    schedule_changed()
     return jsonify({"message": f"Scheduled print {scheduled_id} deleted."}), 200
+
+# ---------------------------------------------------------------------------
+# Bulk endpoints
+# ---------------------------------------------------------------------------
+
+BULK_MAX_ITEMS = 5000
+BULK_UPDATABLE_FIELDS = ("deadline", "gcode_id", "assigned_printer_id",
+                         "scheduled_start_time", "status", "product_id")
+
+def _parse_bulk_fields(item, require_create_fields):
+    """
+    Validate and convert one bulk item's fields to column values.
+    Returns (values, error); error is None when the item is valid.
+    """
+    values = {}
+
+    if require_create_fields:
+        if not item.get("deadline") or item.get("gcode_id") is None:
+            return None, "Missing required fields: deadline, gcode_id"
+
+    for field in ("deadline", "scheduled_start_time"):
+        if field not in item:
+            continue
+        raw = item.get(field)
+        if not raw:
+            if field == "deadline":
+                return None, "Deadline cannot be empty"
+            values[field] = None
+            continue
+        try:
+            values[field] = datetime.fromisoformat(raw)
+        except (TypeError, ValueError):
+            return None, f"Invalid {field} format; use ISO format (YYYY-MM-DDTHH:MM:SS)"
+
+    for field in ("gcode_id", "assigned_printer_id", "product_id"):
+        if field not in item:
+            continue
+        raw = item.get(field)
+        if raw is None:
+            if field == "gcode_id":
+                return None, "gcode_id cannot be null"
+            values[field] = None
+            continue
+        try:
+            values[field] = int(raw)
+        except (TypeError, ValueError):
+            return None, f"Field '{field}' must be an integer"
+
+    if "status" in item:
+        if not isinstance(item["status"], str) or not item["status"]:
+            return None, "Field 'status' must be a non-empty string"
+        values["status"] = item["status"]
+    elif require_create_fields:
+        values["status"] = "pending"
+
+    return values, None
+
+def _missing_references(rows):
+    """
+    Check every gcode/printer/product id referenced by rows with one query
+    per table. Returns {field: set_of_missing_ids}.
+    """
+    from models.gcode import Gcode
+    from models.printers import Printer
+    from models.product import Product
+
+    targets = {
+        "gcode_id": Gcode.gcode_id,
+        "assigned_printer_id": Printer.printer_id,
+        "product_id": Product.product_id,
+    }
+    missing = {}
+    for field, column in targets.items():
+        wanted = {r[field] for r in rows if r.get(field) is not None}
+        if not wanted:
+            continue
+        found = {row[0] for row in db.session.query(column).filter(column.in_(wanted))}
+        if wanted - found:
+            missing[field] = wanted - found
+    return missing
+
+def _reference_error(values, missing):
+    for field, ids in missing.items():
+        if values.get(field) in ids:
+            return f"{field} {values[field]} does not exist"
+    return None
+
+def _bulk_items(data):
+    items = data.get("items") if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        abort(400, description="Expected a non-empty 'items' list")
+    if len(items) > BULK_MAX_ITEMS:
+        abort(400, description=f"At most {BULK_MAX_ITEMS} items per request")
+    return items
+
+@scheduled_print_bp.route('/bulk', methods=['POST'])
+def bulk_add_scheduled_prints():
+    """
+    Create many scheduled prints atomically.
+
+    Expected JSON payload:
+    {
+       "items": [
+          {"deadline": "2025-06-01T15:00:00", "gcode_id": 10, "assigned_printer_id": 2,
+           "scheduled_start_time": "2025-06-01T14:30:00", "product_id": 5},
+          ...
+       ]
+    }
+
+    Every item is validated (including foreign keys) before anything is
+    written. If any item is invalid nothing is inserted and the response lists
+    the per-item errors; otherwise all rows go in with a single multi-row
+    INSERT ... RETURNING in one transaction.
+    """
+    items = _bulk_items(request.get_json(silent=True))
+
+    rows, results = [], []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            values, error = None, "Item must be an object"
+        else:
+            values, error = _parse_bulk_fields(item, require_create_fields=True)
+        rows.append(values)
+        results.append({"index": index, "ok": error is None, "error": error})
+
+    missing = _missing_references([r for r in rows if r])
+    for result, values in zip(results, rows):
+        if values and result["ok"]:
+            error = _reference_error(values, missing)
+            if error:
+                result.update(ok=False, error=error)
+
+    if not all(r["ok"] for r in results):
+        return jsonify({"error": "Validation failed; nothing was created.", "results": results}), 400
+
+    table = ScheduledPrint.__table__
+    try:
+        # PostgreSQL does not promise RETURNING rows in VALUES order, so ids
+        # are drawn up front and the returned rows are matched by id.
+        ids = db.session.execute(
+            select(func.nextval(func.pg_get_serial_sequence(table.name, "scheduled_id")))
+            .select_from(func.generate_series(1, len(rows)))
+        ).scalars().all()
+        # A multi-row VALUES clause needs the same keys on every row.
+        rows = [
+            dict({field: values.get(field) for field in BULK_UPDATABLE_FIELDS}, scheduled_id=sid)
+            for values, sid in zip(rows, ids)
+        ]
+        inserted = {
+            row.scheduled_id: row
+            for row in db.session.execute(table.insert().values(rows).returning(*table.c))
+        }
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        abort(400, description=str(e))
+    schedule_changed()
+
+    for result, row in zip(results, rows):
+        result["scheduled_print"] = ScheduledPrint.row_to_dict(inserted[row["scheduled_id"]])
+    return jsonify({"created": len(inserted), "results": results}), 201
+
+@scheduled_print_bp.route('/bulk', methods=['PATCH'])
+def bulk_update_scheduled_prints():
+    """
+    Update many scheduled prints atomically, e.g. a batch status transition.
+
+    Expected JSON payload, either a shared update:
+    {
+       "ids": [1, 2, 3],
+       "status": "printing"
+    }
+    or per-item updates:
+    {
+       "items": [
+          {"scheduled_id": 1, "status": "done"},
+          {"scheduled_id": 2, "assigned_printer_id": 4, "scheduled_start_time": "2025-06-02T09:00:00"}
+       ]
+    }
+
+    Items sharing the same new values are applied with one UPDATE ... WHERE
+    scheduled_id IN (...), so a batch status change is a single statement.
+    started_at/finished_at are only set on rows whose status actually changes.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        abort(400, description="No input data provided")
+
+    if "ids" in data:
+        if not isinstance(data["ids"], list) or not data["ids"]:
+            abort(400, description="Expected a non-empty 'ids' list")
+        shared = {k: v for k, v in data.items() if k != "ids"}
+        items = [dict(shared, scheduled_id=sid) for sid in data["ids"]]
+        if len(items) > BULK_MAX_ITEMS:
+            abort(400, description=f"At most {BULK_MAX_ITEMS} items per request")
+    else:
+        items = _bulk_items(data)
+
+    parsed, results = [], []
+    for index, item in enumerate(items):
+        error, values, sid = None, None, None
+        if not isinstance(item, dict):
+            error = "Item must be an object"
+        else:
+            unknown = [k for k in item if k != "scheduled_id" and k not in BULK_UPDATABLE_FIELDS]
+            try:
+                sid = int(item.get("scheduled_id"))
+            except (TypeError, ValueError):
+                error = "Missing or invalid scheduled_id"
+            if error is None and unknown:
+                error = f"Field '{unknown[0]}' is not allowed to be updated"
+            if error is None:
+                values, error = _parse_bulk_fields(item, require_create_fields=False)
+            if error is None and not values:
+                error = "No fields to update"
+        parsed.append((sid, values))
+        results.append({"index": index, "scheduled_id": sid, "ok": error is None, "error": error})
+
+    wanted_ids = {sid for sid, values in parsed if values}
+    existing = {
+        row[0] for row in db.session.query(ScheduledPrint.scheduled_id)
+        .filter(ScheduledPrint.scheduled_id.in_(wanted_ids))
+    } if wanted_ids else set()
+    missing = _missing_references([values for _, values in parsed if values])
+    seen = set()
+    for result, (sid, values) in zip(results, parsed):
+        if not result["ok"]:
+            continue
+        if sid not in existing:
+            result.update(ok=False, error=f"Scheduled print with id {sid} not found")
+        elif sid in seen:
+            result.update(ok=False, error=f"Duplicate scheduled_id {sid}")
+        else:
+            error = _reference_error(values, missing)
+            if error:
+                result.update(ok=False, error=error)
+        seen.add(sid)
+
+    if not all(r["ok"] for r in results):
+        return jsonify({"error": "Validation failed; nothing was updated.", "results": results}), 400
+
+    # Group identical updates so each distinct change is one statement.
+    groups = {}
+    for sid, values in parsed:
+        key = tuple(sorted(values.items()))
+        groups.setdefault(key, []).append(sid)
+
+    table = ScheduledPrint.__table__
+    now = datetime.now()
+    try:
+        for key, ids in groups.items():
+            values = dict(key)
+            if "status" in values:
+                # As in PUT, lifecycle timestamps are only stamped on a real
+                # status change; the CASE sees each row's old status.
+                changed = table.c.status.is_distinct_from(values["status"])
+                for column, value in ScheduledPrint.lifecycle_values(values["status"], now).items():
+                    values[column] = case((changed, value), else_=table.c[column])
+            db.session.execute(
+                table.update()
+                .where(table.c.scheduled_id.in_(ids))
+                .values(values)
+            )
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        abort(400, description=str(e))
+    schedule_changed()
+
+    return jsonify({"updated": len(parsed), "statements": len(groups), "results": results}), 200
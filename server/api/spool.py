@@ -0,0 +1,243 @@
+from flask import Blueprint, request, jsonify, abort
+from sqlalchemy import func
+from models.spool import Spool
+from models.gcode import Gcode
+from models.scheduled_print import ScheduledPrint
+from models.filament_usage import JobFilamentUsage
+from models.printers import Printer
+from models import db
+
+spool_bp = Blueprint('spool', __name__, url_prefix='/spools')
+
+FLOAT_FIELDS = ("filament_diameter", "density", "hub_diameter", "outer_diameter",
+                "spool_width", "remaining_weight")
+# Scheduled prints in these states still need filament.
+UPCOMING_STATUSES = ("pending",)
+# Re-measuring a spool resets the filament consumed since the last measurement.
+MEASURED_FIELDS = ("remaining_weight", "outer_diameter")
+
+def _apply_fields(spool, data):
+    """Copy allowed fields from data onto spool, aborting on bad values."""
+    for field, value in data.items():
+        if field in FLOAT_FIELDS:
+            if value is None or value == "":
+                if field == "filament_diameter":
+                    abort(400, description="filament_diameter cannot be empty")
+                setattr(spool, field, None)
+                continue
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                abort(400, description=f"Field '{field}' must be a number")
+            if value < 0:
+                abort(400, description=f"Field '{field}' cannot be negative")
+            setattr(spool, field, value)
+            if field in MEASURED_FIELDS:
+                spool.consumed_length = 0.0
+        elif field == "printer_id":
+            try:
+                spool.printer_id = int(value) if value is not None else None
+            except (TypeError, ValueError):
+                abort(400, description="Field 'printer_id' must be an integer")
+        elif field in ("label", "material"):
+            setattr(spool, field, value)
+        elif field != "spool_id":
+            abort(400, description=f"Field '{field}' is not allowed")
+
+@spool_bp.route('/', methods=['GET'])
+def get_spools():
+    spools = Spool.query.all()
+    return jsonify([s.to_dict() for s in spools]), 200
+
+@spool_bp.route('/', methods=['POST'])
+def add_spool():
+    """
+    Sample JSON payload:
+    {
+      "label": "ASA black #12",
+      "material": "ASA",
+      "filament_diameter": 1.75,
+      "hub_diameter": 30, "outer_diameter": 130, "spool_width": 137,  // optional geometry
+      "remaining_weight": 820,                                      // optional, grams
+      "printer_id": 3                                               // optional, loaded on
+    }
+    """
+    data = request.get_json()
+    if not data:
+        abort(400, description="No input data provided")
+    if not data.get("material"):
+        abort(400, description="Missing required field: material")
+
+    spool = Spool(filament_diameter=1.75)
+    _apply_fields(spool, data)
+    db.session.add(spool)
+    try:
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        abort(400, description=str(e))
+    return jsonify(spool.to_dict()), 201
+
+@spool_bp.route('/<int:spool_id>', methods=['PUT'])
+def update_spool(spool_id):
+    data = request.get_json()
+    if not data:
+        abort(400, description="No input data provided")
+    spool = Spool.query.get(spool_id)
+    if spool is None:
+        abort(404, description=f"Spool with id {spool_id} not found")
+
+    _apply_fields(spool, data)
+    try:
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        abort(400, description=str(e))
+    return jsonify(spool.to_dict()), 200
+
+@spool_bp.route('/remaining', methods=['GET'])
+def remaining_filament():
+    """
+    Remaining length/weight for every spool, computed in one vectorized pass
+    (less the filament tracked as consumed since it was measured), checked against the filament_total (mm) of upcoming scheduled prints:
+      - per printer: pending prints assigned to it vs. spools loaded on it,
+      - per material: all pending prints vs. all spools of that material.
+    """
+    import numpy as np
+    import filament_conversion as fc
+
+    rows = Spool.query.with_entities(
+        Spool.spool_id, Spool.label, Spool.material, Spool.printer_id,
+        Spool.filament_diameter, Spool.density, Spool.hub_diameter,
+        Spool.outer_diameter, Spool.spool_width, Spool.remaining_weight,
+        Spool.consumed_length
+    ).all()
+
+    def column(index):
+        return np.array([np.nan if r[index] is None else r[index] for r in rows], dtype=float)
+
+    materials = [(r[2] or "").strip().upper() for r in rows]
+    diameter = column(4)
+    density = column(5)
+    density = np.where(np.isnan(density), fc.density_for(materials), density)
+    length = fc.remaining_length(column(9), column(7), column(6), column(8), diameter, density)
+    # Filament consumed since the spool was last measured.
+    length = np.clip(length - np.nan_to_num(column(10)), 0.0, None)
+    weight = fc.weight_from_length(length, diameter, density)
+
+    spools = []
+    supply_by_printer, supply_by_material = {}, {}
+    for r, material, mm, grams in zip(rows, materials, length.tolist(), weight.tolist()):
+        known = not np.isnan(mm)
+        spools.append({
+            "spool_id": r[0], "label": r[1], "material": material, "printer_id": r[3],
+            "remaining_length_m": round(mm / 1000.0, 2) if known else None,
+            "remaining_weight_g": round(grams, 1) if known else None,
+        })
+        if known:
+            if r[3] is not None:
+                supply_by_printer[r[3]] = supply_by_printer.get(r[3], 0.0) + mm
+            supply_by_material[material] = supply_by_material.get(material, 0.0) + mm
+
+    upcoming = (
+        db.session.query(ScheduledPrint.assigned_printer_id, func.upper(Gcode.material),
+                         func.sum(Gcode.filament_total), func.count())
+        .join(Gcode, Gcode.gcode_id == ScheduledPrint.gcode_id)
+        .filter(ScheduledPrint.status.in_(UPCOMING_STATUSES))
+        .group_by(ScheduledPrint.assigned_printer_id, func.upper(Gcode.material))
+        .all()
+    )
+    demand_by_printer, demand_by_material = {}, {}
+    for printer_id, material, needed, count in upcoming:
+        needed = needed or 0.0
+        if printer_id is not None:
+            demand_by_printer[printer_id] = demand_by_printer.get(printer_id, 0.0) + needed
+        demand_by_material[material] = demand_by_material.get(material, 0.0) + needed
+
+    def balance(demand, supply):
+        return [
+            {
+                "key": key,
+                "required_m": round(need / 1000.0, 2),
+                "available_m": round(supply.get(key, 0.0) / 1000.0, 2),
+                "shortfall_m": round(max(0.0, need - supply.get(key, 0.0)) / 1000.0, 2),
+            }
+            for key, need in sorted(demand.items(), key=lambda kv: str(kv[0]))
+        ]
+
+    by_printer = balance(demand_by_printer, supply_by_printer)
+    by_material = balance(demand_by_material, supply_by_material)
+    return jsonify({
+        "spools": spools,
+        "by_printer": by_printer,
+        "by_material": by_material,
+        "shortfalls": (
+            [dict(b, scope="printer") for b in by_printer if b["shortfall_m"] > 0] +
+            [dict(b, scope="material") for b in by_material if b["shortfall_m"] > 0]
+        ),
+    }), 200
+
+@spool_bp.route('/usage', methods=['GET'])
+def filament_usage():
+    """
+    Tracked per-job consumption, plus actual vs. estimated filament per gcode.
+    Query params: printer_id (optional), limit (default 100 jobs).
+    """
+    from services import consumption
+
+    try:
+        limit = int(request.args.get("limit", 100))
+    except ValueError:
+        abort(400, description="limit must be an integer")
+    printer_id = request.args.get("printer_id", type=int)
+
+    jobs = JobFilamentUsage.query
+    if printer_id is not None:
+        jobs = jobs.filter(JobFilamentUsage.printer_id == printer_id)
+    jobs = jobs.order_by(JobFilamentUsage.started_at.desc()).limit(limit).all()
+
+    # Average actual use of completed jobs, matched to gcode by printer and file name.
+    actual = (
+        db.session.query(
+            JobFilamentUsage.printer_id, JobFilamentUsage.filename,
+            func.avg(JobFilamentUsage.filament_used).label("used"),
+            func.avg(JobFilamentUsage.filament_weight).label("weight"),
+            func.count().label("jobs")
+        )
+        .filter(JobFilamentUsage.state == "complete")
+        .group_by(JobFilamentUsage.printer_id, JobFilamentUsage.filename)
+        .subquery()
+    )
+    estimates = (
+        db.session.query(
+            Gcode.gcode_id, Gcode.gcode_name, Gcode.printer_id, Gcode.filament_total,
+            actual.c.used, actual.c.weight, actual.c.jobs
+        )
+        .join(actual, (actual.c.printer_id == Gcode.printer_id) & (actual.c.filename == Gcode.gcode_name))
+    )
+    if printer_id is not None:
+        estimates = estimates.filter(Gcode.printer_id == printer_id)
+
+    gcodes = []
+    for gcode_id, name, gcode_printer, estimated, used, weight, count in estimates:
+        gcodes.append({
+            "gcode_id": gcode_id,
+            "gcode_name": name,
+            "printer_id": gcode_printer,
+            "estimated_mm": estimated,
+            "actual_mm": round(used, 2) if used is not None else None,
+            "actual_g": round(weight, 2) if weight is not None else None,
+            "jobs": count,
+            "ratio": round(used / estimated, 4) if used and estimated else None,
+        })
+
+    live = consumption.tracker.counters()
+    if printer_id is not None:
+        printer = Printer.query.get(printer_id)
+        live = {ip: c for ip, c in live.items() if printer and ip == printer.ip_address}
+
+    return jsonify({
+        "jobs": [j.to_dict() for j in jobs],
+        "gcodes": gcodes,
+        "live": live,
+    }), 200
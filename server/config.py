@@ -25,7 +25,12 @@ def parse_arguments():
     return parser.parse_args()
 
 class Config:
-    def __init__(self, host, db_host, db_port, flask_port, db_name, db_user, db_password, debug, db_uri="default"):
+    def __init__(self, host, db_host, db_port, flask_port, db_name, db_user, db_password, debug, db_uri="default",
+                 db_pool_size=10, db_max_overflow=5, db_pool_timeout=10, db_green="true",
+                 scale_out="false", worker_id="", lease_ttl=10, lease_heartbeat=3, socketio_message_queue="",
+                 gcode_root=".", gcode_analysis_cache="", gcode_store=".gcode_store",
+                 dispatcher="false", request_profiling="false", moonraker_rpc="false",
+                 job_history="true", analytics="true"):
         # HOST: Public host used for binding the Flask app.
         self.HOST = host
         # DB_HOST: Host address for the PostgreSQL database.
@@ -38,5 +43,39 @@ class Config:
         self.DB_DEBUG = debug
         # SQLALCHEMY_DATABASE_URI will be built later (for example, in your server.py)
         self.SQLALCHEMY_DATABASE_URI = db_uri
+        # Explicitly sized connection pool. Pollers, sockets and HTTP requests all
+        # share it, so pool_timeout bounds how long a green thread waits for a slot.
+        self.SQLALCHEMY_ENGINE_OPTIONS = {
+            "pool_size": int(db_pool_size),
+            "max_overflow": int(db_max_overflow),
+            "pool_timeout": int(db_pool_timeout),
+            "pool_pre_ping": True,
+        }
+        # DB_GREEN: make psycopg2 yield to the eventlet hub while waiting on the server.
+        self.DB_GREEN = str(db_green).lower() == 'true'
+        # SCALE_OUT: several server processes share printers through poller leases.
+        self.SCALE_OUT = str(scale_out).lower() == 'true'
+        self.WORKER_ID = worker_id or None
+        self.LEASE_TTL = int(lease_ttl)
+        self.LEASE_HEARTBEAT = int(lease_heartbeat)
+        # SOCKETIO_MESSAGE_QUEUE: e.g. redis://127.0.0.1:6379/0, so emits from any
+        # worker reach clients connected to every worker.
+        self.SOCKETIO_MESSAGE_QUEUE = socketio_message_queue or None
+        # GCODE_ROOT: directory that ProductComponent.file_path is relative to.
+        self.GCODE_ROOT = gcode_root
+        # GCODE_ANALYSIS_CACHE: optional directory for persisted analyzer results.
+        self.GCODE_ANALYSIS_CACHE = gcode_analysis_cache or None
+        # GCODE_STORE: directory of the content-addressed gcode repository.
+        self.GCODE_STORE = gcode_store
+        # DISPATCHER: start due scheduled prints when their printer goes idle.
+        self.DISPATCHER = str(dispatcher).lower() == 'true'
+        # REQUEST_PROFILING: per-request SQL/HTTP/JSON timings and ?__profile=1 sampling.
+        self.REQUEST_PROFILING = str(request_profiling).lower() == 'true'
+        # MOONRAKER_RPC: talk to each printer over one persistent JSON-RPC websocket.
+        self.MOONRAKER_RPC = str(moonraker_rpc).lower() == 'true'
+        # JOB_HISTORY: archive the polled printers' Moonraker job history in print_jobs.
+        self.JOB_HISTORY = str(job_history).lower() == 'true'
+        # ANALYTICS: keep the utilization / queue wait / on-time rollups refreshed.
+        self.ANALYTICS = str(analytics).lower() == 'true'
         # Set the debug flag appropriately.
         self.DEBUG = debug.lower() == 'true'
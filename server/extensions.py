@@ -1,4 +1,67 @@
+import json
 from flask_socketio import SocketIO
 
+
+class PreEncodedJSON(str):
+    """
+    A payload that is already valid JSON text (e.g. a raw Moonraker message).
+    Passing one to socketio.emit() splices it into the packet verbatim instead
+    of decoding it to a dict and encoding it again.
+    """
+    __slots__ = ()
+
+
+class RelayJSON:
+    """
+    json module stand-in for python-socketio's packet encoder. Packets are
+    encoded once per emit (not per subscriber); this only adds the ability to
+    pass PreEncodedJSON through untouched.
+    """
+
+    @staticmethod
+    def dumps(obj, **kwargs):
+        if isinstance(obj, list) and any(isinstance(item, PreEncodedJSON) for item in obj):
+            return "[" + ",".join(
+                item if isinstance(item, PreEncodedJSON) else json.dumps(item, **kwargs)
+                for item in obj
+            ) + "]"
+        if isinstance(obj, PreEncodedJSON):
+            return str(obj)
+        return json.dumps(obj, **kwargs)
+
+    @staticmethod
+    def loads(s, **kwargs):
+        return json.loads(s, **kwargs)
+
+
 # Create a shared SocketIO instance.
-socketio = SocketIO(cors_allowed_origins="*")
+socketio = SocketIO(cors_allowed_origins="*", json=RelayJSON)
+
+
+def make_psycopg2_green():
+    """
+    Register an eventlet-aware wait callback with psycopg2.
+
+    psycopg2 is a C extension, so eventlet.monkey_patch() cannot reach its
+    sockets and every query blocks the whole hub. With a wait callback set,
+    psycopg2 runs in async mode and hands control back to us whenever it would
+    block; we park the green thread on the connection's fd until it is ready,
+    letting Socket.IO emits, pollers and other requests run in the meantime.
+    """
+    import psycopg2
+    from psycopg2 import extensions
+    from eventlet.hubs import trampoline
+
+    def eventlet_wait_callback(conn, timeout=-1):
+        while True:
+            state = conn.poll()
+            if state == extensions.POLL_OK:
+                break
+            elif state == extensions.POLL_READ:
+                trampoline(conn.fileno(), read=True)
+            elif state == extensions.POLL_WRITE:
+                trampoline(conn.fileno(), write=True)
+            else:
+                raise psycopg2.OperationalError(f"Bad result from poll: {state!r}")
+
+    extensions.set_wait_callback(eventlet_wait_callback)
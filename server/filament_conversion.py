@@ -1,29 +1,109 @@
 # Filament Length Calculator
-import math
-spool_id = 30
-spool_current = 130
-filament_diameter = 1.75
-filament_density = 1.07
-spool_width = 137
-asa_ratio = 1000/388.75
-
-num_of_donut = math.floor(((spool_current - spool_id) / filament_diameter) / 2)
-print(num_of_donut)
-
-total_length = 0
-
-for i in range(num_of_donut):
-    # circumference * width gives number of revolutions at each spool
-    donut_length = spool_id + i*2 * math.pi * (spool_width / filament_diameter)
-    total_length += donut_length
-
-print(total_length * 0.001)
-total_weight = (total_length * 0.001) * asa_ratio
-print(total_weight)
-
-# kg to filament length conversion
-filament_radius = filament_diameter / 2
-kg = 5
-# calculate volume
-filament_length = kg * 1000 / (math.pi * filament_radius**2 * filament_density)
-print(filament_length)
\ No newline at end of file
+"""
+Spool and filament conversions, vectorized with NumPy.
+
+Every function accepts scalars or arrays (broadcast together), so a whole
+spool inventory is converted in one call. Units: lengths and diameters in
+mm, weights in g, volumes in mm^3, densities in g/cm^3.
+
+The wound length on a spool is closed-form: with square packing, the layer
+at index i has centre diameter D_in + d(2i + 1) and width/d turns, and the
+sum over N = (D_out - D_in) / 2d layers collapses to
+
+    L = pi * W * (D_out^2 - D_in^2) / (4 d^2)
+"""
+import numpy as np
+
+DEFAULT_FILAMENT_DIAMETER = 1.75
+
+# Typical densities in g/cm^3.
+MATERIAL_DENSITY = {
+    "PLA": 1.24,
+    "PETG": 1.27,
+    "ABS": 1.04,
+    "ASA": 1.07,
+    "TPU": 1.21,
+    "PA": 1.14,
+    "PC": 1.20,
+}
+DEFAULT_DENSITY = MATERIAL_DENSITY["PLA"]
+
+
+def density_for(materials, default=DEFAULT_DENSITY):
+    """Array of densities for an iterable of material names."""
+    return np.array(
+        [MATERIAL_DENSITY.get((m or "").strip().upper(), default) for m in materials],
+        dtype=float
+    )
+
+
+def cross_section(filament_diameter=DEFAULT_FILAMENT_DIAMETER):
+    """Filament cross-section area in mm^2."""
+    radius = np.asarray(filament_diameter, dtype=float) / 2.0
+    return np.pi * radius ** 2
+
+
+def volume_from_length(length, filament_diameter=DEFAULT_FILAMENT_DIAMETER):
+    return np.asarray(length, dtype=float) * cross_section(filament_diameter)
+
+
+def length_from_volume(volume, filament_diameter=DEFAULT_FILAMENT_DIAMETER):
+    return np.asarray(volume, dtype=float) / cross_section(filament_diameter)
+
+
+def weight_from_volume(volume, density=DEFAULT_DENSITY):
+    # 1 cm^3 = 1000 mm^3
+    return np.asarray(volume, dtype=float) * np.asarray(density, dtype=float) / 1000.0
+
+
+def volume_from_weight(weight, density=DEFAULT_DENSITY):
+    return np.asarray(weight, dtype=float) * 1000.0 / np.asarray(density, dtype=float)
+
+
+def weight_from_length(length, filament_diameter=DEFAULT_FILAMENT_DIAMETER, density=DEFAULT_DENSITY):
+    return weight_from_volume(volume_from_length(length, filament_diameter), density)
+
+
+def length_from_weight(weight, filament_diameter=DEFAULT_FILAMENT_DIAMETER, density=DEFAULT_DENSITY):
+    return length_from_volume(volume_from_weight(weight, density), filament_diameter)
+
+
+def wound_length(outer_diameter, hub_diameter, spool_width, filament_diameter=DEFAULT_FILAMENT_DIAMETER):
+    """
+    Filament length wound between the hub and the current outer winding
+    diameter (closed form of the layer-by-layer sum, square packing).
+    """
+    outer = np.asarray(outer_diameter, dtype=float)
+    hub = np.asarray(hub_diameter, dtype=float)
+    d = np.asarray(filament_diameter, dtype=float)
+    annulus = np.clip(outer ** 2 - hub ** 2, 0.0, None)
+    return np.pi * np.asarray(spool_width, dtype=float) * annulus / (4.0 * d ** 2)
+
+
+def remaining_length(remaining_weight, outer_diameter, hub_diameter, spool_width,
+                     filament_diameter=DEFAULT_FILAMENT_DIAMETER, density=DEFAULT_DENSITY):
+    """
+    Remaining length per spool. A measured remaining_weight wins; otherwise
+    the winding geometry is used. Missing inputs are NaN, and spools with
+    neither give NaN.
+    """
+    by_weight = length_from_weight(remaining_weight, filament_diameter, density)
+    by_geometry = wound_length(outer_diameter, hub_diameter, spool_width, filament_diameter)
+    return np.where(np.isnan(by_weight), by_geometry, by_weight)
+
+
+if __name__ == "__main__":
+    # The original worked example: a 137 mm wide ASA spool wound from a
+    # 30 mm hub out to 130 mm.
+    spool_id = 30
+    spool_current = 130
+    filament_diameter = 1.75
+    spool_width = 137
+
+    length = wound_length(spool_current, spool_id, spool_width, filament_diameter)
+    print(f"Wound length: {length * 0.001:.1f} m")
+    print(f"Weight: {weight_from_length(length, filament_diameter, MATERIAL_DENSITY['ASA']):.0f} g")
+
+    # kg to filament length conversion
+    kg = 5
+    print(f"{kg} kg of PLA: {length_from_weight(kg * 1000, filament_diameter) * 0.001:.1f} m")
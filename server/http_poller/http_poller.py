@@ -5,7 +5,11 @@ import requests
 from models import db
 from models.printers import Printer
 from sockets.utils import get_app_instance  # Helper to get your Flask app
-from extensions import socketio              # Your Socket.IO instance
+from extensions import socketio, PreEncodedJSON  # Your Socket.IO instance
+from services import consumption, dispatcher, moonraker_rpc
+from services.subscriptions import hub
+from services.outbox import outbox
+from services import metrics
 
 class HTTPPoller:
     """
@@ -33,8 +37,10 @@ class HTTPPoller:
         :param printer: A Printer model instance.
         :param poll_interval: Poll interval in seconds.
         :param request_method: "GET" or "POST" (default: GET).
-        :param callback: A function with signature callback(printer_ip, data).
+        :param callback: A function with signature callback(printer_ip, data, encoded).
                          If provided, it is called on every successful poll.
+                         encoded is the HTTP response body as PreEncodedJSON,
+                         or None when data came over the JSON-RPC socket.
         """
         self.printer = printer
         self.poll_interval = poll_interval
@@ -44,6 +50,9 @@ class HTTPPoller:
         self.running = False
         # Track consecutive polling errors
         self.error_count = 0
+        # Metric children are resolved once; recording a poll is then allocation-free.
+        self.poll_seconds = metrics.POLL_SECONDS.labels(printer.ip_address)
+        self.poll_errors = metrics.POLL_ERRORS.labels(printer.ip_address)
 
     def build_url(self) -> str:
         """
@@ -65,23 +74,38 @@ class HTTPPoller:
         if getattr(self.printer, "heated_chamber", False):
             payload["objects"]["temperature_sensor chamber_temp"] = None
 
+        started = time.perf_counter()
+        encoded = None
         try:
-            if self.request_method == "GET":
+            if moonraker_rpc.enabled():
+                # Shares the printer's JSON-RPC websocket with every other call.
+                result = moonraker_rpc.call(
+                    self.printer.ip_address, self.printer.port, "printer.objects.query", payload, timeout=2
+                )
+                data = {"result": result}
+
+            elif self.request_method == "GET":
                 # Build query string from the object keys
                 query_string = "&".join(payload["objects"].keys())
                 full_url = f"{url}?{query_string}"
                 response = requests.get(full_url, timeout=2)
+                response.raise_for_status()  # Raises on 4xx/5xx
+                # Keep the body: Socket.IO clients get it verbatim, not re-encoded.
+                encoded = PreEncodedJSON(response.content.decode("utf-8"))
+                data = json.loads(encoded)
 
             elif self.request_method == "POST":
                 headers = {"Content-Type": "application/json"}
                 response = requests.post(url, json=payload, headers=headers, timeout=2)
+                response.raise_for_status()
+                encoded = PreEncodedJSON(response.content.decode("utf-8"))
+                data = json.loads(encoded)
 
             else:
                 print(f"[HTTPPoller][{self.printer.ip_address}] Unsupported request method: {self.request_method}")
                 return
 
-            response.raise_for_status()  # Raises on 4xx/5xx
-            data = response.json()
+            self.poll_seconds.observe(time.perf_counter() - started)
 
             # On successful poll, reset error counter
             if self.error_count >= 10:
@@ -94,10 +118,14 @@ class HTTPPoller:
             self.error_count = 0
 
             if self.callback:
-                self.callback(self.printer.ip_address, data)
+                self.callback(self.printer.ip_address, data, encoded)
 
         except Exception as e:
-            print(f"[HTTPPoller][{self.printer.ip_address}] Polling error: {e}")
+            self.poll_errors.inc()
+            # Counted in printer_poll_errors_total; only the first error of a
+            # streak is logged.
+            if self.error_count == 0:
+                print(f"[HTTPPoller][{self.printer.ip_address}] Polling error: {e}")
             self.error_count += 1
 
             # After 10 consecutive polling errors, mark printer as offline
@@ -130,15 +158,27 @@ class HTTPPoller:
         print(f"[HTTPPoller][{self.printer.ip_address}] Polling stopped.")
 
 
-def update_printer_status_callback(printer_ip, data):
+def update_printer_status_callback(printer_ip, data, encoded=None):
     """
     Called by HTTPPoller on every successful poll.
-    Emits the data to all Socket.IO clients in the printer's room.
+    Queues the response body, pre-encoded when available, for the Socket.IO
+    clients watching the printer (latest wins for slow clients), hands the
+    data to the multi-printer subscription hub, and folds print_stats into
+    the filament consumption counters and the job dispatcher.
     """
     try:
-        socketio.emit("printer_update", data, room=printer_ip)
+        outbox.publish(printer_ip, "printer_update", encoded or data)
     except Exception as e:
         print(f"[HTTPPoller][{printer_ip}] Error emitting update: {e}")
+    hub.publish(printer_ip, data)
+    try:
+        consumption.observe(printer_ip, data)
+    except Exception as e:
+        print(f"[HTTPPoller][{printer_ip}] Error tracking consumption: {e}")
+    try:
+        dispatcher.observe(printer_ip, data)
+    except Exception as e:
+        print(f"[HTTPPoller][{printer_ip}] Error notifying dispatcher: {e}")
 
 
 # For standalone testing
@@ -0,0 +1,236 @@
+#!/usr/bin/env python
+"""
+Load test for the poller and socket layers against moonraker_simulator.py.
+
+For each fleet size the driver:
+  1. starts the simulator with that many printers,
+  2. registers them through /printers/upload_csv and connects them through
+     /printers/connect (which starts one poller each),
+  3. joins the printer_update room of a sample of printers with Socket.IO
+     clients, and lets everything run for --duration seconds,
+  4. reports poll throughput (server /metrics and simulator request counts),
+     poll errors, emits, emit latency (receive time - simulator eventtime,
+     both wall clock on this host) and server CPU,
+  5. disconnects the printers and stops the simulator.
+
+The server must already be running (python server.py). Server CPU is read
+from /proc/<pid>/stat and needs --server-pid.
+
+Usage:
+    python load_test.py --server-pid $(pgrep -f "server.py" | head -1)
+    python load_test.py --sizes 10,100 --duration 20 --latency 0.01
+"""
+import argparse
+import csv
+import io
+import ipaddress
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Load test pollers and Socket.IO against simulated printers.")
+    parser.add_argument('--server', default='http://127.0.0.1:5000', help='Base URL of the running server')
+    parser.add_argument('--server-pid', type=int, default=None, help='Server PID, for CPU usage')
+    parser.add_argument('--sizes', default='10,100,500', help='Comma-separated fleet sizes')
+    parser.add_argument('--duration', type=float, default=30, help='Measurement window per size (s)')
+    parser.add_argument('--warmup', type=float, default=5, help='Seconds between connecting and measuring')
+    parser.add_argument('--sample-sockets', type=int, default=10, help='Printers watched by Socket.IO clients')
+    parser.add_argument('--address', default='127.20.0.1', help='First simulated printer address')
+    parser.add_argument('--port', type=int, default=7125)
+    parser.add_argument('--control-port', type=int, default=7199)
+    parser.add_argument('--latency', type=float, default=0.0, help='Simulated Moonraker latency (s)')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='Simulated failure rate')
+    return parser.parse_args()
+
+
+def scrape_metrics(server):
+    """Sum of selected series from /metrics: {metric name: total across labels}."""
+    wanted = ("printer_poll_seconds_count", "printer_poll_errors_total", "socketio_emits_total",
+              "socketio_emit_bytes_total")
+    totals = dict.fromkeys(wanted, 0.0)
+    for line in requests.get(f"{server}/metrics", timeout=10).text.splitlines():
+        if line.startswith("#"):
+            continue
+        name = line.split("{", 1)[0].split(" ", 1)[0]
+        if name in totals:
+            totals[name] += float(line.rsplit(" ", 1)[1])
+    return totals
+
+
+def cpu_seconds(pid):
+    """utime + stime of pid in seconds, or None."""
+    if pid is None:
+        return None
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def start_simulator(args, count):
+    proc = subprocess.Popen(
+        [sys.executable, os.path.join(HERE, "moonraker_simulator.py"), "--count", str(count),
+         "--address", args.address, "--port", str(args.port), "--control-port", str(args.control_port),
+         "--latency", str(args.latency), "--failure-rate", str(args.failure_rate)],
+        cwd=HERE
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            return proc, requests.get(f"http://127.0.0.1:{args.control_port}/printers", timeout=1).json()
+        except requests.RequestException:
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError("Simulator did not come up")
+
+
+def register_printers(server, printers):
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(["ip_address", "port", "webcam_address", "webcam_port", "printer_name",
+                     "printer_model", "prepare_time", "supported_materials"])
+    for i, p in enumerate(printers):
+        writer.writerow([p["ip_address"], p["port"], "/", 8080, f"Sim {i}", "Simulated", 0, "PLA,PETG,ASA"])
+    resp = requests.post(f"{server}/printers/upload_csv",
+                         files={"file": ("printers.csv", out.getvalue().encode())}, timeout=60)
+    resp.raise_for_status()
+
+
+def call_each(server, path, printers):
+    def call(p):
+        try:
+            return requests.post(f"{server}/printers/{path}", json={"ip_address": p["ip_address"]}, timeout=30).ok
+        except requests.RequestException:
+            return False
+    with ThreadPoolExecutor(max_workers=32) as pool:
+        return sum(pool.map(call, printers))
+
+
+class LatencyProbe:
+    """Socket.IO clients in the rooms of a few printers, recording emit latency."""
+
+    def __init__(self, server, printers):
+        import socketio  # python-socketio client, as in socketclient.py
+        self.latencies = []
+        self.lock = threading.Lock()
+        self.recording = False
+        self.clients = []
+        for p in printers:
+            client = socketio.Client()
+            client.on("printer_update", self._on_update)
+            client.connect(f"{server}?printerIp={p['ip_address']}", transports=["websocket"])
+            self.clients.append(client)
+
+    def _on_update(self, data):
+        received = time.time()
+        try:
+            sent = data["result"]["eventtime"]
+        except (KeyError, TypeError):
+            return
+        if self.recording:
+            with self.lock:
+                self.latencies.append(received - sent)
+
+    def close(self):
+        for client in self.clients:
+            client.disconnect()
+
+
+def run_size(args, count):
+    proc, printers = start_simulator(args, count)
+    probe = None
+    try:
+        register_printers(args.server, printers)
+        connected = call_each(args.server, "connect", printers)
+        probe = LatencyProbe(args.server, printers[:args.sample_sockets])
+        time.sleep(args.warmup)
+
+        sim_before = requests.get(f"http://127.0.0.1:{args.control_port}/stats", timeout=5).json()
+        metrics_before = scrape_metrics(args.server)
+        cpu_before, started = cpu_seconds(args.server_pid), time.time()
+        probe.recording = True
+        time.sleep(args.duration)
+        probe.recording = False
+        elapsed = time.time() - started
+        cpu_after = cpu_seconds(args.server_pid)
+        metrics_after = scrape_metrics(args.server)
+        sim_after = requests.get(f"http://127.0.0.1:{args.control_port}/stats", timeout=5).json()
+
+        def rate(before, after, key):
+            return (after.get(key, 0) - before.get(key, 0)) / elapsed
+
+        return {
+            "printers": count,
+            "connected": connected,
+            "polls_per_s": rate(metrics_before, metrics_after, "printer_poll_seconds_count"),
+            "sim_queries_per_s": rate(sim_before, sim_after, "/printer/objects/query"),
+            "poll_errors_per_s": rate(metrics_before, metrics_after, "printer_poll_errors_total"),
+            "emits_per_s": rate(metrics_before, metrics_after, "socketio_emits_total"),
+            "emit_kib_per_s": rate(metrics_before, metrics_after, "socketio_emit_bytes_total") / 1024,
+            "latency_p50_ms": _ms(percentile(probe.latencies, 0.50)),
+            "latency_p95_ms": _ms(percentile(probe.latencies, 0.95)),
+            "latency_p99_ms": _ms(percentile(probe.latencies, 0.99)),
+            "server_cpu_pct": (
+                100 * (cpu_after - cpu_before) / elapsed if cpu_before is not None and cpu_after is not None else None
+            ),
+        }
+    finally:
+        if probe is not None:
+            probe.close()
+        call_each(args.server, "disconnect", printers)
+        proc.terminate()
+        proc.wait(timeout=10)
+
+
+def _ms(seconds):
+    return None if seconds is None else seconds * 1000
+
+
+def print_report(rows):
+    columns = ["printers", "connected", "polls_per_s", "sim_queries_per_s", "poll_errors_per_s",
+               "emits_per_s", "emit_kib_per_s", "latency_p50_ms", "latency_p95_ms", "latency_p99_ms",
+               "server_cpu_pct"]
+    print()
+    print("  ".join(f"{c:>17}" for c in columns))
+    for row in rows:
+        cells = []
+        for c in columns:
+            value = row[c]
+            cells.append(f"{'n/a':>17}" if value is None else
+                         f"{value:>17.1f}" if isinstance(value, float) else f"{value:>17}")
+        print("  ".join(cells))
+
+
+def main():
+    args = parse_arguments()
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    last = ipaddress.ip_address(args.address) + max(sizes) - 1
+    print(f"[LoadTest] Simulated printers on {args.address}..{last}:{args.port}")
+
+    rows = []
+    for count in sizes:
+        print(f"[LoadTest] {count} printer(s): measuring for {args.duration:.0f}s ...")
+        rows.append(run_size(args, count))
+    print_report(rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""Add indexes for hot lookups on gcodes, scheduled_prints and product components
+
+Revision ID: 20251019_hot_lookup_idx
+Revises: 20250423_cascade_fks
+Create Date: 2025-10-19 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20251019_hot_lookup_idx'
+down_revision = '20250423_cascade_fks'
+branch_labels = None
+depends_on = None
+
+# (index name, table, columns)
+INDEXES = [
+    # Gcode.query.filter_by(printer_id=...) in api/gcode.py and printer.gcodes
+    ('ix_gcodes_printer_id_gcode_name', 'gcodes', ['printer_id', 'gcode_name']),
+    # Per-printer schedule lanes ordered by start time
+    ('ix_scheduled_prints_printer_start', 'scheduled_prints', ['assigned_printer_id', 'scheduled_start_time']),
+    # "next pending job" / status filtered windows
+    ('ix_scheduled_prints_status_start', 'scheduled_prints', ['status', 'scheduled_start_time']),
+    ('ix_scheduled_prints_product_id', 'scheduled_prints', ['product_id']),
+    ('ix_product_components_product_id', 'product_components', ['product_id']),
+    # The composite PK covers (product_component_id, gcode_id); this covers the reverse direction.
+    ('ix_component_gcode_association_gcode_id', 'component_gcode_association', ['gcode_id']),
+]
+
+def upgrade():
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block. Raw SQL
+    # keeps IF NOT EXISTS independent of the installed Alembic version.
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.execute(
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} ({', '.join(columns)})"
+            )
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, _, _ in reversed(INDEXES):
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
@@ -0,0 +1,40 @@
+"""Add auto_connect flag to printers table
+
+Revision ID: 20251019_auto_connect
+Revises: 20251019_hot_lookup_idx
+Create Date: 2025-10-19 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.engine.reflection import Inspector
+
+# revision identifiers, used by Alembic.
+revision = '20251019_auto_connect'
+down_revision = '20251019_hot_lookup_idx'
+branch_labels = None
+depends_on = None
+
+def column_exists(table_name, column_name):
+    bind = op.get_bind()
+    inspector = Inspector.from_engine(bind)
+    return any(col['name'] == column_name for col in inspector.get_columns(table_name))
+
+def upgrade():
+    # Printers that should be re-attached automatically when the server starts.
+    with op.batch_alter_table('printers') as batch_op:
+        if not column_exists('printers', 'auto_connect'):
+            batch_op.add_column(
+                sa.Column(
+                    'auto_connect',
+                    sa.Boolean(),
+                    nullable=False,
+                    server_default=sa.text('false')
+                )
+            )
+            batch_op.alter_column('auto_connect', server_default=None)
+
+def downgrade():
+    with op.batch_alter_table('printers') as batch_op:
+        if column_exists('printers', 'auto_connect'):
+            batch_op.drop_column('auto_connect')
@@ -0,0 +1,36 @@
+"""Add poller_workers and poller_leases tables for scale-out polling
+
+Revision ID: 20251019_poller_leases
+Revises: 20251019_auto_connect
+Create Date: 2025-10-19 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20251019_poller_leases'
+down_revision = '20251019_auto_connect'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        'poller_workers',
+        sa.Column('worker_id', sa.String(255), primary_key=True),
+        sa.Column('heartbeat_at', sa.DateTime(), nullable=False)
+    )
+    op.create_table(
+        'poller_leases',
+        sa.Column('printer_id', sa.Integer,
+                  sa.ForeignKey('printers.printer_id', ondelete='CASCADE'),
+                  primary_key=True),
+        sa.Column('owner', sa.String(255), nullable=False),
+        sa.Column('expires_at', sa.DateTime(), nullable=False)
+    )
+    op.create_index('ix_poller_leases_owner', 'poller_leases', ['owner'])
+
+def downgrade():
+    op.drop_index('ix_poller_leases_owner', table_name='poller_leases')
+    op.drop_table('poller_leases')
+    op.drop_table('poller_workers')
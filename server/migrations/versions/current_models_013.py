@@ -0,0 +1,34 @@
+"""Add gcode_metadata_cache table
+
+Revision ID: 20251019_gcode_metadata_cache
+Revises: 20251019_poller_leases
+Create Date: 2025-10-19 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20251019_gcode_metadata_cache'
+down_revision = '20251019_poller_leases'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        'gcode_metadata_cache',
+        sa.Column('printer_id', sa.Integer,
+                  sa.ForeignKey('printers.printer_id', ondelete='CASCADE'),
+                  primary_key=True),
+        sa.Column('path', sa.String(1024), primary_key=True),
+        sa.Column('modified', sa.Float(), nullable=False),
+        sa.Column('size', sa.BigInteger(), nullable=False),
+        sa.Column('metadata', sa.JSON(), nullable=False),
+        sa.Column('last_used_at', sa.DateTime(), nullable=False),
+        sa.Column('hit_count', sa.Integer(), nullable=False, server_default='0')
+    )
+    op.create_index('ix_gcode_metadata_cache_last_used_at', 'gcode_metadata_cache', ['last_used_at'])
+
+def downgrade():
+    op.drop_index('ix_gcode_metadata_cache_last_used_at', table_name='gcode_metadata_cache')
+    op.drop_table('gcode_metadata_cache')
@@ -0,0 +1,38 @@
+"""Add spools table
+
+Revision ID: 20251019_spools
+Revises: 20251019_gcode_metadata_cache
+Create Date: 2025-10-19 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20251019_spools'
+down_revision = '20251019_gcode_metadata_cache'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        'spools',
+        sa.Column('spool_id', sa.Integer, primary_key=True),
+        sa.Column('label', sa.String(255), nullable=True),
+        sa.Column('material', sa.String(100), nullable=False),
+        sa.Column('filament_diameter', sa.Float(), nullable=False, server_default='1.75'),
+        sa.Column('density', sa.Float(), nullable=True),
+        sa.Column('hub_diameter', sa.Float(), nullable=True),
+        sa.Column('outer_diameter', sa.Float(), nullable=True),
+        sa.Column('spool_width', sa.Float(), nullable=True),
+        sa.Column('remaining_weight', sa.Float(), nullable=True),
+        sa.Column('printer_id', sa.Integer,
+                  sa.ForeignKey('printers.printer_id', ondelete='SET NULL'),
+                  nullable=True)
+    )
+    op.alter_column('spools', 'filament_diameter', server_default=None)
+    op.create_index('ix_spools_printer_id', 'spools', ['printer_id'])
+
+def downgrade():
+    op.drop_index('ix_spools_printer_id', table_name='spools')
+    op.drop_table('spools')
@@ -0,0 +1,44 @@
+"""Add job_filament_usage table and spools.consumed_length
+
+Revision ID: 20251019_filament_usage
+Revises: 20251019_spools
+Create Date: 2025-10-19 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20251019_filament_usage'
+down_revision = '20251019_spools'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.add_column('spools', sa.Column('consumed_length', sa.Float(), nullable=False, server_default='0'))
+    op.alter_column('spools', 'consumed_length', server_default=None)
+
+    op.create_table(
+        'job_filament_usage',
+        sa.Column('usage_id', sa.Integer, primary_key=True),
+        sa.Column('printer_id', sa.Integer,
+                  sa.ForeignKey('printers.printer_id', ondelete='CASCADE'),
+                  nullable=False),
+        sa.Column('spool_id', sa.Integer,
+                  sa.ForeignKey('spools.spool_id', ondelete='SET NULL'),
+                  nullable=True),
+        sa.Column('filename', sa.String(1024), nullable=True),
+        sa.Column('state', sa.String(50), nullable=True),
+        sa.Column('started_at', sa.DateTime(), nullable=False),
+        sa.Column('ended_at', sa.DateTime(), nullable=True),
+        sa.Column('filament_used', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('filament_weight', sa.Float(), nullable=True)
+    )
+    op.create_index('ix_job_filament_usage_printer_file', 'job_filament_usage', ['printer_id', 'filename'])
+    op.create_index('ix_job_filament_usage_started_at', 'job_filament_usage', ['started_at'])
+
+def downgrade():
+    op.drop_index('ix_job_filament_usage_started_at', table_name='job_filament_usage')
+    op.drop_index('ix_job_filament_usage_printer_file', table_name='job_filament_usage')
+    op.drop_table('job_filament_usage')
+    op.drop_column('spools', 'consumed_length')
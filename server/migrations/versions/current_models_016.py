@@ -0,0 +1,41 @@
+"""Add gcode_blobs and gcode_placements tables
+
+Revision ID: 20251019_gcode_store
+Revises: 20251019_filament_usage
+Create Date: 2025-10-19 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20251019_gcode_store'
+down_revision = '20251019_filament_usage'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        'gcode_blobs',
+        sa.Column('content_hash', sa.String(64), primary_key=True),
+        sa.Column('filename', sa.String(255), nullable=False),
+        sa.Column('size', sa.BigInteger(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False)
+    )
+    op.create_table(
+        'gcode_placements',
+        sa.Column('content_hash', sa.String(64),
+                  sa.ForeignKey('gcode_blobs.content_hash', ondelete='CASCADE'),
+                  primary_key=True),
+        sa.Column('printer_id', sa.Integer,
+                  sa.ForeignKey('printers.printer_id', ondelete='CASCADE'),
+                  primary_key=True),
+        sa.Column('path', sa.String(1024), primary_key=True),
+        sa.Column('uploaded_at', sa.DateTime(), nullable=False)
+    )
+    op.create_index('ix_gcode_placements_printer_id', 'gcode_placements', ['printer_id'])
+
+def downgrade():
+    op.drop_index('ix_gcode_placements_printer_id', table_name='gcode_placements')
+    op.drop_table('gcode_placements')
+    op.drop_table('gcode_blobs')
@@ -0,0 +1,54 @@
+"""Add print_jobs and print_history_cursors tables
+
+Revision ID: 20251019_print_jobs
+Revises: 20251019_gcode_store
+Create Date: 2025-10-19 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20251019_print_jobs'
+down_revision = '20251019_gcode_store'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        'print_jobs',
+        sa.Column('printer_id', sa.Integer,
+                  sa.ForeignKey('printers.printer_id', ondelete='CASCADE'),
+                  primary_key=True),
+        sa.Column('job_id', sa.String(64), primary_key=True),
+        sa.Column('filename', sa.String(1024), nullable=True),
+        sa.Column('status', sa.String(50), nullable=True),
+        sa.Column('start_time', sa.DateTime(), nullable=True),
+        sa.Column('end_time', sa.DateTime(), nullable=True),
+        sa.Column('print_duration', sa.Float(), nullable=True),
+        sa.Column('total_duration', sa.Float(), nullable=True),
+        sa.Column('filament_used', sa.Float(), nullable=True),
+        sa.Column('estimated_time', sa.Float(), nullable=True),
+        sa.Column('filament_total', sa.Float(), nullable=True),
+        sa.Column('filament_type', sa.String(50), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=False)
+    )
+    op.create_index('ix_print_jobs_printer_file', 'print_jobs', ['printer_id', 'filename'])
+    op.create_index('ix_print_jobs_start_time', 'print_jobs', ['start_time'])
+    op.create_index('ix_print_jobs_status', 'print_jobs', ['status'])
+
+    op.create_table(
+        'print_history_cursors',
+        sa.Column('printer_id', sa.Integer,
+                  sa.ForeignKey('printers.printer_id', ondelete='CASCADE'),
+                  primary_key=True),
+        sa.Column('since', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('synced_at', sa.DateTime(), nullable=True)
+    )
+
+def downgrade():
+    op.drop_table('print_history_cursors')
+    op.drop_index('ix_print_jobs_status', table_name='print_jobs')
+    op.drop_index('ix_print_jobs_start_time', table_name='print_jobs')
+    op.drop_index('ix_print_jobs_printer_file', table_name='print_jobs')
+    op.drop_table('print_jobs')
@@ -0,0 +1,68 @@
+"""Add analytics rollup tables and scheduled print lifecycle timestamps
+
+Revision ID: 20251019_analytics
+Revises: 20251019_print_jobs
+Create Date: 2025-10-19 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20251019_analytics'
+down_revision = '20251019_print_jobs'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.add_column('scheduled_prints', sa.Column('created_at', sa.DateTime(), nullable=True))
+    op.add_column('scheduled_prints', sa.Column('started_at', sa.DateTime(), nullable=True))
+    op.add_column('scheduled_prints', sa.Column('finished_at', sa.DateTime(), nullable=True))
+    op.create_index('ix_scheduled_prints_started_at', 'scheduled_prints', ['started_at'])
+    op.create_index('ix_scheduled_prints_finished_at', 'scheduled_prints', ['finished_at'])
+
+    op.add_column('print_jobs', sa.Column('rolled_up_to', sa.DateTime(), nullable=True))
+
+    op.create_table(
+        'analytics_usage',
+        sa.Column('granularity', sa.String(8), primary_key=True),
+        sa.Column('bucket_start', sa.DateTime(), primary_key=True),
+        sa.Column('printer_id', sa.Integer,
+                  sa.ForeignKey('printers.printer_id', ondelete='CASCADE'),
+                  primary_key=True),
+        sa.Column('material', sa.String(50), primary_key=True),
+        sa.Column('busy_seconds', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('jobs', sa.Integer(), nullable=False, server_default='0')
+    )
+    op.create_table(
+        'analytics_queue_wait',
+        sa.Column('granularity', sa.String(8), primary_key=True),
+        sa.Column('bucket_start', sa.DateTime(), primary_key=True),
+        sa.Column('wait_seconds', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('jobs', sa.Integer(), nullable=False, server_default='0')
+    )
+    op.create_table(
+        'analytics_product_on_time',
+        sa.Column('product_id', sa.Integer,
+                  sa.ForeignKey('products.product_id', ondelete='CASCADE'),
+                  primary_key=True),
+        sa.Column('completed', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('on_time', sa.Integer(), nullable=False, server_default='0')
+    )
+    op.create_table(
+        'analytics_watermarks',
+        sa.Column('name', sa.String(50), primary_key=True),
+        sa.Column('value', sa.DateTime(), nullable=False)
+    )
+
+def downgrade():
+    op.drop_table('analytics_watermarks')
+    op.drop_table('analytics_product_on_time')
+    op.drop_table('analytics_queue_wait')
+    op.drop_table('analytics_usage')
+    op.drop_column('print_jobs', 'rolled_up_to')
+    op.drop_index('ix_scheduled_prints_finished_at', table_name='scheduled_prints')
+    op.drop_index('ix_scheduled_prints_started_at', table_name='scheduled_prints')
+    op.drop_column('scheduled_prints', 'finished_at')
+    op.drop_column('scheduled_prints', 'started_at')
+    op.drop_column('scheduled_prints', 'created_at')
@@ -0,0 +1,38 @@
+"""Add indexes for the timeline's start-time range and long-print lookups
+
+Revision ID: 20251019_timeline_idx
+Revises: 20251019_analytics
+Create Date: 2025-10-19 19:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20251019_timeline_idx'
+down_revision = '20251019_analytics'
+branch_labels = None
+depends_on = None
+
+# (index name, table, columns)
+INDEXES = [
+    # /scheduled_prints/timeline without a printers filter
+    ('ix_scheduled_prints_start', 'scheduled_prints', ['scheduled_start_time']),
+    # max(estimated_print_time) and the gcodes of long prints
+    ('ix_gcodes_estimated_print_time', 'gcodes', ['estimated_print_time']),
+    # Scheduled prints of those long gcodes
+    ('ix_scheduled_prints_gcode_start', 'scheduled_prints', ['gcode_id', 'scheduled_start_time']),
+]
+
+def upgrade():
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block.
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.execute(
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} ({', '.join(columns)})"
+            )
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, _, _ in reversed(INDEXES):
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
@@ -5,4 +5,11 @@ db = SQLAlchemy()
 from .printers import Printer
 from .gcode import Gcode
 from .scheduled_print import ScheduledPrint
-from .product import Product, ProductComponent
\ No newline at end of file
+from .product import Product, ProductComponent
+from .poller_lease import PollerWorker, PollerLease
+from .gcode_metadata import GcodeMetadataCache
+from .spool import Spool
+from .filament_usage import JobFilamentUsage
+from .gcode_store import GcodeBlob, GcodePlacement
+from .print_job import PrintJob, PrintHistoryCursor
+from .analytics import UsageRollup, QueueWaitRollup, ProductOnTime, AnalyticsWatermark
@@ -0,0 +1,48 @@
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey
+from models import db
+
+# Bucket granularities of the rollups, in seconds.
+GRANULARITIES = {"hour": 3600, "day": 86400}
+
+class UsageRollup(db.Model):
+    """Seconds a printer spent printing a material within one UTC hour or day."""
+    __tablename__ = 'analytics_usage'
+
+    granularity = Column(String(8), primary_key=True)
+    bucket_start = Column(DateTime, primary_key=True)    # UTC
+    printer_id = Column(
+        Integer,
+        ForeignKey('printers.printer_id', ondelete='CASCADE'),
+        primary_key=True
+    )
+    material = Column(String(50), primary_key=True)
+    busy_seconds = Column(Float, nullable=False, default=0.0)
+    jobs = Column(Integer, nullable=False, default=0)    # jobs that started in the bucket
+
+class QueueWaitRollup(db.Model):
+    """Summed wait of the scheduled prints that started within one UTC hour or day."""
+    __tablename__ = 'analytics_queue_wait'
+
+    granularity = Column(String(8), primary_key=True)
+    bucket_start = Column(DateTime, primary_key=True)    # UTC
+    wait_seconds = Column(Float, nullable=False, default=0.0)
+    jobs = Column(Integer, nullable=False, default=0)
+
+class ProductOnTime(db.Model):
+    """Finished scheduled prints of a product, and how many met their deadline."""
+    __tablename__ = 'analytics_product_on_time'
+
+    product_id = Column(
+        Integer,
+        ForeignKey('products.product_id', ondelete='CASCADE'),
+        primary_key=True
+    )
+    completed = Column(Integer, nullable=False, default=0)
+    on_time = Column(Integer, nullable=False, default=0)
+
+class AnalyticsWatermark(db.Model):
+    """How far each rollup has consumed its source rows."""
+    __tablename__ = 'analytics_watermarks'
+
+    name = Column(String(50), primary_key=True)
+    value = Column(DateTime, nullable=False)
@@ -0,0 +1,33 @@
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey
+from models import db
+
+class JobFilamentUsage(db.Model):
+    """Filament actually consumed by one print job, accumulated from live telemetry."""
+    __tablename__ = 'job_filament_usage'
+    __table_args__ = (
+        db.Index('ix_job_filament_usage_printer_file', 'printer_id', 'filename'),
+        db.Index('ix_job_filament_usage_started_at', 'started_at'),
+    )
+
+    usage_id = Column(Integer, primary_key=True)
+    printer_id = Column(Integer, ForeignKey('printers.printer_id', ondelete='CASCADE'), nullable=False)
+    spool_id = Column(Integer, ForeignKey('spools.spool_id', ondelete='SET NULL'), nullable=True)
+    filename = Column(String(1024), nullable=True)
+    state = Column(String(50), nullable=True)
+    started_at = Column(DateTime, nullable=False)
+    ended_at = Column(DateTime, nullable=True)
+    filament_used = Column(Float, nullable=False, default=0.0)   # mm
+    filament_weight = Column(Float, nullable=True)               # g, using the spool's density
+
+    def to_dict(self):
+        return {
+            "usage_id": self.usage_id,
+            "printer_id": self.printer_id,
+            "spool_id": self.spool_id,
+            "filename": self.filename,
+            "state": self.state,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "ended_at": self.ended_at.isoformat() if self.ended_at else None,
+            "filament_used": self.filament_used,
+            "filament_weight": self.filament_weight,
+        }
@@ -3,6 +3,10 @@ from models import db
 
 class Gcode(db.Model):
     __tablename__ = 'gcodes'
+    __table_args__ = (
+        db.Index('ix_gcodes_printer_id_gcode_name', 'printer_id', 'gcode_name'),
+        db.Index('ix_gcodes_estimated_print_time', 'estimated_print_time'),
+    )
 
     gcode_id = db.Column(db.Integer, primary_key=True)
     printer_id = db.Column(db.Integer, db.ForeignKey('printers.printer_id'), nullable=False)
@@ -0,0 +1,37 @@
+from sqlalchemy import Column, Integer, String, Float, BigInteger, DateTime, ForeignKey
+from models import db
+
+class GcodeMetadataCache(db.Model):
+    """
+    Moonraker /server/files/metadata results, keyed by printer and file path.
+    An entry is only valid while the file's modified time and size match.
+    """
+    __tablename__ = 'gcode_metadata_cache'
+    __table_args__ = (
+        db.Index('ix_gcode_metadata_cache_last_used_at', 'last_used_at'),
+    )
+
+    printer_id = Column(
+        Integer,
+        ForeignKey('printers.printer_id', ondelete='CASCADE'),
+        primary_key=True
+    )
+    path = Column(String(1024), primary_key=True)
+    modified = Column(Float, nullable=False)
+    size = Column(BigInteger, nullable=False)
+    file_metadata = Column('metadata', db.JSON, nullable=False)
+    last_used_at = Column(DateTime, nullable=False)
+    hit_count = Column(Integer, nullable=False, default=0)
+
+    def matches(self, file_info):
+        return self.modified == file_info.get("modified") and self.size == file_info.get("size")
+
+    def to_dict(self):
+        return {
+            "printer_id": self.printer_id,
+            "path": self.path,
+            "modified": self.modified,
+            "size": self.size,
+            "last_used_at": self.last_used_at.isoformat() if self.last_used_at else None,
+            "hit_count": self.hit_count,
+        }
@@ -0,0 +1,50 @@
+from sqlalchemy import Column, Integer, String, BigInteger, DateTime, ForeignKey
+from models import db
+
+class GcodeBlob(db.Model):
+    """A gcode file in the central store, addressed by the hash of its contents."""
+    __tablename__ = 'gcode_blobs'
+
+    content_hash = Column(String(64), primary_key=True)
+    filename = Column(String(255), nullable=False)
+    size = Column(BigInteger, nullable=False)
+    created_at = Column(DateTime, nullable=False)
+
+    placements = db.relationship('GcodePlacement', backref='blob', lazy='dynamic',
+                                 cascade='all, delete-orphan')
+
+    def to_dict(self):
+        return {
+            "content_hash": self.content_hash,
+            "filename": self.filename,
+            "size": self.size,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+        }
+
+class GcodePlacement(db.Model):
+    """A stored gcode that has been uploaded to a printer under path."""
+    __tablename__ = 'gcode_placements'
+    __table_args__ = (
+        db.Index('ix_gcode_placements_printer_id', 'printer_id'),
+    )
+
+    content_hash = Column(
+        String(64),
+        ForeignKey('gcode_blobs.content_hash', ondelete='CASCADE'),
+        primary_key=True
+    )
+    printer_id = Column(
+        Integer,
+        ForeignKey('printers.printer_id', ondelete='CASCADE'),
+        primary_key=True
+    )
+    path = Column(String(1024), primary_key=True)
+    uploaded_at = Column(DateTime, nullable=False)
+
+    def to_dict(self):
+        return {
+            "content_hash": self.content_hash,
+            "printer_id": self.printer_id,
+            "path": self.path,
+            "uploaded_at": self.uploaded_at.isoformat() if self.uploaded_at else None,
+        }
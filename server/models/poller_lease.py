@@ -0,0 +1,37 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from models import db
+
+class PollerWorker(db.Model):
+    """A server process taking part in scale-out polling, with its last heartbeat."""
+    __tablename__ = 'poller_workers'
+
+    worker_id = Column(String(255), primary_key=True)
+    heartbeat_at = Column(DateTime, nullable=False)
+
+    def to_dict(self):
+        return {
+            "worker_id": self.worker_id,
+            "heartbeat_at": self.heartbeat_at.isoformat() if self.heartbeat_at else None,
+        }
+
+class PollerLease(db.Model):
+    """Ownership of one printer's poller by one worker until expires_at."""
+    __tablename__ = 'poller_leases'
+    __table_args__ = (
+        db.Index('ix_poller_leases_owner', 'owner'),
+    )
+
+    printer_id = Column(
+        Integer,
+        ForeignKey('printers.printer_id', ondelete='CASCADE'),
+        primary_key=True
+    )
+    owner = Column(String(255), nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+
+    def to_dict(self):
+        return {
+            "printer_id": self.printer_id,
+            "owner": self.owner,
+            "expires_at": self.expires_at.isoformat() if self.expires_at else None,
+        }
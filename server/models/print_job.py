@@ -0,0 +1,60 @@
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey
+from models import db
+
+class PrintJob(db.Model):
+    """A job from a printer's Moonraker history, archived locally."""
+    __tablename__ = 'print_jobs'
+    __table_args__ = (
+        db.Index('ix_print_jobs_printer_file', 'printer_id', 'filename'),
+        db.Index('ix_print_jobs_start_time', 'start_time'),
+        db.Index('ix_print_jobs_status', 'status'),
+    )
+
+    printer_id = Column(
+        Integer,
+        ForeignKey('printers.printer_id', ondelete='CASCADE'),
+        primary_key=True
+    )
+    job_id = Column(String(64), primary_key=True)    # Moonraker's id, unique per printer
+    filename = Column(String(1024), nullable=True)
+    status = Column(String(50), nullable=True)       # in_progress, completed, cancelled, error, ...
+    start_time = Column(DateTime, nullable=True)     # UTC
+    end_time = Column(DateTime, nullable=True)
+    print_duration = Column(Float, nullable=True)    # s
+    total_duration = Column(Float, nullable=True)    # s
+    filament_used = Column(Float, nullable=True)     # mm
+    estimated_time = Column(Float, nullable=True)    # s, slicer estimate from the file metadata
+    filament_total = Column(Float, nullable=True)    # mm, slicer estimate
+    filament_type = Column(String(50), nullable=True)
+    updated_at = Column(DateTime, nullable=False)
+    # End of the part of this job already counted in analytics_usage.
+    rolled_up_to = Column(DateTime, nullable=True)
+
+    def to_dict(self):
+        return {
+            "printer_id": self.printer_id,
+            "job_id": self.job_id,
+            "filename": self.filename,
+            "status": self.status,
+            "start_time": self.start_time.isoformat() if self.start_time else None,
+            "end_time": self.end_time.isoformat() if self.end_time else None,
+            "print_duration": self.print_duration,
+            "total_duration": self.total_duration,
+            "filament_used": self.filament_used,
+            "estimated_time": self.estimated_time,
+            "filament_total": self.filament_total,
+            "filament_type": self.filament_type,
+        }
+
+class PrintHistoryCursor(db.Model):
+    """How far a printer's history has been ingested into print_jobs."""
+    __tablename__ = 'print_history_cursors'
+
+    printer_id = Column(
+        Integer,
+        ForeignKey('printers.printer_id', ondelete='CASCADE'),
+        primary_key=True
+    )
+    # Moonraker start_time (UNIX seconds) to pass as "since" on the next pull.
+    since = Column(Float, nullable=False, default=0.0)
+    synced_at = Column(DateTime, nullable=True)
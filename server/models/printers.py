@@ -20,11 +20,15 @@ class Printer(db.Model):
     # New fields for live stream scaling configuration:
     camera_resolution_width = Column(Integer, nullable=True)   # e.g., 1920
     camera_resolution_height = Column(Integer, nullable=True)  # e.g., 1080
-    camera_scaling_factor = Column(Float, nullable=True)       # e.g., 0.75
+    camera_scaling_factor = Column(Float, nullable=True)       # e.g., 1.3: proxied frames are shrunk by this
 
     # **New heated chamber flag**
     heated_chamber = Column(Boolean, nullable=False, default=False)
 
+    # Set by /printers/connect and cleared by /printers/disconnect; printers
+    # with this flag are re-attached in the background when the server starts.
+    auto_connect = Column(Boolean, nullable=False, default=False)
+
     # Instead of product_components, each Printer has gcodes:
     gcodes = db.relationship('Gcode', backref='printer', lazy='dynamic')
 
@@ -47,4 +51,5 @@ class Printer(db.Model):
             "camera_scaling_factor": self.camera_scaling_factor,
             # include the new field
             "heated_chamber": self.heated_chamber,
+            "auto_connect": self.auto_connect,
         }
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, Table
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, Table, Index
 from sqlalchemy.orm import backref
 from models import db
 
@@ -17,7 +17,9 @@ component_gcode_association = Table(
         Integer,
         ForeignKey('gcodes.gcode_id', ondelete='CASCADE'),
         primary_key=True
-    )
+    ),
+    # The composite PK only serves lookups by product_component_id first.
+    Index('ix_component_gcode_association_gcode_id', 'gcode_id')
 )
 
 class Product(db.Model):
@@ -45,6 +47,9 @@ class Product(db.Model):
 
 class ProductComponent(db.Model):
     __tablename__ = 'product_components'
+    __table_args__ = (
+        Index('ix_product_components_product_id', 'product_id'),
+    )
     
     id = Column(Integer, primary_key=True)
     product_id = Column(
@@ -1,8 +1,26 @@
+from datetime import datetime
 from sqlalchemy import Column, Integer, String, Time, DateTime
 from models import db
 
+# Status -> the lifecycle timestamp a transition into it sets.
+STATUS_TIMESTAMPS = {
+    "printing": "started_at",
+    "done": "finished_at",
+    "failed": "finished_at",
+    "cancelled": "finished_at",
+}
+
 class ScheduledPrint(db.Model):
     __tablename__ = 'scheduled_prints'
+    __table_args__ = (
+        db.Index('ix_scheduled_prints_printer_start', 'assigned_printer_id', 'scheduled_start_time'),
+        db.Index('ix_scheduled_prints_status_start', 'status', 'scheduled_start_time'),
+        db.Index('ix_scheduled_prints_product_id', 'product_id'),
+        db.Index('ix_scheduled_prints_start', 'scheduled_start_time'),
+        db.Index('ix_scheduled_prints_gcode_start', 'gcode_id', 'scheduled_start_time'),
+        db.Index('ix_scheduled_prints_started_at', 'started_at'),
+        db.Index('ix_scheduled_prints_finished_at', 'finished_at'),
+    )
     scheduled_id = db.Column(db.Integer, primary_key=True)
     deadline = db.Column(db.DateTime, nullable=False)
     gcode_id = db.Column(db.Integer, db.ForeignKey('gcodes.gcode_id'), nullable=False)
@@ -11,14 +29,32 @@ class ScheduledPrint(db.Model):
     status = db.Column(db.String(50), default='pending')
     # New optional field to indicate that this scheduled print is part of a product package.
     product_id = db.Column(db.Integer, db.ForeignKey('products.product_id'), nullable=True)
+    # Lifecycle timestamps (server local time, like scheduled_start_time) for analytics.
+    created_at = db.Column(db.DateTime, default=datetime.now)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    @staticmethod
+    def lifecycle_values(status, now=None):
+        """Column values to write along with a status change, e.g. {"started_at": now}."""
+        column = STATUS_TIMESTAMPS.get(status)
+        return {column: now or datetime.now()} if column else {}
 
     def to_dict(self):
+        return self.row_to_dict(self)
+
+    @staticmethod
+    def row_to_dict(row):
+        """to_dict() for anything with the column attributes, e.g. a RETURNING row."""
         return {
-            "scheduled_id": self.scheduled_id,
-            "deadline": self.deadline.isoformat() if self.deadline else None,
-            "gcode_id": self.gcode_id,
-            "assigned_printer_id": self.assigned_printer_id,
-            "scheduled_start_time": self.scheduled_start_time.isoformat() if self.scheduled_start_time else None,
-            "status": self.status,
-            "product_id": self.product_id
+            "scheduled_id": row.scheduled_id,
+            "deadline": row.deadline.isoformat() if row.deadline else None,
+            "gcode_id": row.gcode_id,
+            "assigned_printer_id": row.assigned_printer_id,
+            "scheduled_start_time": row.scheduled_start_time.isoformat() if row.scheduled_start_time else None,
+            "status": row.status,
+            "product_id": row.product_id,
+            "created_at": row.created_at.isoformat() if row.created_at else None,
+            "started_at": row.started_at.isoformat() if row.started_at else None,
+            "finished_at": row.finished_at.isoformat() if row.finished_at else None
         }
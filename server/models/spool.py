@@ -0,0 +1,38 @@
+from sqlalchemy import Column, Integer, String, Float, ForeignKey
+from models import db
+
+class Spool(db.Model):
+    __tablename__ = 'spools'
+    __table_args__ = (
+        db.Index('ix_spools_printer_id', 'printer_id'),
+    )
+
+    spool_id = Column(Integer, primary_key=True)
+    label = Column(String(255), nullable=True)
+    material = Column(String(100), nullable=False)
+    filament_diameter = Column(Float, nullable=False, default=1.75)   # mm
+    density = Column(Float, nullable=True)                            # g/cm^3; material default if unset
+    # Spool geometry in mm, used when no weight measurement is available.
+    hub_diameter = Column(Float, nullable=True)
+    outer_diameter = Column(Float, nullable=True)                     # current outer winding diameter
+    spool_width = Column(Float, nullable=True)
+    remaining_weight = Column(Float, nullable=True)                   # g of filament (without the spool)
+    # mm consumed (from telemetry) since remaining_weight/outer_diameter were last measured.
+    consumed_length = Column(Float, nullable=False, default=0.0)
+    # Printer the spool is currently loaded on, if any.
+    printer_id = Column(Integer, ForeignKey('printers.printer_id', ondelete='SET NULL'), nullable=True)
+
+    def to_dict(self):
+        return {
+            "spool_id": self.spool_id,
+            "label": self.label,
+            "material": self.material,
+            "filament_diameter": self.filament_diameter,
+            "density": self.density,
+            "hub_diameter": self.hub_diameter,
+            "outer_diameter": self.outer_diameter,
+            "spool_width": self.spool_width,
+            "remaining_weight": self.remaining_weight,
+            "consumed_length": self.consumed_length,
+            "printer_id": self.printer_id,
+        }
@@ -0,0 +1,473 @@
+#!/usr/bin/env python
+"""
+Moonraker fleet simulator.
+
+Emulates many Moonraker instances in one eventlet process, each on its own
+loopback address (127.20.0.1, 127.20.0.2, ...) or its own port, so the
+server's pollers, sockets, gcode sync and job control can be exercised
+without real printers. Simulated endpoints:
+
+    GET/POST /printer/objects/query
+    GET      /server/files/list, /server/files/metadata, /server/history/list
+    POST     /server/files/upload
+    POST     /printer/print/start|pause|resume|cancel, /printer/emergency_stop,
+             /printer/gcode/script
+    WS       /websocket   JSON-RPC incl. printer.objects.subscribe ->
+                          notify_status_update, and notify_history_changed
+
+Print progress advances in real time; result.eventtime is wall-clock time so clients
+on the same host can measure end-to-end latency. A control server reports
+request counts on GET /stats and the printer list on GET /printers.
+
+Usage:
+    python moonraker_simulator.py --count 100                       # 127.20.0.1..100 :7125
+    python moonraker_simulator.py --count 50 --address 127.0.0.1 --port 8000 --port-per-printer
+    python moonraker_simulator.py --count 200 --latency 0.02 --failure-rate 0.01 --auto-print
+"""
+import eventlet
+eventlet.monkey_patch()
+
+import argparse
+import ipaddress
+import json
+import random
+import time
+from collections import Counter
+from urllib.parse import parse_qs, unquote
+
+from eventlet import wsgi, websocket
+
+DEFAULT_FILES = [
+    ("bracket_PLA.gcode", "PLA", 1800, 4200.0),
+    ("housing_PETG.gcode", "PETG", 5400, 15800.0),
+    ("clip_ASA.gcode", "ASA", 900, 1900.0),
+    ("cover_PLA.gcode", "PLA", 3600, 9100.0),
+]
+
+stats = Counter()
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Simulate a fleet of Moonraker printers.")
+    parser.add_argument('--count', type=int, default=10, help='Number of printers')
+    parser.add_argument('--address', default='127.20.0.1', help='First printer address')
+    parser.add_argument('--port', type=int, default=7125, help='Moonraker port (first port with --port-per-printer)')
+    parser.add_argument('--port-per-printer', action='store_true',
+                        help='Share --address and give each printer its own port instead')
+    parser.add_argument('--control-port', type=int, default=7199, help='Port of the /stats control server')
+    parser.add_argument('--latency', type=float, default=0.0, help='Mean added response latency (s)')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Uniform +/- latency jitter (s)')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='Fraction of HTTP requests answered 503')
+    parser.add_argument('--print-seconds', type=float, default=600, help='Simulated duration of every print')
+    parser.add_argument('--auto-print', action='store_true', help='Idle printers start a random file by themselves')
+    parser.add_argument('--idle-seconds', type=float, default=30, help='Idle time before an auto print starts')
+    parser.add_argument('--seed', type=int, default=None)
+    return parser.parse_args()
+
+
+class SimulatedPrinter:
+    """State of one printer; everything is derived lazily from wall-clock time."""
+
+    def __init__(self, index, address, port, args):
+        self.index = index
+        self.address = address
+        self.port = port
+        self.args = args
+        self.files = {
+            name: {"material": material, "estimated_time": seconds, "filament_total": filament,
+                   "size": 200000 + 5000 * i, "modified": time.time() - 86400 * (i + 1)}
+            for i, (name, material, seconds, filament) in enumerate(DEFAULT_FILES)
+        }
+        self.history = []
+        self.history_events = []     # (action, job) for notify_history_changed
+        self.state = "standby"
+        self.filename = ""
+        self.print_seconds = args.print_seconds
+        self.started_at = None
+        self.paused_at = None
+        self.ended_at = None
+        self.paused_total = 0.0
+        self.idle_since = time.time() - random.uniform(0, args.idle_seconds)
+        self.bed_target = 0.0
+        self.extruder_target = 0.0
+
+    # -- job control -------------------------------------------------------
+    def _elapsed(self, now):
+        if self.started_at is None:
+            return 0.0
+        end = self.ended_at or self.paused_at or now
+        return max(0.0, end - self.started_at - self.paused_total)
+
+    def update(self, now=None):
+        now = now or time.time()
+        if self.state == "printing" and self._elapsed(now) >= self.print_seconds:
+            self._finish("complete", now)
+        elif self.args.auto_print and self.state in ("standby", "complete", "cancelled") \
+                and now - self.idle_since >= self.args.idle_seconds:
+            self.start(random.choice(list(self.files)), now)
+
+    def start(self, filename, now=None):
+        if self.state in ("printing", "paused"):
+            return False
+        if filename not in self.files:
+            return False
+        now = now or time.time()
+        self.state, self.filename = "printing", filename
+        self.started_at, self.paused_at, self.paused_total = now, None, 0.0
+        self.ended_at = None
+        self.bed_target, self.extruder_target = 60.0, 215.0
+        info = self.files[filename]
+        job = {
+            "job_id": f"{self.index:04d}{len(self.history):06d}",
+            "exists": True,
+            "filename": filename,
+            "status": "in_progress",
+            "start_time": now,
+            "end_time": None,
+            "total_duration": 0.0,
+            "print_duration": 0.0,
+            "filament_used": 0.0,
+            "metadata": {"estimated_time": info["estimated_time"], "filament_total": info["filament_total"],
+                         "filament_type": info["material"], "size": info["size"]},
+        }
+        self.history.append(job)
+        self.history_events.append(("added", dict(job)))
+        return True
+
+    def pause(self):
+        if self.state != "printing":
+            return False
+        self.state, self.paused_at = "paused", time.time()
+        return True
+
+    def resume(self):
+        if self.state != "paused":
+            return False
+        self.paused_total += time.time() - self.paused_at
+        self.state, self.paused_at = "printing", None
+        return True
+
+    def cancel(self):
+        if self.state not in ("printing", "paused"):
+            return False
+        self._finish("cancelled", time.time())
+        return True
+
+    def _finish(self, state, now):
+        job = self.history[-1]
+        job.update({
+            "status": "completed" if state == "complete" else state,
+            "end_time": now,
+            "total_duration": now - self.started_at,
+            "print_duration": self._elapsed(now),
+            "filament_used": self._filament_used(now),
+        })
+        self.history_events.append(("finished", dict(job)))
+        self.state = state
+        self.ended_at = self.idle_since = now
+        self.bed_target = self.extruder_target = 0.0
+
+    # -- status ------------------------------------------------------------
+    def _progress(self, now):
+        if not self.filename or self.started_at is None:
+            return 0.0
+        if self.state == "complete":
+            return 1.0
+        return min(1.0, self._elapsed(now) / self.print_seconds)
+
+    def _filament_used(self, now):
+        info = self.files.get(self.filename)
+        return info["filament_total"] * self._progress(now) if info else 0.0
+
+    def status(self, objects, now=None):
+        now = now or time.time()
+        self.update(now)
+        progress = self._progress(now)
+        wobble = random.uniform(-0.3, 0.3)
+        available = {
+            "webhooks": lambda: {"state": "ready", "state_message": "Printer is ready"},
+            "print_stats": lambda: {
+                "filename": self.filename,
+                "total_duration": (self.ended_at or now) - self.started_at if self.started_at else 0.0,
+                "print_duration": self._elapsed(now),
+                "filament_used": round(self._filament_used(now), 3),
+                "state": self.state,
+                "message": "",
+                "info": {"total_layer": 200, "current_layer": int(200 * progress)},
+            },
+            "display_status": lambda: {"progress": round(progress, 4), "message": None},
+            "virtual_sdcard": lambda: {
+                "file_path": self.filename, "progress": round(progress, 4),
+                "is_active": self.state == "printing",
+                "file_position": int(progress * self.files.get(self.filename, {"size": 0})["size"]),
+            },
+            "extruder": lambda: {"temperature": round(self.extruder_target + wobble, 2) if self.extruder_target else 24.0,
+                                 "target": self.extruder_target, "power": 0.4 if self.extruder_target else 0.0},
+            "heater_bed": lambda: {"temperature": round(self.bed_target + wobble, 2) if self.bed_target else 23.5,
+                                   "target": self.bed_target, "power": 0.3 if self.bed_target else 0.0},
+            "toolhead": lambda: {"position": [120.0, 110.0, round(30 * progress, 2), 0.0],
+                                 "homed_axes": "xyz" if self.state == "printing" else "", "print_time": self._elapsed(now)},
+            "gcode_move": lambda: {"speed_factor": 1.0, "extrude_factor": 1.0,
+                                   "gcode_position": [120.0, 110.0, round(30 * progress, 2), 0.0]},
+            "temperature_sensor chamber_temp": lambda: {"temperature": 35.0 + wobble},
+        }
+        keys = objects or available.keys()
+        status = {key: available[key]() for key in keys if key in available}
+        if isinstance(objects, dict):
+            # {object: [field, ...]} selects fields; None or [] means all of them.
+            for key, fields in objects.items():
+                if fields and key in status:
+                    status[key] = {field: value for field, value in status[key].items() if field in fields}
+        return status
+
+    def file_list(self):
+        return [{"path": name, "modified": f["modified"], "size": f["size"], "permissions": "rw"}
+                for name, f in self.files.items()]
+
+    def metadata(self, filename):
+        f = self.files.get(filename)
+        if f is None:
+            return None
+        return {"filename": filename, "size": f["size"], "modified": f["modified"],
+                "estimated_time": f["estimated_time"], "filament_total": f["filament_total"],
+                "filament_type": f["material"], "slicer": "SimSlicer"}
+
+
+# -- HTTP ------------------------------------------------------------------
+def _query_objects(query):
+    """GET form of printer.objects.query, ?toolhead&extruder=temperature,target -> {object: fields}."""
+    objects = {}
+    for part in query.split("&"):
+        if part:
+            name, _, fields = part.partition("=")
+            objects[unquote(name)] = [unquote(field) for field in fields.split(",")] if fields else None
+    return objects
+
+
+def _respond(start_response, status, payload):
+    body = json.dumps(payload).encode()
+    start_response(status, [("Content-Type", "application/json"), ("Content-Length", str(len(body)))])
+    return [body]
+
+
+def make_app(printer, args):
+    ws_app = websocket.WebSocketWSGI(lambda ws: serve_websocket(ws, printer))
+
+    def app(environ, start_response):
+        path = environ.get("PATH_INFO", "")
+        if path == "/websocket":
+            stats["ws_connections"] += 1
+            return ws_app(environ, start_response)
+
+        stats[path] += 1
+        if args.latency or args.jitter:
+            eventlet.sleep(max(0.0, args.latency + random.uniform(-args.jitter, args.jitter)))
+        if args.failure_rate and random.random() < args.failure_rate:
+            stats["failures"] += 1
+            return _respond(start_response, "503 Service Unavailable", {"error": "simulated failure"})
+
+        params = {k: v[0] for k, v in parse_qs(environ.get("QUERY_STRING", "")).items()}
+        if environ["REQUEST_METHOD"] == "POST" and environ.get("CONTENT_TYPE", "").startswith("application/json"):
+            # Moonraker takes POST arguments as a JSON body as well as in the query string.
+            try:
+                body = json.loads(environ["wsgi.input"].read() or b"{}")
+            except ValueError:
+                return _respond(start_response, "400 Bad Request", {"error": {"code": 400, "message": "Invalid JSON"}})
+            if isinstance(body, dict):
+                params.update(body)
+        elif path == "/printer/objects/query":
+            params["objects"] = _query_objects(environ.get("QUERY_STRING", ""))
+        result = handle(printer, path, params, environ)
+        if result is None:
+            return _respond(start_response, "404 Not Found", {"error": {"code": 404, "message": f"Not found: {path}"}})
+        if isinstance(result, tuple):
+            return _respond(start_response, "400 Bad Request", {"error": {"code": 400, "message": result[1]}})
+        return _respond(start_response, "200 OK", {"result": result})
+
+    return app
+
+
+def handle(printer, path, params, environ=None):
+    """Shared HTTP / JSON-RPC dispatch. Returns a result, None (404) or (400, message)."""
+    if path == "/printer/objects/query":
+        return {"eventtime": time.time(), "status": printer.status(params.get("objects") or None)}
+    if path == "/server/files/list":
+        return printer.file_list()
+    if path == "/server/files/metadata":
+        meta = printer.metadata(params.get("filename", ""))
+        return meta if meta is not None else (400, "File not found")
+    if path == "/server/history/list":
+        printer.update()
+        since, before = float(params.get("since", 0) or 0), params.get("before")
+        jobs = [j for j in printer.history if j["start_time"] > since
+                and (before is None or j["start_time"] < float(before))]
+        if params.get("order", "desc") == "desc":
+            jobs.reverse()
+        start = int(params.get("start", 0))
+        return {"count": len(jobs), "jobs": jobs[start:start + int(params.get("limit", 50))]}
+    if path == "/server/files/upload":
+        return upload(printer, environ)
+    if path == "/printer/print/start":
+        return "ok" if printer.start(params.get("filename", "")) else (400, "Cannot start print")
+    if path == "/printer/print/pause":
+        return "ok" if printer.pause() else (400, "Not printing")
+    if path == "/printer/print/resume":
+        return "ok" if printer.resume() else (400, "Not paused")
+    if path == "/printer/print/cancel":
+        return "ok" if printer.cancel() else (400, "Not printing")
+    if path in ("/printer/emergency_stop", "/printer/gcode/script"):
+        return "ok"
+    return None
+
+
+def upload(printer, environ):
+    """Accept a multipart upload without buffering it; only the filename is kept."""
+    if environ is None:
+        return (400, "Upload requires HTTP")
+    stream = environ["wsgi.input"]
+    head = stream.read(64 * 1024)
+    marker = b'filename="'
+    start = head.find(marker)
+    if start < 0:
+        return (400, "No file")
+    name = head[start + len(marker):head.find(b'"', start + len(marker))].decode(errors="replace")
+    size = len(head)
+    for chunk in iter(lambda: stream.read(1024 * 1024), b""):
+        size += len(chunk)
+    printer.files[name] = {"material": "PLA", "estimated_time": 1800, "filament_total": 5000.0,
+                           "size": size, "modified": time.time()}
+    stats["uploaded_bytes"] += size
+    return {"item": {"path": name, "root": "gcodes", "size": size}, "action": "create_file"}
+
+
+# -- WebSocket JSON-RPC -----------------------------------------------------
+RPC_PATHS = {
+    "printer.objects.query": "/printer/objects/query",
+    "server.files.list": "/server/files/list",
+    "server.files.metadata": "/server/files/metadata",
+    "server.history.list": "/server/history/list",
+    "printer.print.start": "/printer/print/start",
+    "printer.print.pause": "/printer/print/pause",
+    "printer.print.resume": "/printer/print/resume",
+    "printer.print.cancel": "/printer/print/cancel",
+    "printer.emergency_stop": "/printer/emergency_stop",
+    "printer.gcode.script": "/printer/gcode/script",
+}
+NOTIFY_INTERVAL = 0.25
+
+
+def _diff(old, new):
+    changed = {}
+    for obj, values in new.items():
+        before = old.get(obj, {})
+        delta = {k: v for k, v in values.items() if before.get(k) != v}
+        if delta:
+            changed[obj] = delta
+    return changed
+
+
+def serve_websocket(ws, printer):
+    subscription = {"objects": None, "last": None}
+
+    def notifier():
+        seen = len(printer.history_events)
+        while True:
+            eventlet.sleep(NOTIFY_INTERVAL)
+            printer.update()
+            for action, job in printer.history_events[seen:]:
+                ws.send(json.dumps({"jsonrpc": "2.0", "method": "notify_history_changed",
+                                    "params": [{"action": action, "job": job}]}))
+                stats["ws_notifications"] += 1
+            seen = len(printer.history_events)
+            if subscription["last"] is None:
+                continue
+            status = printer.status(subscription["objects"])
+            delta = _diff(subscription["last"], status)
+            subscription["last"] = status
+            if delta:
+                ws.send(json.dumps({"jsonrpc": "2.0", "method": "notify_status_update",
+                                    "params": [delta, time.time()]}))
+                stats["ws_notifications"] += 1
+
+    # Every connection gets history notifications; status updates start with
+    # printer.objects.subscribe.
+    notify_thread = eventlet.spawn(notifier)
+    try:
+        while True:
+            message = ws.wait()
+            if message is None:
+                break
+            stats["ws_requests"] += 1
+            try:
+                request = json.loads(message)
+            except ValueError:
+                continue
+            method, params, rpc_id = request.get("method"), request.get("params") or {}, request.get("id")
+
+            if method == "server.info":
+                result = {"klippy_connected": True, "klippy_state": "ready", "moonraker_version": "sim"}
+            elif method == "printer.info":
+                result = {"state": "ready", "hostname": f"sim-{printer.index}", "software_version": "sim"}
+            elif method == "printer.objects.list":
+                result = {"objects": list(printer.status(None))}
+            elif method == "printer.objects.subscribe":
+                subscription["objects"] = params.get("objects") or None
+                status = printer.status(subscription["objects"])
+                subscription["last"] = status
+                result = {"eventtime": time.time(), "status": status}
+            elif method in RPC_PATHS:
+                result = handle(printer, RPC_PATHS[method], params)
+            else:
+                result = None
+
+            if result is None or isinstance(result, tuple):
+                message = result[1] if isinstance(result, tuple) else f"Method not found: {method}"
+                reply = {"jsonrpc": "2.0", "error": {"code": -32601, "message": message}, "id": rpc_id}
+            else:
+                reply = {"jsonrpc": "2.0", "result": result, "id": rpc_id}
+            ws.send(json.dumps(reply))
+    finally:
+        if notify_thread is not None:
+            notify_thread.kill()
+
+
+# -- control ----------------------------------------------------------------
+def make_control_app(printers):
+    def app(environ, start_response):
+        path = environ.get("PATH_INFO", "")
+        if path == "/stats":
+            counts = dict(stats)
+            counts["states"] = dict(Counter(p.state for p in printers))
+            return _respond(start_response, "200 OK", counts)
+        if path == "/printers":
+            return _respond(start_response, "200 OK",
+                            [{"ip_address": p.address, "port": p.port} for p in printers])
+        return _respond(start_response, "404 Not Found", {"error": "not found"})
+    return app
+
+
+def main():
+    args = parse_arguments()
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    first = ipaddress.ip_address(args.address)
+    printers = []
+    for i in range(args.count):
+        if args.port_per_printer:
+            address, port = str(first), args.port + i
+        else:
+            address, port = str(first + i), args.port
+        printer = SimulatedPrinter(i, address, port, args)
+        sock = eventlet.listen((address, port), backlog=128)
+        eventlet.spawn(wsgi.server, sock, make_app(printer, args), log_output=False)
+        printers.append(printer)
+
+    control = eventlet.listen(("127.0.0.1", args.control_port))
+    print(f"[Simulator] {len(printers)} printer(s) from {printers[0].address}:{printers[0].port}; "
+          f"stats on http://127.0.0.1:{args.control_port}/stats")
+    wsgi.server(control, make_control_app(printers), log_output=False)
+
+
+if __name__ == "__main__":
+    main()
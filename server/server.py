@@ -1,23 +1,36 @@
-import eventlet
-eventlet.monkey_patch()
+import sys
+
+def is_maintenance_command(argv):
+    """True for one-shot CLI paths (migrate, -i base) that never serve requests."""
+    if any(flag in argv for flag in ("migrate", "-m", "--migrate")):
+        return True
+    for i, arg in enumerate(argv):
+        if arg in ("-i", "--init") and i + 1 < len(argv) and argv[i + 1].lower() == "base":
+            return True
+        if arg.startswith("--init=") and arg.split("=", 1)[1].lower() == "base":
+            return True
+    return False
+
+# Maintenance commands skip eventlet, the API blueprints, Socket.IO and the
+# pollers entirely; only the server path pays for the full import graph.
+MAINTENANCE_MODE = __name__ == '__main__' and is_maintenance_command(sys.argv[1:])
+
+if not MAINTENANCE_MODE:
+    import eventlet
+    # psycopg2 is made green (or not) by create_app according to DB_GREEN.
+    eventlet.monkey_patch(psycopg=False)
 
 import os
 from flask import Flask, request
-from flask_cors import CORS
-from flask_socketio import SocketIO, join_room
 from config import parse_arguments, load_config, Config
 from models import db  # shared DB instance
-from extensions import socketio
-from sockets.utils import set_app_instance  # import the setter
-import sys
 
-def create_app(config_file=None):
+def create_app(config_file=None, serve=True):
     # Allow a default config file if none is provided.
     if config_file is None:
         config_file = os.environ.get("CONFIG_FILE", "config.conf")
     
     app = Flask(__name__)
-    CORS(app)
     
     # Load configuration from the specified file.
     config_data = load_config(config_file)
@@ -29,18 +42,58 @@ def create_app(config_file=None):
         config_data['DB_NAME'],
         config_data['DB_USER'],
         config_data['DB_PASSWORD'],
-        config_data['DEBUG']
+        config_data['DEBUG'],
+        db_uri=config_data.get('DB_URI', 'default'),
+        db_pool_size=config_data.get('DB_POOL_SIZE', 10),
+        db_max_overflow=config_data.get('DB_MAX_OVERFLOW', 5),
+        db_pool_timeout=config_data.get('DB_POOL_TIMEOUT', 10),
+        db_green=config_data.get('DB_GREEN', 'true'),
+        scale_out=config_data.get('SCALE_OUT', 'false'),
+        worker_id=config_data.get('WORKER_ID', ''),
+        lease_ttl=config_data.get('LEASE_TTL', 10),
+        lease_heartbeat=config_data.get('LEASE_HEARTBEAT', 3),
+        socketio_message_queue=config_data.get('SOCKETIO_MESSAGE_QUEUE', ''),
+        gcode_root=config_data.get('GCODE_ROOT', '.'),
+        gcode_analysis_cache=config_data.get('GCODE_ANALYSIS_CACHE', ''),
+        gcode_store=config_data.get('GCODE_STORE', '.gcode_store'),
+        dispatcher=config_data.get('DISPATCHER', 'false'),
+        request_profiling=config_data.get('REQUEST_PROFILING', 'false'),
+        moonraker_rpc=config_data.get('MOONRAKER_RPC', 'false'),
+        job_history=config_data.get('JOB_HISTORY', 'true'),
+        analytics=config_data.get('ANALYTICS', 'true')
     )
     
-    # Build the SQLALCHEMY_DATABASE_URI using the correct attribute names.
-    server_config.SQLALCHEMY_DATABASE_URI = (
-        f"postgresql://{server_config.DB_USER}:{server_config.DB_PASSWORD}@"
-        f"{server_config.DB_HOST}:{server_config.DB_PORT}/{server_config.DB_NAME}"
-    )
+    # Build the SQLALCHEMY_DATABASE_URI using the correct attribute names,
+    # unless DB_URI gives one outright (e.g. a unix socket or a test database).
+    if server_config.SQLALCHEMY_DATABASE_URI == "default":
+        server_config.SQLALCHEMY_DATABASE_URI = (
+            f"postgresql://{server_config.DB_USER}:{server_config.DB_PASSWORD}@"
+            f"{server_config.DB_HOST}:{server_config.DB_PORT}/{server_config.DB_NAME}"
+        )
     print(server_config.SQLALCHEMY_DATABASE_URI)
     
     app.config.from_object(server_config)
+    if not serve:
+        db.init_app(app)
+        return app
+
+    from flask_cors import CORS
+    from flask_socketio import join_room
+    from extensions import socketio, make_psycopg2_green
+
+    CORS(app)
+    if server_config.DB_GREEN:
+        # Must be registered before the engine opens its first connection.
+        make_psycopg2_green()
     db.init_app(app)
+    from services.metrics import instrument_app
+    instrument_app(app, db)
+    if server_config.REQUEST_PROFILING:
+        from services.profiling import install as install_profiling
+        install_profiling(app, db)
+    if server_config.MOONRAKER_RPC:
+        from services import moonraker_rpc
+        moonraker_rpc.configure(True)
     
     try:
         from api import register_blueprints
@@ -48,34 +101,76 @@ def create_app(config_file=None):
     except ImportError:
         pass
 
-    socketio.init_app(app, async_mode="eventlet", cors_allowed_origins="*")
+    socketio.init_app(app, async_mode="eventlet", cors_allowed_origins="*",
+                      message_queue=server_config.SOCKETIO_MESSAGE_QUEUE)
     print("SocketIO instance:", socketio)
     
+    from services.outbox import outbox
+    # Clients on other workers are reached through the message queue.
+    outbox.remote_fanout = bool(server_config.SOCKETIO_MESSAGE_QUEUE)
+
     @socketio.on("connect")
     def handle_connect():
         printer_ip = request.args.get("printerIp")
         if printer_ip:
             join_room(printer_ip)
+            outbox.join(request.sid, printer_ip)
             print(f"Client joined room for printer {printer_ip}")
         else:
             print("Client connected without printerIp query parameter.")
+
+    from services.subscriptions import hub, ALL_PRINTERS, DEFAULT_FPS
+
+    @socketio.on("subscribe")
+    def handle_subscribe(data):
+        """
+        One socket for many printers:
+        {"printers": ["192.168.1.50", ...] or "*", "fields": ["print_stats.state", "extruder"], "max_fps": 2}
+        Updates arrive as coalesced "printers_update" frames: {"t": ..., "printers": {ip: status}}.
+        """
+        data = data or {}
+        printers = data.get("printers", ALL_PRINTERS)
+        if printers != ALL_PRINTERS and not (
+            isinstance(printers, list) and all(isinstance(p, str) for p in printers)
+        ):
+            return {"error": "'printers' must be a list of IP addresses or \"*\""}
+        fields = data.get("fields")
+        if fields is not None and not (
+            isinstance(fields, list) and all(isinstance(f, str) for f in fields)
+        ):
+            return {"error": "'fields' must be a list of field names"}
+        try:
+            max_fps = float(data.get("max_fps", DEFAULT_FPS))
+        except (TypeError, ValueError):
+            return {"error": "'max_fps' must be a number"}
+        return hub.subscribe(request.sid, printers, fields, max_fps)
+
+    @socketio.on("unsubscribe")
+    def handle_unsubscribe(data=None):
+        hub.unsubscribe(request.sid)
+
+    @socketio.on("disconnect")
+    def handle_disconnect():
+        hub.unsubscribe(request.sid)
+        outbox.leave(request.sid)
     
     return app
 
 if __name__ == '__main__':
     args = parse_arguments()
-    app = create_app(args.config)  # Use the provided config file.
+    app = create_app(args.config, serve=not MAINTENANCE_MODE)  # Use the provided config file.
     
     # If a migration flag is provided, run the migration and exit.
-    if any(flag in sys.argv for flag in ["migrate", "-m"]):
+    if args.migrate or any(flag in sys.argv for flag in ["migrate", "-m"]):
         with app.app_context():
-            from flask_migrate import upgrade
+            from flask_migrate import Migrate, upgrade
+            Migrate(app, db)
             upgrade()
             print("Database migration applied successfully.")
         sys.exit(0)
     
     # If the init flag is set to "base", create all tables and exit.
-    if args.init.lower() == "base":
+    if MAINTENANCE_MODE and args.init.lower() == "base":
         with app.app_context():
             print("Registered tables:", list(db.metadata.tables.keys()))
             db.create_all()
@@ -84,20 +179,71 @@ if __name__ == '__main__':
     
     with app.app_context():
         from models.printers import Printer
-        printers = Printer.query.all()
-        for printer in printers:
-            printer.status = "disconnected"
+        if app.config['SCALE_OUT']:
+            # Other workers may be polling right now; only reset printers
+            # nobody holds a live lease on.
+            from sqlalchemy import func
+            from models.poller_lease import PollerLease
+            leased = db.session.query(PollerLease.printer_id).filter(PollerLease.expires_at > func.now())
+            Printer.query.filter(Printer.printer_id.notin_(leased)).update(
+                {"status": "disconnected"}, synchronize_session=False
+            )
+        else:
+            Printer.query.update({"status": "disconnected"}, synchronize_session=False)
         db.session.commit()
         print("All printer statuses have been set to disconnected.")
     
     # Set the global app instance for socket usage.
     from sockets.utils import set_app_instance
     set_app_instance(app)
+
+    import threading
+    from extensions import socketio
+    if app.config['SCALE_OUT']:
+        # Pollers are handed out through leases shared with the other workers.
+        from services.poller_leases import PollerLeaseManager, set_lease_manager
+        lease_manager = PollerLeaseManager(
+            app,
+            worker_id=app.config['WORKER_ID'],
+            lease_ttl=app.config['LEASE_TTL'],
+            heartbeat_interval=app.config['LEASE_HEARTBEAT']
+        )
+        set_lease_manager(lease_manager)
+        lease_manager.start()
+    else:
+        # Re-attach printers that were connected before the restart without
+        # holding up the HTTP server.
+        from api.printers import restore_printer_connections
+        threading.Thread(target=restore_printer_connections, args=(app,), daemon=True).start()
+
+    if app.config['DISPATCHER']:
+        from services.dispatcher import JobDispatcher, set_dispatcher
+        job_dispatcher = JobDispatcher(app)
+        set_dispatcher(job_dispatcher)
+        job_dispatcher.start()
+
+    if app.config['JOB_HISTORY']:
+        from services.job_history import HistoryIngester, set_ingester
+        history_ingester = HistoryIngester(app)
+        set_ingester(history_ingester)
+        history_ingester.start()
+
+    if app.config['ANALYTICS']:
+        from services.analytics import AnalyticsRefresher
+        AnalyticsRefresher(app).start()
     
     print("Starting server with configuration:")
     print(f"Host: {app.config['HOST']}")
     print(f"Flask Port: {app.config['FLASK_PORT']}")
     print(f"SQLALCHEMY_DATABASE_URI: {app.config['SQLALCHEMY_DATABASE_URI']}")
     
-    socketio.run(app, host=app.config['HOST'], port=int(app.config['FLASK_PORT']),
-                 debug=app.config['DEBUG'], use_reloader=False)
+    # A service stop (SIGTERM) unwinds like Ctrl-C so the shutdown below runs.
+    import signal
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        socketio.run(app, host=app.config['HOST'], port=int(app.config['FLASK_PORT']),
+                     debug=app.config['DEBUG'], use_reloader=False)
+    finally:
+        if app.config['SCALE_OUT']:
+            # Hand leases back so other workers take over without waiting out the ttl.
+            lease_manager.stop()
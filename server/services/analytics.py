@@ -0,0 +1,303 @@
+"""
+Farm analytics kept as incrementally updated rollups, so dashboards read a
+bounded number of summary rows however long the history grows.
+
+    analytics_usage           busy seconds and started jobs per (hour|day, printer, material)
+    analytics_queue_wait      summed wait and started jobs per (hour|day)
+    analytics_product_on_time finished and on-time scheduled prints per product
+
+refresh() folds in only what changed since the last run:
+
+- print_jobs rows updated since the "print_jobs" watermark, plus every
+  in_progress job. Each job remembers how far it has been counted
+  (rolled_up_to), so only the difference is added. Reprocessing a job
+  therefore never double counts.
+- Scheduled prints whose started_at / finished_at passed the "queue_wait" /
+  "on_time" watermarks. These are held back SETTLE_SECONDS so a transaction
+  that commits late is not skipped.
+
+The interval arithmetic runs in NumPy. Intervals are split at bucket
+boundaries with repeat/cumsum, then summed per key with unique/bincount.
+A refresh costs O(changed rows), and Python only touches the rollup rows
+it writes.
+
+Buckets are UTC. print_jobs times are UTC, and scheduled print times are
+server local time (like scheduled_start_time), converted to UTC for
+bucketing only. A transaction-scoped advisory lock keeps two workers from
+applying the same deltas.
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+
+from models import db
+from models.analytics import GRANULARITIES, UsageRollup, QueueWaitRollup, ProductOnTime, AnalyticsWatermark
+from models.print_job import PrintJob
+from models.scheduled_print import ScheduledPrint
+
+REFRESH_INTERVAL = 60
+SETTLE_SECONDS = 60
+# An in_progress job stops accruing time this long after it started.
+MAX_OPEN_JOB_SECONDS = 7 * 86400
+UNKNOWN_MATERIAL = "unknown"
+UPSERT_CHUNK = 1000
+ADVISORY_LOCK_KEY = 2025101950
+
+_EPOCH = datetime(1970, 1, 1)
+_FLOOR = datetime(1970, 1, 1)
+
+
+def _utc_seconds(value):
+    """Naive UTC datetime -> UNIX seconds."""
+    return (value - _EPOCH).total_seconds()
+
+
+def _bucket_start(bucket, bucket_seconds):
+    return _EPOCH + timedelta(seconds=int(bucket) * bucket_seconds)
+
+
+def split_intervals(starts, ends, bucket_seconds):
+    """
+    Split intervals [starts, ends) (UNIX seconds) at bucket boundaries. Bucket
+    b covers [b * bucket_seconds, (b + 1) * bucket_seconds). Returns arrays
+    (interval index, bucket, seconds) with one entry per overlap.
+    """
+    import numpy as np
+
+    starts = np.asarray(starts, dtype=float)
+    ends = np.maximum(np.asarray(ends, dtype=float), starts)
+    first = np.floor(starts / bucket_seconds).astype(np.int64)
+    last = np.maximum(np.ceil(ends / bucket_seconds).astype(np.int64) - 1, first)
+    counts = last - first + 1
+    index = np.repeat(np.arange(len(starts)), counts)
+    offset = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    bucket = first[index] + offset
+    seconds = (np.minimum(ends[index], (bucket + 1) * bucket_seconds)
+               - np.maximum(starts[index], bucket * bucket_seconds))
+    return index, bucket, np.clip(seconds, 0.0, None)
+
+
+def group_sum(keys, *values):
+    """Sum each values array over identical rows of keys (2-D int array): (unique keys, [sums])."""
+    import numpy as np
+
+    if len(keys) == 0:
+        return keys, [np.zeros(0) for _ in values]
+    unique, inverse = np.unique(keys, axis=0, return_inverse=True)
+    inverse = inverse.ravel()
+    return unique, [np.bincount(inverse, weights=v, minlength=len(unique)) for v in values]
+
+
+def _watermark(name):
+    row = AnalyticsWatermark.query.get(name)
+    return row.value if row is not None else _FLOOR
+
+
+def _set_watermark(name, value):
+    from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+    stmt = pg_insert(AnalyticsWatermark.__table__).values(name=name, value=value)
+    db.session.execute(stmt.on_conflict_do_update(index_elements=["name"], set_={"value": value}))
+
+
+def _add_rows(table, key_columns, rows):
+    """Upsert rows, adding their measures to any existing row with the same key."""
+    from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+    for i in range(0, len(rows), UPSERT_CHUNK):
+        stmt = pg_insert(table).values(rows[i:i + UPSERT_CHUNK])
+        measures = [c for c in rows[0] if c not in key_columns]
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=key_columns,
+            set_={c: table.c[c] + stmt.excluded[c] for c in measures}
+        ))
+
+
+def _refresh_usage(now):
+    """Fold print_jobs changes into analytics_usage; returns the number of jobs looked at."""
+    import numpy as np
+    from sqlalchemy import bindparam, or_
+
+    mark = _watermark("print_jobs")
+    jobs = (
+        PrintJob.query
+        .filter(PrintJob.start_time.isnot(None))
+        .filter(or_(PrintJob.updated_at > mark, PrintJob.status == "in_progress"))
+        .with_entities(PrintJob.printer_id, PrintJob.job_id, PrintJob.start_time, PrintJob.end_time,
+                       PrintJob.status, PrintJob.filament_type, PrintJob.rolled_up_to)
+        .all()
+    )
+    if jobs:
+        start = np.array([_utc_seconds(j.start_time) for j in jobs])
+        counted = np.array([_utc_seconds(j.rolled_up_to) if j.rolled_up_to else np.nan for j in jobs])
+        end = np.array([
+            _utc_seconds(j.end_time) if j.end_time
+            else _utc_seconds(now) if j.status == "in_progress" else np.nan
+            for j in jobs
+        ])
+        end = np.fmin(np.where(np.isnan(end), start, end), start + MAX_OPEN_JOB_SECONDS)
+        new = np.isnan(counted)
+        counted = np.where(new, start, counted)
+
+        printers = np.array([j.printer_id for j in jobs], dtype=np.int64)
+        names = [j.filament_type or UNKNOWN_MATERIAL for j in jobs]
+        materials, material_codes = np.unique(np.array(names, dtype=object), return_inverse=True)
+        material_codes = material_codes.ravel().astype(np.int64)
+
+        # Signed difference between what is counted and what should be.
+        lo, hi = np.minimum(counted, end), np.maximum(counted, end)
+        sign = np.where(end >= counted, 1.0, -1.0)
+
+        table = UsageRollup.__table__
+        for granularity, bucket_seconds in GRANULARITIES.items():
+            index, bucket, seconds = split_intervals(lo, hi, bucket_seconds)
+            started = np.flatnonzero(new)
+            keys = np.concatenate([
+                np.column_stack([bucket, printers[index], material_codes[index]]),
+                np.column_stack([np.floor(start[started] / bucket_seconds).astype(np.int64),
+                                 printers[started], material_codes[started]]),
+            ]).astype(np.int64)
+            busy = np.concatenate([seconds * sign[index], np.zeros(len(started))])
+            count = np.concatenate([np.zeros(len(index)), np.ones(len(started))])
+            keys, (busy, count) = group_sum(keys, busy, count)
+            changed = (busy != 0) | (count != 0)
+            _add_rows(table, ["granularity", "bucket_start", "printer_id", "material"], [
+                {"granularity": granularity,
+                 "bucket_start": _bucket_start(b, bucket_seconds),
+                 "printer_id": int(p),
+                 "material": materials[m],
+                 "busy_seconds": float(s),
+                 "jobs": int(c)}
+                for (b, p, m), s, c in zip(keys[changed], busy[changed], count[changed])
+            ])
+
+        jobs_table = PrintJob.__table__
+        db.session.execute(
+            jobs_table.update()
+            .where(jobs_table.c.printer_id == bindparam("b_printer_id"))
+            .where(jobs_table.c.job_id == bindparam("b_job_id"))
+            .values(rolled_up_to=bindparam("b_rolled_up_to")),
+            [{"b_printer_id": j.printer_id, "b_job_id": j.job_id,
+              "b_rolled_up_to": _EPOCH + timedelta(seconds=float(e))}
+             for j, e in zip(jobs, end)]
+        )
+    # Rows written while this ran are looked at again next time; their
+    # rolled_up_to makes that harmless.
+    _set_watermark("print_jobs", now - timedelta(seconds=SETTLE_SECONDS))
+    return len(jobs)
+
+
+def _local_seconds(values):
+    """Naive server-local datetimes (or None) -> UNIX seconds array (NaN for None)."""
+    import numpy as np
+
+    return np.array([v.timestamp() if v is not None else np.nan for v in values], dtype=float)
+
+
+def _refresh_queue_wait(upto):
+    """Fold newly started scheduled prints into analytics_queue_wait."""
+    import numpy as np
+
+    mark = _watermark("queue_wait")
+    rows = (
+        ScheduledPrint.query
+        .filter(ScheduledPrint.started_at > mark, ScheduledPrint.started_at <= upto)
+        .with_entities(ScheduledPrint.started_at, ScheduledPrint.created_at, ScheduledPrint.scheduled_start_time)
+        .all()
+    )
+    if rows:
+        started = _local_seconds(r.started_at for r in rows)
+        # A job is ready once it exists and its slot has come.
+        ready = np.fmax(_local_seconds(r.created_at for r in rows),
+                        _local_seconds(r.scheduled_start_time for r in rows))
+        known = ~np.isnan(ready)
+        wait = np.clip(started[known] - ready[known], 0.0, None)
+        started = started[known]
+
+        for granularity, bucket_seconds in GRANULARITIES.items():
+            keys = np.floor(started / bucket_seconds).astype(np.int64).reshape(-1, 1)
+            keys, (total, count) = group_sum(keys, wait, np.ones(len(wait)))
+            _add_rows(QueueWaitRollup.__table__, ["granularity", "bucket_start"], [
+                {"granularity": granularity,
+                 "bucket_start": _bucket_start(b, bucket_seconds),
+                 "wait_seconds": float(w),
+                 "jobs": int(c)}
+                for (b,), w, c in zip(keys, total, count)
+            ])
+    _set_watermark("queue_wait", upto)
+    return len(rows)
+
+
+def _refresh_on_time(upto):
+    """Fold newly finished scheduled prints of products into analytics_product_on_time."""
+    import numpy as np
+
+    mark = _watermark("on_time")
+    rows = (
+        ScheduledPrint.query
+        .filter(ScheduledPrint.finished_at > mark, ScheduledPrint.finished_at <= upto)
+        .filter(ScheduledPrint.status == "done", ScheduledPrint.product_id.isnot(None))
+        .with_entities(ScheduledPrint.product_id, ScheduledPrint.finished_at, ScheduledPrint.deadline)
+        .all()
+    )
+    if rows:
+        products = np.array([r.product_id for r in rows], dtype=np.int64).reshape(-1, 1)
+        on_time = (_local_seconds(r.finished_at for r in rows)
+                   <= _local_seconds(r.deadline for r in rows)).astype(float)
+        keys, (completed, met) = group_sum(products, np.ones(len(rows)), on_time)
+        _add_rows(ProductOnTime.__table__, ["product_id"], [
+            {"product_id": int(p), "completed": int(c), "on_time": int(m)}
+            for (p,), c, m in zip(keys, completed, met)
+        ])
+    _set_watermark("on_time", upto)
+    return len(rows)
+
+
+def refresh():
+    """
+    Bring every rollup up to date in one transaction. Needs an app context.
+    Returns rows processed per rollup, or None if another worker holds the lock.
+    """
+    from sqlalchemy import text
+
+    try:
+        if not db.session.execute(text("SELECT pg_try_advisory_xact_lock(:key)"),
+                                  {"key": ADVISORY_LOCK_KEY}).scalar():
+            db.session.rollback()
+            return None
+        upto = datetime.now() - timedelta(seconds=SETTLE_SECONDS)
+        counts = {
+            "print_jobs": _refresh_usage(datetime.utcnow()),
+            "queue_wait": _refresh_queue_wait(upto),
+            "on_time": _refresh_on_time(upto),
+        }
+        db.session.commit()
+        return counts
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+class AnalyticsRefresher:
+    def __init__(self, app):
+        self.app = app
+        self.thread = None
+        self.active = False
+
+    def run_loop(self):
+        while self.active:
+            try:
+                with self.app.app_context():
+                    refresh()
+            except Exception as e:
+                print(f"[Analytics] Refresh error: {e}")
+            time.sleep(REFRESH_INTERVAL)
+
+    def start(self):
+        self.active = True
+        self.thread = threading.Thread(target=self.run_loop, daemon=True)
+        self.thread.start()
+        print("[Analytics] Refresher started.")
+
+    def stop(self):
+        self.active = False
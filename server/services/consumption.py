@@ -0,0 +1,278 @@
+import threading
+import time
+from datetime import datetime
+
+from models import db
+from models.printers import Printer
+from models.spool import Spool
+from models.filament_usage import JobFilamentUsage
+
+# Seconds between writes of the accumulated counters.
+FLUSH_INTERVAL = 30
+ACTIVE_STATES = ("printing", "paused")
+FINISHED_STATES = ("complete", "cancelled", "error", "standby")
+
+
+class _Job:
+    __slots__ = ("filename", "started_at", "ended_at", "state", "used", "usage_id", "dirty", "resumed")
+
+    def __init__(self, filename, state, resumed=False):
+        self.filename = filename
+        self.started_at = datetime.utcnow()
+        self.ended_at = None
+        self.state = state
+        self.used = 0.0
+        self.usage_id = None
+        self.dirty = True
+        # Already printing when first seen; flush() continues its open row.
+        self.resumed = resumed
+
+
+class _PrinterCounters:
+    __slots__ = ("filename", "state", "last_used", "total_used", "unattributed", "job")
+
+    def __init__(self):
+        self.filename = None
+        self.state = None
+        self.last_used = None     # None until a first sample sets the baseline
+        self.total_used = 0.0     # mm since the server started
+        self.unattributed = 0.0   # mm not yet charged to a spool
+        self.job = None
+
+
+class ConsumptionTracker:
+    """
+    Folds print_stats telemetry into per-printer and per-job filament
+    counters. observe() is O(1) and never touches the database; flush()
+    writes job rows and charges the delta to the spool loaded on each
+    printer, and runs every FLUSH_INTERVAL seconds in a background thread.
+    """
+
+    def __init__(self):
+        self.printers = {}
+        self.finished = []
+        self.lock = threading.Lock()
+        self.thread = None
+        self.running = False
+        self.app = None
+
+    def observe(self, printer_ip, data):
+        """Fold one poll/notification payload for printer_ip into the counters."""
+        try:
+            stats = data["result"]["status"]["print_stats"]
+        except (KeyError, TypeError):
+            return
+
+        with self.lock:
+            counters = self.printers.get(printer_ip)
+            first_seen = counters is None
+            if first_seen:
+                counters = self.printers[printer_ip] = _PrinterCounters()
+
+            # Notifications only carry changed fields; keep the previous values.
+            filename = stats.get("filename", counters.filename)
+            state = stats.get("state", counters.state)
+            used = stats.get("filament_used")
+
+            if first_seen and state in ACTIVE_STATES:
+                # Printing before we looked (a restart, or a lease taken over
+                # from another worker): whoever watched before charged what
+                # was used so far, so continue that job instead of a new one.
+                counters.job = _Job(filename, state, resumed=True)
+                counters.filename = filename
+                counters.state = state
+
+            new_file = filename != counters.filename and bool(filename)
+            started = state in ACTIVE_STATES and counters.state not in ACTIVE_STATES
+            restarted = used is not None and counters.last_used is not None and used < counters.last_used
+            if state in ACTIVE_STATES and (counters.job is None or new_file or started or restarted):
+                self._close_job(counters, "cancelled" if counters.job else None)
+                counters.job = _Job(filename, state)
+                counters.last_used = 0.0
+
+            if used is not None:
+                if counters.last_used is None:
+                    # First reading is the baseline; it is not charged again.
+                    if counters.job is not None and counters.job.resumed:
+                        counters.job.used = used
+                else:
+                    delta = used - counters.last_used
+                    if delta > 0:
+                        counters.total_used += delta
+                        counters.unattributed += delta
+                        if counters.job is not None:
+                            counters.job.used += delta
+                            counters.job.dirty = True
+                counters.last_used = used
+
+            if counters.job is not None and state != counters.job.state:
+                counters.job.state = state
+                counters.job.dirty = True
+                if state in FINISHED_STATES:
+                    self._close_job(counters, state)
+
+            counters.filename = filename
+            counters.state = state
+
+    def print_state(self, printer_ip):
+        """Last print_stats.state seen for printer_ip, or None."""
+        counters = self.printers.get(printer_ip)
+        return counters.state if counters is not None else None
+
+    def _close_job(self, counters, state):
+        job = counters.job
+        if job is None:
+            return
+        job.ended_at = datetime.utcnow()
+        if state:
+            job.state = state
+        job.dirty = True
+        self.finished.append((counters, job))
+        counters.job = None
+
+    def flush(self, app):
+        """
+        Persist dirty jobs and charge consumption to loaded spools. If the
+        transaction fails, the charges and jobs are handed back so the next
+        flush retries them.
+        """
+        with self.lock:
+            charges = {}
+            for ip, counters in self.printers.items():
+                if counters.unattributed > 0:
+                    charges[ip] = counters.unattributed
+                    counters.unattributed = 0.0
+            jobs = [(ip, c.job) for ip, c in self.printers.items() if c.job is not None and c.job.dirty]
+            ip_of = {id(c): ip for ip, c in self.printers.items()}
+            finished, self.finished = self.finished, []
+            jobs += [(ip_of.get(id(c)), job) for c, job in finished]
+            for _, job in jobs:
+                job.dirty = False
+        if not charges and not jobs:
+            return
+
+        with app.app_context():
+            try:
+                inserted = self._write(charges, jobs)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                with self.lock:
+                    for ip, mm in charges.items():
+                        self.printers[ip].unattributed += mm
+                    for _, job in jobs:
+                        job.dirty = True
+                    self.finished = finished + self.finished
+                raise
+        # Only rows that were committed exist to be updated later.
+        for job, usage_id in inserted:
+            job.usage_id = usage_id
+
+    def _write(self, charges, jobs):
+        """Stage the spool charges and job rows; returns [(job, new usage_id)]."""
+        ips = set(charges) | {ip for ip, _ in jobs if ip}
+        printer_ids = dict(
+            Printer.query.filter(Printer.ip_address.in_(ips))
+            .with_entities(Printer.ip_address, Printer.printer_id)
+        )
+        spools = {
+            s.printer_id: s for s in Spool.query.filter(Spool.printer_id.in_(printer_ids.values()))
+        }
+
+        for ip, mm in charges.items():
+            spool = spools.get(printer_ids.get(ip))
+            if spool is not None:
+                spool.consumed_length = (spool.consumed_length or 0.0) + mm
+
+        inserted = []
+        for ip, job in jobs:
+            printer_id = printer_ids.get(ip)
+            if printer_id is None:
+                continue
+            spool = spools.get(printer_id)
+            weight = None
+            if spool is not None:
+                weight = _grams(job.used, spool)
+            values = {
+                "state": job.state,
+                "ended_at": job.ended_at,
+                "filament_used": job.used,
+                "filament_weight": weight,
+            }
+            if job.usage_id is None and job.resumed:
+                # An existing row is already committed, so it can be adopted now.
+                job.usage_id = (
+                    db.session.query(JobFilamentUsage.usage_id)
+                    .filter_by(printer_id=printer_id, filename=job.filename, ended_at=None)
+                    .order_by(JobFilamentUsage.started_at.desc())
+                    .limit(1)
+                    .scalar()
+                )
+            if job.usage_id is None:
+                row = JobFilamentUsage(
+                    printer_id=printer_id,
+                    spool_id=spool.spool_id if spool is not None else None,
+                    filename=job.filename,
+                    started_at=job.started_at,
+                    **values
+                )
+                db.session.add(row)
+                inserted.append((job, row))
+            else:
+                JobFilamentUsage.query.filter_by(usage_id=job.usage_id).update(
+                    values, synchronize_session=False
+                )
+        db.session.flush()
+        return [(job, row.usage_id) for job, row in inserted]
+
+    def counters(self):
+        """Live per-printer counters (mm)."""
+        with self.lock:
+            return {
+                ip: {
+                    "state": c.state,
+                    "filename": c.filename,
+                    "total_used": round(c.total_used, 2),
+                    "job_used": round(c.job.used, 2) if c.job else None,
+                }
+                for ip, c in self.printers.items()
+            }
+
+    def run_loop(self):
+        while self.running:
+            time.sleep(FLUSH_INTERVAL)
+            try:
+                self.flush(self.app)
+            except Exception as e:
+                print(f"[Consumption] Flush error: {e}")
+
+    def start(self, app):
+        self.app = app
+        self.running = True
+        self.thread = threading.Thread(target=self.run_loop, daemon=True)
+        self.thread.start()
+        print("[Consumption] Tracker started.")
+
+
+def _grams(length, spool):
+    import filament_conversion as fc
+
+    density = spool.density or float(fc.density_for([spool.material])[0])
+    diameter = spool.filament_diameter or fc.DEFAULT_FILAMENT_DIAMETER
+    return float(fc.weight_from_length(length, diameter, density))
+
+
+tracker = ConsumptionTracker()
+_START_LOCK = threading.Lock()
+
+def observe(printer_ip, data):
+    """Entry point for telemetry callbacks; starts the flush thread on first use."""
+    if not tracker.running:
+        from sockets.utils import get_app_instance
+        app = get_app_instance()
+        if app is None:
+            return
+        with _START_LOCK:
+            if not tracker.running:
+                tracker.start(app)
+    tracker.observe(printer_ip, data)
@@ -0,0 +1,270 @@
+import heapq
+import threading
+import time
+from datetime import datetime
+
+from models import db
+from models.gcode import Gcode
+from models.printers import Printer
+from models.scheduled_print import ScheduledPrint
+
+# print_stats states in which a printer can take the next job.
+IDLE_STATES = ("standby", "complete")
+ACTIVE_STATES = ("printing", "paused")
+# Final print_stats state -> ScheduledPrint.status of the job that was running.
+FINAL_STATUS = {"complete": "done", "cancelled": "cancelled", "error": "failed"}
+# Seconds a started job may take to show up as printing before it is failed.
+START_GRACE = 60
+# Seconds before retrying a printer whose last start request failed.
+RETRY_DELAY = 30
+# Upper bound on how long the dispatcher sleeps without an event.
+MAX_WAIT = 60
+
+# The dispatcher running in this process, if enabled.
+_DISPATCHER = None
+
+def set_dispatcher(dispatcher):
+    global _DISPATCHER
+    _DISPATCHER = dispatcher
+
+def get_dispatcher():
+    return _DISPATCHER
+
+def schedule_changed():
+    """Tell the dispatcher (if any) that scheduled_prints rows were written."""
+    if _DISPATCHER is not None:
+        _DISPATCHER.invalidate()
+
+def observe(printer_ip, data):
+    """Telemetry hook: feed print_stats.state from a poll payload to the dispatcher."""
+    if _DISPATCHER is None:
+        return
+    try:
+        state = data["result"]["status"]["print_stats"]["state"]
+    except (KeyError, TypeError):
+        return
+    _DISPATCHER.on_state(printer_ip, state)
+
+
+class JobDispatcher:
+    """
+    Starts pending ScheduledPrints on their assigned printer as soon as it
+    goes idle and the job is due.
+
+    Telemetry calls on_state() for every sample; it is O(1) and only records
+    transitions. A single dispatcher thread does the database and Moonraker
+    work: it keeps a per-printer heap of (scheduled_start_time, deadline,
+    scheduled_id, filename), claims the head with a conditional UPDATE
+    (status 'pending' -> 'printing', so two workers never start the same
+    row), sends the start command, and later records the final status when
+    the printer reports complete/cancelled/error. Heaps are reloaded lazily
+    from the database after schedule_changed(); the thread otherwise sleeps
+    until the next state change or due time.
+
+    Only rows with an assigned printer and a scheduled_start_time are
+    dispatched.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.cond = threading.Condition()
+        self.states = {}       # ip -> last print_stats.state
+        self.idle = set()      # ips in an idle state
+        self.running = {}      # ip -> [scheduled_id, started (monotonic), seen active]
+        self.finished = []     # (scheduled_id, final status) waiting to be written
+        self.not_before = {}   # ip -> monotonic time of the next allowed start
+        self.next_due = {}     # ip -> datetime of the earliest future job
+        self.queues = {}       # printer_id -> (generation, heap)
+        self.generation = 0
+        self.printers = {}     # ip -> (printer_id, port)
+        self.thread = None
+        self.active = False
+
+    def on_state(self, printer_ip, state):
+        with self.cond:
+            if self.states.get(printer_ip) == state:
+                return
+            self.states[printer_ip] = state
+            if state in IDLE_STATES:
+                self.idle.add(printer_ip)
+            else:
+                self.idle.discard(printer_ip)
+
+            job = self.running.get(printer_ip)
+            if job is not None:
+                if state in ACTIVE_STATES:
+                    job[2] = True
+                elif job[2] and state in FINAL_STATUS:
+                    self.finished.append((job[0], FINAL_STATUS[state]))
+                    del self.running[printer_ip]
+                elif job[2] and state in IDLE_STATES:
+                    # Went straight back to standby (e.g. firmware restart).
+                    self.finished.append((job[0], "failed"))
+                    del self.running[printer_ip]
+            self.cond.notify()
+
+    def invalidate(self):
+        with self.cond:
+            self.generation += 1
+            self.next_due.clear()
+            self.cond.notify()
+
+    def _wait_timeout(self):
+        now_mono, now = time.monotonic(), datetime.now()
+        timeout = MAX_WAIT
+        for ip in self.idle:
+            if ip in self.running:
+                continue
+            if ip in self.not_before:
+                timeout = min(timeout, self.not_before[ip] - now_mono)
+            elif ip in self.next_due:
+                timeout = min(timeout, (self.next_due[ip] - now).total_seconds())
+            else:
+                return 0
+        for _, started, seen in self.running.values():
+            if not seen:
+                timeout = min(timeout, started + START_GRACE - now_mono)
+        return max(timeout, 0)
+
+    def _ready(self):
+        """Idle printers without a running job whose next job may be due now."""
+        now_mono, now = time.monotonic(), datetime.now()
+        ready = []
+        for ip in self.idle:
+            if ip in self.running:
+                continue
+            if ip in self.not_before:
+                if self.not_before[ip] > now_mono:
+                    continue
+                del self.not_before[ip]
+            due = self.next_due.get(ip)
+            if due is None or due <= now:
+                ready.append(ip)
+        return ready
+
+    def run_loop(self):
+        while self.active:
+            with self.cond:
+                self.cond.wait(timeout=self._wait_timeout())
+                now_mono = time.monotonic()
+                for ip, job in list(self.running.items()):
+                    if not job[2] and now_mono - job[1] > START_GRACE:
+                        print(f"[Dispatcher][{ip}] Job {job[0]} never started printing.")
+                        self.finished.append((job[0], "failed"))
+                        del self.running[ip]
+                finished, self.finished = self.finished, []
+                ready = self._ready()
+                generation = self.generation
+            try:
+                with self.app.app_context():
+                    self._record(finished)
+                    for ip in ready:
+                        self._dispatch(ip, generation)
+            except Exception as e:
+                print(f"[Dispatcher] Error: {e}")
+                with self.app.app_context():
+                    db.session.rollback()
+                time.sleep(1)
+
+    def _record(self, finished):
+        for scheduled_id, status in finished:
+            ScheduledPrint.query.filter_by(scheduled_id=scheduled_id, status="printing").update(
+                dict(ScheduledPrint.lifecycle_values(status), status=status), synchronize_session=False
+            )
+            print(f"[Dispatcher] Scheduled print {scheduled_id} -> {status}")
+        if finished:
+            db.session.commit()
+
+    def _printer(self, ip):
+        if ip not in self.printers:
+            row = Printer.query.with_entities(Printer.printer_id, Printer.port) \
+                .filter_by(ip_address=ip).first()
+            if row is None:
+                return None
+            self.printers[ip] = (row.printer_id, row.port)
+        return self.printers[ip]
+
+    def _queue(self, printer_id, generation):
+        cached = self.queues.get(printer_id)
+        if cached is not None and cached[0] == generation:
+            return cached[1]
+        rows = (
+            db.session.query(ScheduledPrint.scheduled_start_time, ScheduledPrint.deadline,
+                             ScheduledPrint.scheduled_id, Gcode.gcode_name)
+            .join(Gcode, Gcode.gcode_id == ScheduledPrint.gcode_id)
+            .filter(ScheduledPrint.assigned_printer_id == printer_id,
+                    ScheduledPrint.status == "pending",
+                    ScheduledPrint.scheduled_start_time.isnot(None))
+            .all()
+        )
+        heap = [tuple(r) for r in rows]
+        heapq.heapify(heap)
+        self.queues[printer_id] = (generation, heap)
+        return heap
+
+    def _dispatch(self, ip, generation):
+        from services.printer_commands import send_command
+
+        printer = self._printer(ip)
+        if printer is None:
+            with self.cond:
+                self.next_due[ip] = datetime.max
+            return
+        printer_id, port = printer
+        heap = self._queue(printer_id, generation)
+        now = datetime.now()
+        while heap and heap[0][0] <= now:
+            start, deadline, scheduled_id, filename = heapq.heappop(heap)
+            claimed = ScheduledPrint.query.filter_by(
+                scheduled_id=scheduled_id, status="pending", assigned_printer_id=printer_id
+            ).update(dict(ScheduledPrint.lifecycle_values("printing"), status="printing"),
+                     synchronize_session=False)
+            db.session.commit()
+            if not claimed:
+                continue
+
+            # Register the job before sending: the printer may report printing
+            # before send_command returns, and on_state only sees transitions.
+            job = [scheduled_id, time.monotonic(), False]
+            with self.cond:
+                self.running[ip] = job
+            target = {"printer_id": printer_id, "ip_address": ip, "port": port}
+            result = send_command(target, "start", {"filename": filename})
+            with self.cond:
+                if result["ok"]:
+                    job[1] = time.monotonic()
+                    self.next_due.pop(ip, None)
+                else:
+                    if self.running.get(ip) is job:
+                        del self.running[ip]
+                    self.not_before[ip] = time.monotonic() + RETRY_DELAY
+            if result["ok"]:
+                print(f"[Dispatcher][{ip}] Started scheduled print {scheduled_id} ({filename}).")
+                return
+            print(f"[Dispatcher][{ip}] Failed to start {scheduled_id}: {result.get('error')}")
+            ScheduledPrint.query.filter_by(scheduled_id=scheduled_id, status="printing").update(
+                {"status": "pending", "started_at": None}, synchronize_session=False
+            )
+            db.session.commit()
+            heapq.heappush(heap, (start, deadline, scheduled_id, filename))
+            return
+
+        with self.cond:
+            if heap:
+                self.next_due[ip] = heap[0][0]
+            else:
+                # Nothing queued: sleep until the schedule changes.
+                self.next_due[ip] = datetime.max
+
+    def start(self):
+        self.active = True
+        self.thread = threading.Thread(target=self.run_loop, daemon=True)
+        self.thread.start()
+        print("[Dispatcher] Started.")
+
+    def stop(self):
+        self.active = False
+        with self.cond:
+            self.cond.notify()
+        if self.thread:
+            self.thread.join(timeout=2)
@@ -0,0 +1,452 @@
+"""
+Streaming G-code analyzer.
+
+Scans a gcode file through mmap one line at a time, so memory use does not
+depend on file size, and extracts:
+  - the slicer (`; generated by ...`, `;Generated with ...`),
+  - slicer header/footer settings (`; key = value`, `;KEY:value`),
+  - net extrusion (mm of filament), honouring M82/M83 and G92,
+  - layer count, max hotend/bed temperatures,
+  - a kinematic print-time estimate (trapezoidal moves with junction limits).
+
+Results are cached by content hash. analyze_many() spreads a batch over a
+process pool of spawned workers, never forks of the (eventlet monkey-patched)
+server process itself.
+"""
+import hashlib
+import json
+import math
+import mmap
+import multiprocessing
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+DEFAULT_ACCEL = 3000.0          # mm/s^2 when the file never sets one
+DEFAULT_FEEDRATE = 3000.0       # mm/min until the first F word
+SQUARE_CORNER_VELOCITY = 5.0    # mm/s, Klipper's default
+HASH_CHUNK = 8 * 1024 * 1024
+MAX_SETTINGS = 2000
+CACHE_MAX_ENTRIES = 1024
+
+_SETTING_RE = re.compile(rb"^;\s*([^=:;]+?)\s*[=:]\s*(.*?)\s*$")
+_GENERATOR_RE = re.compile(rb"^;\s*generated\s+(?:by|with)\s+(.+?)\s*$", re.IGNORECASE)
+_DURATION_RE = re.compile(r"(?:(\d+)d)?\s*(?:(\d+)h)?\s*(?:(\d+)m)?\s*(?:(\d+)s)?")
+
+# Setting keys that identify common slicer header values.
+_MATERIAL_KEYS = ("filament_type", "filament type", "material")
+_TIME_KEYS = ("estimated printing time (normal mode)", "estimated printing time", "time")
+_LAYER_KEYS = ("layer_count", "total layer number", "total_layer_count")
+
+
+def _parse_duration(value):
+    """Seconds from '1h 2m 3s', '1d 2h', or a plain number of seconds."""
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    match = _DURATION_RE.fullmatch(value.replace(" ", ""))
+    if not match or not any(match.groups()):
+        return None
+    days, hours, minutes, seconds = (int(g or 0) for g in match.groups())
+    return days * 86400 + hours * 3600 + minutes * 60 + seconds
+
+
+class _Planner:
+    """
+    Forward-pass motion estimate. Each move is finalised when the next one
+    arrives (its exit speed is the next move's junction speed), so only one
+    move is buffered.
+    """
+
+    def __init__(self):
+        self.accel = DEFAULT_ACCEL
+        self.scv = SQUARE_CORNER_VELOCITY
+        self.total_time = 0.0
+        self.pending = None  # (distance, cruise_v2, start_v2, accel, unit)
+
+    @property
+    def scv(self):
+        return self._scv
+
+    @scv.setter
+    def scv(self, value):
+        self._scv = value
+        # junction_deviation * accel; the accel terms cancel, so this is fixed
+        # until the square corner velocity changes.
+        self._jd_accel = value ** 2 * (math.sqrt(2.0) - 1.0)
+
+    def _move_time(self, distance, start_v2, cruise_v2, end_v2, accel):
+        end_v2 = min(end_v2, start_v2 + 2.0 * accel * distance)
+        accel_d = (cruise_v2 - start_v2) / (2.0 * accel)
+        decel_d = (cruise_v2 - end_v2) / (2.0 * accel)
+        if accel_d + decel_d > distance:
+            # Triangle profile: never reaches cruise speed.
+            cruise_v2 = max(start_v2, end_v2, (2.0 * accel * distance + start_v2 + end_v2) / 2.0)
+            accel_d = max(0.0, (cruise_v2 - start_v2) / (2.0 * accel))
+            decel_d = max(0.0, (cruise_v2 - end_v2) / (2.0 * accel))
+        cruise_v = math.sqrt(cruise_v2)
+        start_v, end_v = math.sqrt(start_v2), math.sqrt(end_v2)
+        cruise_d = max(0.0, distance - accel_d - decel_d)
+        t = cruise_d / cruise_v if cruise_v else 0.0
+        t += (cruise_v - start_v) / accel
+        t += (cruise_v - end_v) / accel
+        return t
+
+    def _flush(self, end_v2):
+        distance, cruise_v2, start_v2, accel, _ = self.pending
+        self.total_time += self._move_time(distance, start_v2, cruise_v2, end_v2, accel)
+        self.pending = None
+
+    def move(self, dx, dy, dz, speed):
+        distance = math.sqrt(dx * dx + dy * dy + dz * dz)
+        if distance <= 0.0 or speed <= 0.0:
+            return
+        unit = (dx / distance, dy / distance, dz / distance)
+        cruise_v2 = speed * speed
+        start_v2 = 0.0
+        if self.pending is not None:
+            p_distance, p_cruise_v2, p_start_v2, p_accel, p_unit = self.pending
+            cos_theta = -(unit[0] * p_unit[0] + unit[1] * p_unit[1] + unit[2] * p_unit[2])
+            if cos_theta < 0.999999:
+                sin_half = math.sqrt(max(0.0, 0.5 * (1.0 - cos_theta)))
+                r_jd = sin_half / (1.0 - sin_half) if sin_half < 1.0 else float("inf")
+                start_v2 = min(
+                    r_jd * self._jd_accel,
+                    cruise_v2, p_cruise_v2,
+                    p_start_v2 + 2.0 * p_accel * p_distance,
+                )
+            self._flush(start_v2)
+        self.pending = (distance, cruise_v2, start_v2, self.accel, unit)
+
+    def wait(self, seconds=0.0):
+        """A dwell or non-move command: the toolhead comes to rest."""
+        if self.pending is not None:
+            self._flush(0.0)
+        self.total_time += seconds
+
+    def finish(self):
+        self.wait()
+        return self.total_time
+
+
+def _words(code):
+    """Map of letter -> float for a gcode line (bytes) with the comment stripped."""
+    out = {}
+    for word in code.split()[1:]:
+        try:
+            # float() parses bytes directly; no decode needed.
+            out[chr(word[0]).upper()] = float(word[1:])
+        except (ValueError, IndexError):
+            pass
+    return out
+
+
+def analyze_file(path):
+    """Scan one gcode file and return a dict of extracted values."""
+    settings = {}
+    slicer = None
+    position = [0.0, 0.0, 0.0]
+    last_e = 0.0
+    absolute = True
+    absolute_e = True
+    feedrate = DEFAULT_FEEDRATE
+    extruded = 0.0
+    layer_markers = 0
+    layer_heights = set()
+    last_extrude_z = None
+    max_hotend = 0.0
+    max_bed = 0.0
+    planner = _Planner()
+    lines = 0
+
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        if size == 0:
+            mm = None
+            reader = iter(())
+        else:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            reader = iter(mm.readline, b"")
+        try:
+            for raw in reader:
+                lines += 1
+                line = raw.strip()
+                if not line:
+                    continue
+
+                if line[:1] == b";":
+                    upper = line[:14].upper()
+                    if upper.startswith((b";LAYER_CHANGE", b";LAYER:")):
+                        layer_markers += 1
+                    elif slicer is None and upper.startswith((b";GENERATED", b"; GENERATED")):
+                        match = _GENERATOR_RE.match(line)
+                        if match:
+                            slicer = match.group(1).decode("utf-8", "replace")
+                    elif len(settings) < MAX_SETTINGS:
+                        match = _SETTING_RE.match(line)
+                        if match:
+                            key = match.group(1).decode("utf-8", "replace").strip().lower()
+                            settings.setdefault(key, match.group(2).decode("utf-8", "replace"))
+                    continue
+
+                code = line.split(b";", 1)[0]
+                head = code[:4].upper()
+                if head.startswith((b"G1 ", b"G0 ")) or head in (b"G1", b"G0"):
+                    w = _words(code)
+                    if "F" in w and w["F"] > 0:
+                        feedrate = w["F"]
+                    target = list(position)
+                    for i, axis in enumerate("XYZ"):
+                        if axis in w:
+                            target[i] = w[axis] if absolute else position[i] + w[axis]
+                    delta_e = 0.0
+                    if "E" in w:
+                        delta_e = (w["E"] - last_e) if absolute_e else w["E"]
+                        last_e = w["E"] if absolute_e else last_e + w["E"]
+                        # Net: a retract and its unretract cancel out.
+                        extruded += delta_e
+                    dx, dy, dz = (target[0] - position[0], target[1] - position[1], target[2] - position[2])
+                    speed = feedrate / 60.0
+                    if dx or dy or dz:
+                        planner.move(dx, dy, dz, speed)
+                        if delta_e > 0 and target[2] != last_extrude_z:
+                            last_extrude_z = target[2]
+                            layer_heights.add(round(target[2], 3))
+                    elif delta_e:
+                        planner.wait(abs(delta_e) / speed)
+                    position = target
+                elif head.startswith(b"G92"):
+                    w = _words(code)
+                    if "E" in w:
+                        last_e = w["E"]
+                    for i, axis in enumerate("XYZ"):
+                        if axis in w:
+                            position[i] = w[axis]
+                elif head.startswith(b"G90"):
+                    absolute = absolute_e = True
+                elif head.startswith(b"G91"):
+                    absolute = absolute_e = False
+                elif head.startswith(b"M82"):
+                    absolute_e = True
+                elif head.startswith(b"M83"):
+                    absolute_e = False
+                elif head.startswith((b"M104", b"M109")):
+                    w = _words(code)
+                    max_hotend = max(max_hotend, w.get("S", 0.0), w.get("R", 0.0))
+                    planner.wait()
+                elif head.startswith((b"M140", b"M190")):
+                    w = _words(code)
+                    max_bed = max(max_bed, w.get("S", 0.0), w.get("R", 0.0))
+                    planner.wait()
+                elif head.startswith(b"M204"):
+                    w = _words(code)
+                    accel = w.get("S") or w.get("P")
+                    if accel:
+                        planner.accel = accel
+                elif head.startswith(b"G4"):
+                    w = _words(code)
+                    planner.wait(w.get("P", 0.0) / 1000.0 + w.get("S", 0.0))
+                elif code[:18].upper().startswith(b"SET_VELOCITY_LIMIT"):
+                    for word in code.decode("ascii", "replace").split()[1:]:
+                        key, _, value = word.partition("=")
+                        try:
+                            if key.upper() == "ACCEL":
+                                planner.accel = float(value)
+                            elif key.upper() == "SQUARE_CORNER_VELOCITY":
+                                planner.scv = float(value)
+                        except ValueError:
+                            pass
+        finally:
+            if mm is not None:
+                mm.close()
+
+    material = next((settings[k] for k in _MATERIAL_KEYS if settings.get(k)), None)
+    if material:
+        material = material.split(";")[0].strip().strip('"')
+    slicer_time = next(
+        (t for t in (_parse_duration(settings[k]) for k in _TIME_KEYS if settings.get(k)) if t is not None),
+        None
+    )
+    layer_count = None
+    for key in _LAYER_KEYS:
+        try:
+            layer_count = int(float(settings[key]))
+            break
+        except (KeyError, ValueError):
+            continue
+    if layer_count is None:
+        layer_count = layer_markers or len(layer_heights)
+
+    return {
+        "path": path,
+        "size": size,
+        "lines": lines,
+        "slicer": slicer,
+        "material": material,
+        "filament_total": round(max(extruded, 0.0), 3),
+        "layer_count": layer_count,
+        "max_hotend_temp": max_hotend or None,
+        "max_bed_temp": max_bed or None,
+        "slicer_estimated_time": slicer_time,
+        "estimated_time": round(planner.finish(), 1),
+        "settings": settings,
+    }
+
+
+def content_hash(path):
+    """blake2b of the file contents, read in large chunks."""
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class AnalysisCache:
+    """
+    Results keyed by content hash, with an in-memory LRU in front of an
+    optional directory of JSON files. (path, size, mtime) -> hash is
+    memoised in a second LRU of the same size so unchanged files are not
+    re-read just to be hashed.
+    """
+
+    def __init__(self, directory=None, max_entries=CACHE_MAX_ENTRIES):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.results = OrderedDict()
+        self.hashes = OrderedDict()
+        self.lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def hash_for(self, path):
+        stat = os.stat(path)
+        key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+        with self.lock:
+            cached = self.hashes.get(key)
+            if cached is not None:
+                self.hashes.move_to_end(key)
+                return cached
+        cached = content_hash(path)
+        with self.lock:
+            self.hashes[key] = cached
+            while len(self.hashes) > self.max_entries:
+                self.hashes.popitem(last=False)
+        return cached
+
+    def get(self, digest):
+        with self.lock:
+            if digest in self.results:
+                self.results.move_to_end(digest)
+                return self.results[digest]
+        if self.directory:
+            try:
+                with open(os.path.join(self.directory, f"{digest}.json")) as f:
+                    result = json.load(f)
+            except (OSError, ValueError):
+                return None
+            self._remember(digest, result)
+            return result
+        return None
+
+    def put(self, digest, result):
+        self._remember(digest, result)
+        if self.directory:
+            tmp = os.path.join(self.directory, f"{digest}.json.tmp")
+            with open(tmp, "w") as f:
+                json.dump(result, f)
+            os.replace(tmp, os.path.join(self.directory, f"{digest}.json"))
+
+    def _remember(self, digest, result):
+        with self.lock:
+            self.results[digest] = result
+            self.results.move_to_end(digest)
+            while len(self.results) > self.max_entries:
+                self.results.popitem(last=False)
+
+
+def _analyze_with_hash(path, digest):
+    result = analyze_file(path)
+    result["content_hash"] = digest
+    return result
+
+
+def _pool_context():
+    """
+    Workers are spawned as fresh interpreters. Forking the server would copy
+    eventlet's hub, its monkey-patched locks and the open database and client
+    sockets into every worker, and forkserver is unavailable once eventlet has
+    replaced the socket module. A spawned worker re-imports the main script
+    (server.py only monkey patches and imports at module level) before it
+    unpickles its first task.
+    """
+    return multiprocessing.get_context("spawn")
+
+
+def analyze(path, cache=None):
+    """Analyze one file, consulting the cache by content hash first."""
+    if cache is None:
+        return _analyze_with_hash(path, content_hash(path))
+    digest = cache.hash_for(path)
+    result = cache.get(digest)
+    if result is None:
+        result = _analyze_with_hash(path, digest)
+        cache.put(digest, result)
+    return dict(result, path=path)
+
+
+def analyze_many(paths, cache=None, max_workers=None):
+    """
+    Analyze a batch of files, returning {path: result or {"error": ...}}.
+    Cache hits are answered inline; misses are scanned in a process pool.
+    """
+    results, misses = {}, {}
+    for path in paths:
+        try:
+            digest = cache.hash_for(path) if cache else content_hash(path)
+        except OSError as e:
+            results[path] = {"path": path, "error": str(e)}
+            continue
+        cached = cache.get(digest) if cache else None
+        if cached is not None:
+            results[path] = dict(cached, path=path)
+        else:
+            misses[path] = digest
+
+    if len(misses) == 1:
+        path, digest = next(iter(misses.items()))
+        try:
+            results[path] = _analyze_with_hash(path, digest)
+        except Exception as e:
+            results[path] = {"path": path, "error": str(e)}
+    elif misses:
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=_pool_context()) as pool:
+            futures = {path: pool.submit(_analyze_with_hash, path, digest) for path, digest in misses.items()}
+            for path, future in futures.items():
+                try:
+                    results[path] = future.result()
+                except Exception as e:
+                    results[path] = {"path": path, "error": str(e)}
+
+    if cache:
+        for path, digest in misses.items():
+            if "error" not in results[path]:
+                cache.put(digest, results[path])
+    return results
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    for gcode_path in sys.argv[1:]:
+        started = time.perf_counter()
+        summary = analyze_file(gcode_path)
+        elapsed = time.perf_counter() - started
+        summary.pop("settings")
+        print(json.dumps(summary, indent=2))
+        print(f"{summary['size'] / 1e6 / elapsed:.1f} MB/s")
@@ -0,0 +1,280 @@
+import hashlib
+import os
+import posixpath
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+# Read/write size for hashing and upload streaming.
+CHUNK_SIZE = 1024 * 1024
+DEFAULT_CONCURRENCY = 8
+UPLOAD_TIMEOUT = 30           # seconds without progress before a printer upload fails
+MAX_FINISHED_DISTRIBUTIONS = 100
+
+
+class GcodeStore:
+    """
+    Gcode files on disk, addressed by blake2b of their contents (the same
+    digest gcode_analyzer.content_hash produces), sharded by the first two
+    hex characters.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def path_for(self, digest):
+        return os.path.join(self.directory, digest[:2], f"{digest}.gcode")
+
+    def exists(self, digest):
+        return os.path.exists(self.path_for(digest))
+
+    def ingest(self, stream):
+        """
+        Copy a binary stream into the store in chunks while hashing it.
+        Returns (digest, size). Identical content is stored once.
+        """
+        digest = hashlib.blake2b(digest_size=20)
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                for chunk in iter(lambda: stream.read(CHUNK_SIZE), b""):
+                    digest.update(chunk)
+                    out.write(chunk)
+                    size += len(chunk)
+            hexdigest = digest.hexdigest()
+            final = self.path_for(hexdigest)
+            os.makedirs(os.path.dirname(final), exist_ok=True)
+            os.replace(tmp_path, final)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return hexdigest, size
+
+
+class MultipartFileBody:
+    """
+    multipart/form-data body for Moonraker's /server/files/upload that streams
+    the file from disk. It has a length, so requests sends Content-Length
+    instead of chunked encoding, and on_progress(sent) is called per chunk.
+    """
+
+    def __init__(self, file_path, filename, fields, on_progress=None):
+        self.boundary = uuid.uuid4().hex
+        self.file_path = file_path
+        self.on_progress = on_progress
+        head = b"".join(
+            (
+                f"--{self.boundary}\r\n"
+                f"Content-Disposition: form-data; name=\"{name}\"\r\n\r\n{value}\r\n"
+            ).encode()
+            for name, value in fields.items()
+        )
+        head += (
+            f"--{self.boundary}\r\n"
+            f"Content-Disposition: form-data; name=\"file\"; filename=\"{filename}\"\r\n"
+            "Content-Type: application/octet-stream\r\n\r\n"
+        ).encode()
+        self.head = head
+        self.tail = f"\r\n--{self.boundary}--\r\n".encode()
+        self.file_size = os.path.getsize(file_path)
+
+    @property
+    def content_type(self):
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    def __len__(self):
+        return len(self.head) + self.file_size + len(self.tail)
+
+    def __iter__(self):
+        yield self.head
+        sent = 0
+        with open(self.file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                yield chunk
+                sent += len(chunk)
+                if self.on_progress:
+                    self.on_progress(sent)
+        yield self.tail
+
+
+class Distribution:
+    """Progress of one stored gcode being uploaded to a set of printers."""
+
+    def __init__(self, content_hash, filename, size, targets):
+        self.id = uuid.uuid4().hex[:12]
+        self.content_hash = content_hash
+        self.filename = filename
+        self.size = size
+        self.created_at = datetime.utcnow()
+        self.finished_at = None
+        self.lock = threading.Lock()
+        self.printers = {
+            t["printer_id"]: {
+                "printer_id": t["printer_id"],
+                "ip_address": t["ip_address"],
+                "state": "pending",
+                "sent": 0,
+                "total": size,
+                "error": None,
+            }
+            for t in targets
+        }
+
+    def update(self, printer_id, **fields):
+        with self.lock:
+            self.printers[printer_id].update(fields)
+
+    def to_dict(self):
+        with self.lock:
+            printers = [dict(p) for p in self.printers.values()]
+        counts = {}
+        for p in printers:
+            counts[p["state"]] = counts.get(p["state"], 0) + 1
+        return {
+            "distribution_id": self.id,
+            "content_hash": self.content_hash,
+            "filename": self.filename,
+            "size": self.size,
+            "created_at": self.created_at.isoformat(),
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "counts": counts,
+            "printers": sorted(printers, key=lambda p: p["printer_id"]),
+        }
+
+
+class DistributionManager:
+    """
+    Runs distributions in background threads: each uploads to its printers
+    with bounded concurrency, streaming the file from the store, and records
+    a GcodePlacement as soon as a printer accepts it.
+    """
+
+    def __init__(self, app, store):
+        self.app = app
+        self.store = store
+        self.distributions = {}
+        self.lock = threading.Lock()
+
+    def get(self, distribution_id):
+        with self.lock:
+            return self.distributions.get(distribution_id)
+
+    def start(self, blob, targets, path="", skip_printers=(), concurrency=DEFAULT_CONCURRENCY,
+              force=False):
+        """
+        Begin uploading blob to targets (dicts with printer_id, ip_address,
+        port); printers in skip_printers already hold it and are not contacted.
+        Unless force is set, a printer that another distribution placed the
+        file on in the meantime is skipped when its turn comes.
+        """
+        dist = Distribution(blob.content_hash, blob.filename, blob.size, targets)
+        for printer_id in skip_printers:
+            dist.update(printer_id, state="skipped", sent=blob.size)
+        pending = [t for t in targets if t["printer_id"] not in set(skip_printers)]
+
+        with self.lock:
+            self.distributions[dist.id] = dist
+            self._trim()
+        threading.Thread(
+            target=self._run, args=(dist, pending, path, concurrency, force), daemon=True
+        ).start()
+        return dist
+
+    def _trim(self):
+        finished = sorted(
+            (d for d in self.distributions.values() if d.finished_at),
+            key=lambda d: d.finished_at
+        )
+        for d in finished[:max(0, len(finished) - MAX_FINISHED_DISTRIBUTIONS)]:
+            del self.distributions[d.id]
+
+    def _run(self, dist, targets, path, concurrency, force):
+        remote = posixpath.join(path, dist.filename) if path else dist.filename
+        uploaded = 0
+        if targets:
+            with ThreadPoolExecutor(max_workers=min(concurrency, len(targets))) as pool:
+                uploaded = sum(pool.map(lambda t: self._upload(dist, t, path, remote, force), targets))
+        dist.finished_at = datetime.utcnow()
+        print(f"[GcodeStore] Distribution {dist.id}: {uploaded}/{len(targets)} upload(s) succeeded.")
+
+    def _upload(self, dist, target, path, remote, force):
+        """Upload to one printer and record the placement; True if it was uploaded."""
+        from services.printer_commands import get_session
+
+        printer_id = target["printer_id"]
+        if not force and self._placed(dist.content_hash, printer_id, remote):
+            dist.update(printer_id, state="skipped", sent=dist.size)
+            return False
+        body = MultipartFileBody(
+            self.store.path_for(dist.content_hash),
+            dist.filename,
+            {"root": "gcodes", "path": path},
+            on_progress=lambda sent: dist.update(printer_id, sent=sent)
+        )
+        dist.update(printer_id, state="uploading")
+        started = time.monotonic()
+        try:
+            resp = get_session().post(
+                f"http://{target['ip_address']}:{target['port']}/server/files/upload",
+                data=body,
+                headers={"Content-Type": body.content_type},
+                timeout=UPLOAD_TIMEOUT
+            )
+            resp.raise_for_status()
+        except Exception as e:
+            dist.update(printer_id, state="failed", error=f"{type(e).__name__}: {e}")
+            return False
+        self._record(dist.content_hash, printer_id, remote)
+        dist.update(printer_id, state="done", elapsed=round(time.monotonic() - started, 2))
+        return True
+
+    def _placed(self, content_hash, printer_id, remote):
+        from models.gcode_store import GcodePlacement
+
+        try:
+            with self.app.app_context():
+                return GcodePlacement.query.filter_by(
+                    content_hash=content_hash, printer_id=printer_id, path=remote
+                ).first() is not None
+        except Exception as e:
+            print(f"[GcodeStore] Error checking placement of {content_hash} on {printer_id}: {e}")
+            return False
+
+    def _record(self, content_hash, printer_id, remote):
+        from sqlalchemy.dialects.postgresql import insert as pg_insert
+        from models import db
+        from models.gcode_store import GcodePlacement
+
+        now = datetime.utcnow()
+        try:
+            with self.app.app_context():
+                stmt = pg_insert(GcodePlacement.__table__).values(
+                    content_hash=content_hash, printer_id=printer_id, path=remote, uploaded_at=now
+                )
+                db.session.execute(stmt.on_conflict_do_update(
+                    index_elements=["content_hash", "printer_id", "path"],
+                    set_={"uploaded_at": stmt.excluded.uploaded_at}
+                ))
+                db.session.commit()
+        except Exception as e:
+            print(f"[GcodeStore] Error recording placement of {content_hash} on {printer_id}: {e}")
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+def get_distribution_manager(app):
+    """Process-wide store and distribution manager, created on first use."""
+    global _manager
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                store = GcodeStore(app.config.get("GCODE_STORE", ".gcode_store"))
+                _manager = DistributionManager(app, store)
+    return _manager
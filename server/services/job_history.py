@@ -0,0 +1,255 @@
+"""
+Local archive of every printer's Moonraker job history (print_jobs).
+
+ingest_printer() pulls only what is new since the printer's cursor
+(print_history_cursors.since, a Moonraker start_time). It passes the cursor
+as "since" with order=asc and pages through the result. The cursor then
+moves to the newest start_time it saw. If a job was still in_progress, the
+cursor stays just before that job instead, so the next pull picks up its
+final status. Rows are upserted, so pulling a job twice is harmless.
+
+HistoryIngester runs the pulls for the printers this process polls, every
+SWEEP_INTERVAL seconds. Printers that push notify_history_changed (over the
+shared JSON-RPC websocket, or MoonrakerSocket) have each pushed job written
+directly and are only swept every PUSH_SWEEP_INTERVAL as a safety net.
+"""
+import threading
+import time
+from datetime import datetime
+
+from models import db
+from models.printers import Printer
+from models.print_job import PrintJob, PrintHistoryCursor
+
+PAGE_SIZE = 100
+HISTORY_TIMEOUT = 10
+SWEEP_INTERVAL = 300
+PUSH_SWEEP_INTERVAL = 3600
+# A printer counts as pushing if any notification arrived this recently.
+PUSH_FRESHNESS = 120
+# The cursor is held this far before the oldest in_progress job.
+CURSOR_EPSILON = 0.001
+
+
+def _timestamp(value):
+    return datetime.utcfromtimestamp(value) if value else None
+
+
+def _row(printer_id, job, now):
+    meta = job.get("metadata") or {}
+    filament_type = meta.get("filament_type")
+    return {
+        "printer_id": printer_id,
+        "job_id": str(job["job_id"]),
+        "filename": job.get("filename"),
+        "status": job.get("status"),
+        "start_time": _timestamp(job.get("start_time")),
+        "end_time": _timestamp(job.get("end_time")),
+        "print_duration": job.get("print_duration"),
+        "total_duration": job.get("total_duration"),
+        "filament_used": job.get("filament_used"),
+        "estimated_time": meta.get("estimated_time"),
+        "filament_total": meta.get("filament_total"),
+        "filament_type": str(filament_type)[:50] if filament_type else None,
+        "updated_at": now,
+    }
+
+
+def upsert_jobs(printer_id, jobs):
+    """Insert or refresh Moonraker job dicts for one printer (no commit)."""
+    from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+    now = datetime.utcnow()
+    # One row per job (the last version wins); ON CONFLICT may not touch a row twice.
+    rows = list({
+        str(job["job_id"]): _row(printer_id, job, now) for job in jobs if job.get("job_id") is not None
+    }.values())
+    if not rows:
+        return 0
+    stmt = pg_insert(PrintJob.__table__).values(rows)
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=["printer_id", "job_id"],
+        set_={key: stmt.excluded[key] for key in rows[0] if key not in ("printer_id", "job_id")}
+    ))
+    return len(rows)
+
+
+def next_cursor(since, jobs):
+    """Cursor after ingesting jobs: the newest start_time, held before any in_progress job."""
+    in_progress = [j["start_time"] for j in jobs if j.get("status") == "in_progress" and j.get("start_time")]
+    if in_progress:
+        return min(in_progress) - CURSOR_EPSILON
+    starts = [j["start_time"] for j in jobs if j.get("start_time")]
+    return max([since] + starts)
+
+
+def ingest_printer(printer_id, ip, port):
+    """
+    Pull the printer's jobs newer than its cursor into print_jobs and advance
+    the cursor. Needs an app context; raises MoonrakerError if the printer
+    does not answer. Returns the number of jobs written.
+    """
+    from sqlalchemy.dialects.postgresql import insert as pg_insert
+    from services import moonraker_rpc
+
+    cursor = PrintHistoryCursor.query.get(printer_id)
+    since = cursor.since if cursor is not None else 0.0
+
+    jobs, start = [], 0
+    while True:
+        params = {"limit": PAGE_SIZE, "start": start, "order": "asc"}
+        if since:
+            params["since"] = since
+        result = moonraker_rpc.call(ip, port, "server.history.list", params, timeout=HISTORY_TIMEOUT)
+        page = (result or {}).get("jobs") or []
+        upsert_jobs(printer_id, page)
+        jobs.extend(page)
+        if len(page) < PAGE_SIZE:
+            break
+        start += len(page)
+
+    stmt = pg_insert(PrintHistoryCursor.__table__).values(
+        printer_id=printer_id, since=next_cursor(since, jobs), synced_at=datetime.utcnow()
+    )
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=["printer_id"],
+        set_={"since": stmt.excluded.since, "synced_at": stmt.excluded.synced_at}
+    ))
+    db.session.commit()
+    return len(jobs)
+
+
+def latest_durations(printer_id):
+    """{filename: total_duration} of the most recent completed job per file."""
+    rows = (
+        PrintJob.query
+        .filter(PrintJob.printer_id == printer_id,
+                PrintJob.status == "completed",
+                PrintJob.end_time.isnot(None),
+                PrintJob.total_duration.isnot(None))
+        .order_by(PrintJob.end_time)
+        .with_entities(PrintJob.filename, PrintJob.total_duration)
+    )
+    return {filename: duration for filename, duration in rows}
+
+
+class HistoryIngester:
+    """
+    Keeps print_jobs current for the printers polled by this process.
+    on_notification() is called from socket reader threads; it only queues
+    pushed jobs, and the ingester thread does all database and Moonraker work.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.cond = threading.Condition()
+        self.pushed = []       # (ip, job) from notify_history_changed
+        self.last_push = {}    # ip -> monotonic time of the last notification
+        self.last_sweep = {}   # ip -> monotonic time of the last pull
+        self.printers = {}     # ip -> printer_id
+        self.thread = None
+        self.active = False
+
+    def on_notification(self, printer_ip, method, params):
+        with self.cond:
+            self.last_push[printer_ip] = time.monotonic()
+            if method != "notify_history_changed":
+                return
+            for item in params or ():
+                job = item.get("job") if isinstance(item, dict) else None
+                if job:
+                    self.pushed.append((printer_ip, job))
+            self.cond.notify()
+
+    def _polled_printers(self):
+        from api.printers import printerPollers
+
+        ips = list(printerPollers)
+        if not ips:
+            return []
+        return (
+            Printer.query.filter(Printer.ip_address.in_(ips))
+            .with_entities(Printer.ip_address, Printer.printer_id, Printer.port)
+            .all()
+        )
+
+    def _write_pushed(self, pushed):
+        by_ip = {}
+        for ip, job in pushed:
+            by_ip.setdefault(ip, []).append(job)
+        missing = [ip for ip in by_ip if ip not in self.printers]
+        if missing:
+            self.printers.update(
+                Printer.query.filter(Printer.ip_address.in_(missing))
+                .with_entities(Printer.ip_address, Printer.printer_id)
+            )
+        for ip, jobs in by_ip.items():
+            if ip in self.printers:
+                upsert_jobs(self.printers[ip], jobs)
+        db.session.commit()
+
+    def _sweep(self):
+        now = time.monotonic()
+        for ip, printer_id, port in self._polled_printers():
+            self.printers[ip] = printer_id
+            pushing = now - self.last_push.get(ip, float("-inf")) < PUSH_FRESHNESS
+            interval = PUSH_SWEEP_INTERVAL if pushing else SWEEP_INTERVAL
+            if now - self.last_sweep.get(ip, float("-inf")) < interval:
+                continue
+            self.last_sweep[ip] = now
+            try:
+                count = ingest_printer(printer_id, ip, port)
+                if count:
+                    print(f"[History][{ip}] Ingested {count} job(s).")
+            except Exception as e:
+                db.session.rollback()
+                print(f"[History][{ip}] Ingest failed: {e}")
+
+    def run_loop(self):
+        next_sweep = time.monotonic()
+        while self.active:
+            with self.cond:
+                if not self.pushed:
+                    self.cond.wait(timeout=max(0.0, next_sweep - time.monotonic()))
+                pushed, self.pushed = self.pushed, []
+            try:
+                with self.app.app_context():
+                    if pushed:
+                        self._write_pushed(pushed)
+                    if time.monotonic() >= next_sweep:
+                        self._sweep()
+                        next_sweep = time.monotonic() + SWEEP_INTERVAL
+            except Exception as e:
+                print(f"[History] Error: {e}")
+                with self.app.app_context():
+                    db.session.rollback()
+
+    def start(self):
+        from services import moonraker_rpc
+
+        moonraker_rpc.add_listener(self.on_notification)
+        self.active = True
+        self.thread = threading.Thread(target=self.run_loop, daemon=True)
+        self.thread.start()
+        print("[History] Ingester started.")
+
+    def stop(self):
+        self.active = False
+        with self.cond:
+            self.cond.notify()
+
+
+# The ingester running in this process, if enabled.
+_INGESTER = None
+
+def set_ingester(ingester):
+    global _INGESTER
+    _INGESTER = ingester
+
+def get_ingester():
+    return _INGESTER
+
+def on_notification(printer_ip, method, params):
+    """Hook for Moonraker notifications received outside moonraker_rpc."""
+    if _INGESTER is not None:
+        _INGESTER.on_notification(printer_ip, method, params)
@@ -0,0 +1,141 @@
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from models import db
+from models.gcode_metadata import GcodeMetadataCache
+
+# Entries not used by any sync for this long are pruned.
+MAX_AGE = timedelta(days=90)
+# Hard cap on cached entries across all printers; least recently used go first.
+MAX_ENTRIES = 50000
+
+
+class CacheStats:
+    """Process-wide hit/miss counters for the metadata cache."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.pruned = 0
+
+    def record(self, hits, misses, pruned=0):
+        with self.lock:
+            self.hits += hits
+            self.misses += misses
+            self.pruned += pruned
+
+    def to_dict(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "pruned": self.pruned,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            }
+
+
+stats = CacheStats()
+
+
+def load_cached_metadata(printer_id, file_list):
+    """
+    Split a Moonraker file list into cache hits and misses with one query.
+    Returns ({path: metadata} for files whose modified/size still match,
+    [file_info] for files that need a /server/files/metadata call).
+    """
+    entries = {
+        e.path: e for e in GcodeMetadataCache.query.filter_by(printer_id=printer_id)
+    }
+    hits, misses = {}, []
+    for file_info in file_list:
+        path = file_info.get("path")
+        if not path:
+            continue
+        entry = entries.get(path)
+        if entry is not None and entry.matches(file_info):
+            hits[path] = entry.file_metadata
+        else:
+            misses.append(file_info)
+    return hits, misses
+
+
+def store_metadata(printer_id, fetched, hit_paths, file_paths):
+    """
+    Persist one sync's outcome without committing:
+      - upsert freshly fetched metadata ([(file_info, metadata)]),
+      - bump last_used_at / hit_count for hits in one UPDATE,
+      - drop this printer's entries for files no longer on the printer.
+    """
+    now = datetime.utcnow()
+    if fetched:
+        table = GcodeMetadataCache.__table__
+        stmt = pg_insert(table).values([
+            {
+                "printer_id": printer_id,
+                "path": info["path"],
+                "modified": info.get("modified") or 0.0,
+                "size": info.get("size") or 0,
+                "metadata": metadata,
+                "last_used_at": now,
+                "hit_count": 0,
+            }
+            for info, metadata in fetched
+        ])
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=["printer_id", "path"],
+            set_={
+                "modified": stmt.excluded.modified,
+                "size": stmt.excluded.size,
+                "metadata": stmt.excluded.metadata,
+                "last_used_at": stmt.excluded.last_used_at,
+                "hit_count": 0,
+            }
+        ))
+    if hit_paths:
+        GcodeMetadataCache.query.filter(
+            GcodeMetadataCache.printer_id == printer_id,
+            GcodeMetadataCache.path.in_(hit_paths)
+        ).update({
+            "last_used_at": now,
+            "hit_count": GcodeMetadataCache.hit_count + 1,
+        }, synchronize_session=False)
+    stale = GcodeMetadataCache.query.filter(GcodeMetadataCache.printer_id == printer_id)
+    if file_paths:
+        stale = stale.filter(GcodeMetadataCache.path.notin_(file_paths))
+    removed = stale.delete(synchronize_session=False)
+    stats.record(len(hit_paths), len(fetched), removed)
+
+
+def prune(max_age=MAX_AGE, max_entries=MAX_ENTRIES):
+    """Drop entries unused for max_age, then the least recently used beyond max_entries."""
+    removed = GcodeMetadataCache.query.filter(
+        GcodeMetadataCache.last_used_at < datetime.utcnow() - max_age
+    ).delete(synchronize_session=False)
+
+    total = db.session.query(func.count()).select_from(GcodeMetadataCache).scalar()
+    if total > max_entries:
+        cutoff = (
+            db.session.query(GcodeMetadataCache.last_used_at)
+            .order_by(GcodeMetadataCache.last_used_at.desc())
+            .offset(max_entries)
+            .limit(1)
+            .scalar()
+        )
+        if cutoff is not None:
+            removed += GcodeMetadataCache.query.filter(
+                GcodeMetadataCache.last_used_at < cutoff
+            ).delete(synchronize_session=False)
+    stats.record(0, 0, removed)
+    return removed
+
+
+def summary():
+    """Counters plus the size of the persistent table."""
+    data = stats.to_dict()
+    data["entries"] = db.session.query(func.count()).select_from(GcodeMetadataCache).scalar()
+    return data
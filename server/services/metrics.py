@@ -0,0 +1,220 @@
+"""
+In-process metrics in the Prometheus text exposition format.
+
+Counters and histograms keep plain lists of numbers. Callers resolve a
+labelled child once (metric.labels(...)) and keep it, so recording a sample
+is one bisect and a couple of list increments, with no locks and no
+allocation. Under eventlet, green threads only switch on I/O, so the
+increments cannot interleave. Under native threads, a lost increment is
+the accepted cost of staying lock-free.
+"""
+import time
+from bisect import bisect_left
+
+# Seconds; tuned for LAN HTTP calls and small DB transactions.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(names, values, extra=""):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = [0.0]
+
+    def inc(self, amount=1):
+        self.value[0] += amount
+
+
+class _GaugeChild(_CounterChild):
+    __slots__ = ()
+
+    def dec(self, amount=1):
+        self.value[0] -= amount
+
+    def set(self, value):
+        self.value[0] = value
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)   # last slot is +Inf
+        self.sum = [0.0]
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum[0] += value
+
+
+class _Metric:
+    kind = None
+    child_class = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.children = {}
+        if not self.labelnames:
+            self._default = self.labels()
+
+    def _new_child(self):
+        return self.child_class()
+
+    def labels(self, *values):
+        child = self.children.get(values)
+        if child is None:
+            child = self.children[values] = self._new_child()
+        return child
+
+    def remove(self, *values):
+        self.children.pop(values, None)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self):
+        lines = self.header()
+        for values, child in list(self.children.items()):
+            lines.append(f"{self.name}{_label_text(self.labelnames, values)} {child.value[0]}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+    child_class = _CounterChild
+
+    def inc(self, amount=1):
+        self._default.inc(amount)
+
+
+class Gauge(_Metric):
+    """A gauge set directly, or computed at scrape time from a callback."""
+    kind = "gauge"
+    child_class = _GaugeChild
+
+    def __init__(self, name, documentation, labelnames=(), callback=None):
+        self.callback = callback
+        super().__init__(name, documentation, labelnames)
+
+    def inc(self, amount=1):
+        self._default.inc(amount)
+
+    def dec(self, amount=1):
+        self._default.dec(amount)
+
+    def set(self, value):
+        self._default.set(value)
+
+    def render(self):
+        if self.callback is not None:
+            try:
+                self._default.set(self.callback())
+            except Exception:
+                pass
+        return super().render()
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self._default.observe(value)
+
+    def render(self):
+        lines = self.header()
+        for values, child in list(self.children.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), child.counts):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_label_text(self.labelnames, values, le)} {cumulative}")
+            labels = _label_text(self.labelnames, values)
+            lines.append(f"{self.name}_sum{labels} {child.sum[0]}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+REGISTRY = []
+
+def _register(metric):
+    REGISTRY.append(metric)
+    return metric
+
+def render():
+    """Every registered metric in text exposition format."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+POLL_SECONDS = _register(Histogram(
+    "printer_poll_seconds", "Latency of Moonraker status polls.", ["printer"]))
+POLL_ERRORS = _register(Counter(
+    "printer_poll_errors_total", "Failed Moonraker status polls.", ["printer"]))
+EMITS = _register(Counter(
+    "socketio_emits_total", "Socket.IO packets handed to clients.", ["event"]))
+EMIT_BYTES = _register(Counter(
+    "socketio_emit_bytes_total", "Payload bytes handed to Socket.IO clients.", ["event"]))
+DB_COMMIT_SECONDS = _register(Histogram(
+    "db_commit_seconds", "Latency of SQLAlchemy session commits."))
+HTTP_REQUEST_SECONDS = _register(Histogram(
+    "http_request_seconds", "HTTP request latency per route.", ["method", "route", "status"]))
+MOONRAKER_SOCKETS = _register(Gauge(
+    "moonraker_sockets_connected", "Open Moonraker websocket connections."))
+
+
+def gauge(name, documentation, callback):
+    """Register a gauge whose value is read from callback() at scrape time."""
+    return _register(Gauge(name, documentation, callback=callback))
+
+
+def instrument_app(app, db):
+    """Time every request per route and every session commit."""
+    from flask import g, request
+    from sqlalchemy import event
+
+    @app.before_request
+    def _start_timer():
+        g._metrics_started = time.perf_counter()
+
+    @app.after_request
+    def _observe_request(response):
+        started = getattr(g, "_metrics_started", None)
+        if started is not None:
+            route = request.url_rule.rule if request.url_rule else "unmatched"
+            HTTP_REQUEST_SECONDS.labels(request.method, route, response.status_code).observe(
+                time.perf_counter() - started
+            )
+        return response
+
+    @event.listens_for(db.session, "before_commit")
+    def _commit_started(session):
+        session.info["_metrics_commit_started"] = time.perf_counter()
+
+    @event.listens_for(db.session, "after_commit")
+    def _commit_finished(session):
+        started = session.info.pop("_metrics_commit_started", None)
+        if started is not None:
+            DB_COMMIT_SECONDS.observe(time.perf_counter() - started)
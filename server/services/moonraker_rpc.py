@@ -0,0 +1,271 @@
+"""
+Moonraker API calls over one persistent JSON-RPC websocket per printer
+(MOONRAKER_RPC = "true"), or over HTTP otherwise.
+
+Every request on a connection gets its own id and a Future that the reader
+thread resolves when the matching response arrives. Callers can therefore
+pipeline any number of requests on the same socket (submit / call_many)
+and wait for them in any order. Notifications (messages without an id) go
+to the functions registered with add_listener.
+
+When a printer's websocket cannot be opened, calls fall back to the HTTP
+endpoint with the same name (server.files.list -> /server/files/list) and
+the websocket is retried after RECONNECT_BACKOFF seconds. A call whose
+connection drops after it was sent is failed, not retried, so commands such
+as printer.print.start are never sent twice.
+"""
+import itertools
+import json
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+from services import metrics
+
+DEFAULT_TIMEOUT = 5
+CONNECT_TIMEOUT = 3
+RECONNECT_BACKOFF = 10
+
+# Methods served by GET over HTTP (params go in the query string); the rest
+# are POSTed with a JSON body.
+HTTP_GET_METHODS = {
+    "server.info", "server.files.list", "server.files.metadata", "server.history.list",
+    "printer.info", "printer.objects.list", "printer.objects.query",
+}
+
+
+class MoonrakerError(Exception):
+    """A Moonraker call failed; code is the JSON-RPC error code or HTTP status."""
+
+    def __init__(self, message, code=None):
+        super().__init__(message)
+        self.code = code
+
+
+class _Unavailable(MoonrakerError):
+    """The websocket could not be opened; the call was not sent."""
+
+
+class RPCConnection:
+    def __init__(self, ip, port):
+        self.ip = ip
+        self.url = f"ws://{ip}:{port}/websocket"
+        self.ws = None
+        self.ids = itertools.count(1)
+        self.pending = {}           # rpc id -> Future
+        self.lock = threading.Lock()
+        self.send_lock = threading.Lock()
+        self.failed_at = None
+
+    def _connect(self):
+        with self.lock:
+            if self.ws is not None:
+                return self.ws
+            if self.failed_at is not None and time.monotonic() - self.failed_at < RECONNECT_BACKOFF:
+                raise _Unavailable(f"{self.url} unavailable")
+            import websocket  # websocket-client, as used by MoonrakerSocket
+            try:
+                ws = websocket.create_connection(self.url, timeout=CONNECT_TIMEOUT)
+            except Exception as e:
+                self.failed_at = time.monotonic()
+                print(f"[RPC][{self.url}] Connect failed, using HTTP for {RECONNECT_BACKOFF}s: {e}")
+                raise _Unavailable(str(e))
+            ws.settimeout(None)
+            self.ws, self.failed_at = ws, None
+            metrics.MOONRAKER_SOCKETS.inc()
+        threading.Thread(target=self._read_loop, args=(ws,), daemon=True).start()
+        return ws
+
+    def submit(self, method, params=None):
+        """Send one request and return a Future for its result."""
+        ws = self._connect()
+        future = Future()
+        future.rpc_id = next(self.ids)
+        with self.lock:
+            self.pending[future.rpc_id] = future
+        message = json.dumps({"jsonrpc": "2.0", "method": method, "params": params or {}, "id": future.rpc_id})
+        try:
+            with self.send_lock:
+                ws.send(message)
+        except Exception as e:
+            self._drop(ws, e)
+        return future
+
+    def forget(self, future):
+        with self.lock:
+            self.pending.pop(future.rpc_id, None)
+
+    def _read_loop(self, ws):
+        while True:
+            try:
+                message = ws.recv()
+            except Exception as e:
+                self._drop(ws, e)
+                return
+            try:
+                data = json.loads(message)
+            except (TypeError, ValueError):
+                continue
+            rpc_id = data.get("id")
+            if rpc_id is None:
+                _notify(self.ip, data.get("method"), data.get("params"))
+                continue
+            with self.lock:
+                future = self.pending.pop(rpc_id, None)
+            if future is None:
+                continue
+            error = data.get("error")
+            if error is not None:
+                future.set_exception(MoonrakerError(error.get("message", str(error)), error.get("code")))
+            else:
+                future.set_result(data.get("result"))
+
+    def _drop(self, ws, error):
+        with self.lock:
+            if self.ws is not ws:
+                return
+            self.ws = None
+            pending, self.pending = self.pending, {}
+            metrics.MOONRAKER_SOCKETS.dec()
+        try:
+            ws.close()
+        except Exception:
+            pass
+        for future in pending.values():
+            future.set_exception(MoonrakerError(f"Connection lost: {error}"))
+
+    def close(self):
+        ws = self.ws
+        if ws is not None:
+            self._drop(ws, "closed")
+
+
+_enabled = False
+_connections = {}
+_connections_lock = threading.Lock()
+_listeners = []
+
+
+def add_listener(listener):
+    """Call listener(ip, method, params) for every notification on any connection."""
+    _listeners.append(listener)
+
+
+def _notify(ip, method, params):
+    for listener in _listeners:
+        try:
+            listener(ip, method, params)
+        except Exception as e:
+            print(f"[RPC][{ip}] Error in {method} listener: {e}")
+
+
+def configure(enabled):
+    global _enabled
+    _enabled = bool(enabled)
+
+
+def enabled():
+    return _enabled
+
+
+def get_connection(ip, port):
+    """The shared connection to one printer (not opened until first use)."""
+    key = (ip, int(port))
+    connection = _connections.get(key)
+    if connection is None:
+        with _connections_lock:
+            connection = _connections.setdefault(key, RPCConnection(ip, port))
+    return connection
+
+
+def close(ip):
+    """Close every connection to ip; pending calls fail."""
+    with _connections_lock:
+        keys = [key for key in _connections if key[0] == ip]
+        connections = [_connections.pop(key) for key in keys]
+    for connection in connections:
+        connection.close()
+
+
+def _await(connection, future, deadline):
+    try:
+        return future.result(timeout=max(0.0, deadline - time.monotonic()))
+    except FutureTimeout:
+        connection.forget(future)
+        raise MoonrakerError("Timed out waiting for response")
+
+
+def _object_query_string(objects):
+    """Moonraker's GET form of printer.objects.query: ?toolhead&extruder=temperature,target"""
+    return "&".join(name if not fields else f"{name}={','.join(fields)}" for name, fields in objects.items())
+
+
+def _http_call(ip, port, method, params, timeout):
+    from services.printer_commands import get_session
+
+    url = f"http://{ip}:{port}/{method.replace('.', '/')}"
+    try:
+        if method == "printer.objects.query":
+            resp = get_session().get(f"{url}?{_object_query_string(params.get('objects', {}))}", timeout=timeout)
+        elif method in HTTP_GET_METHODS:
+            resp = get_session().get(url, params=params, timeout=timeout)
+        else:
+            resp = get_session().post(url, json=params, timeout=timeout)
+    except Exception as e:
+        raise MoonrakerError(f"{type(e).__name__}: {e}")
+    try:
+        data = resp.json()
+    except ValueError:
+        data = {}
+    if not resp.ok:
+        error = data.get("error") if isinstance(data, dict) else None
+        message = error.get("message") if isinstance(error, dict) else resp.text[:500]
+        raise MoonrakerError(message, resp.status_code)
+    return data.get("result")
+
+
+def call(ip, port, method, params=None, timeout=DEFAULT_TIMEOUT):
+    """Call one Moonraker method and return its result; raises MoonrakerError."""
+    params = params or {}
+    if _enabled:
+        connection = get_connection(ip, port)
+        try:
+            future = connection.submit(method, params)
+        except _Unavailable:
+            pass
+        else:
+            return _await(connection, future, time.monotonic() + timeout)
+    return _http_call(ip, port, method, params, timeout)
+
+
+def call_many(ip, port, calls, timeout=DEFAULT_TIMEOUT):
+    """
+    Call several (method, params) pairs on one printer. Over the websocket
+    they are pipelined and timeout bounds the whole batch. Calls that fall
+    back to HTTP run one after another, with timeout applying to each call.
+    Returns results in order, with a MoonrakerError in place of each call
+    that failed.
+    """
+    rpc = get_connection(ip, port) if _enabled else None
+    connection = rpc
+    futures = []
+    for method, params in calls:
+        future = None
+        if connection is not None:
+            try:
+                future = connection.submit(method, params or {})
+            except _Unavailable:
+                connection = None
+        futures.append(future)
+
+    deadline = time.monotonic() + timeout
+    results = []
+    for (method, params), future in zip(calls, futures):
+        try:
+            if future is not None:
+                results.append(_await(rpc, future, deadline))
+            else:
+                results.append(_http_call(ip, port, method, params or {}, timeout))
+        except MoonrakerError as e:
+            results.append(e)
+    return results
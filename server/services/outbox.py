@@ -0,0 +1,248 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from extensions import PreEncodedJSON
+from services import metrics
+
+# Packets waiting in a client's engine.io queue above which it counts as slow;
+# further updates for it are held (and replaced) here instead.
+MAX_QUEUED_PACKETS = 4
+# Per-client cap on held bytes; the oldest held updates are dropped beyond it.
+MAX_BUFFERED_BYTES = 1024 * 1024
+# How often held updates for slow clients are retried, in seconds.
+RETRY_INTERVAL = 0.05
+# Only if engine.io's send queue cannot be inspected: bytes handed to
+# Socket.IO per client per second, beyond which updates are held instead.
+FALLBACK_BYTES_PER_SECOND = 256 * 1024
+
+
+_emit_metrics = {}
+
+def _record_emit(event, size, clients=1):
+    children = _emit_metrics.get(event)
+    if children is None:
+        children = _emit_metrics[event] = (metrics.EMITS.labels(event), metrics.EMIT_BYTES.labels(event))
+    children[0].inc(clients)
+    children[1].inc(size * clients)
+
+
+class ClientBuffer:
+    __slots__ = ("pending", "bytes", "window_start", "window_bytes")
+
+    def __init__(self):
+        self.pending = OrderedDict()   # key -> (event, data, size)
+        self.bytes = 0
+        self.window_start = 0.0
+        self.window_bytes = 0          # handed to Socket.IO since window_start
+
+    def over_budget(self, now):
+        """True if this second's FALLBACK_BYTES_PER_SECOND is used up."""
+        if now - self.window_start >= 1.0:
+            self.window_start, self.window_bytes = now, 0
+        return self.window_bytes >= FALLBACK_BYTES_PER_SECOND
+
+
+class Outbox:
+    """
+    Latest-wins delivery of telemetry to the Socket.IO clients of this process.
+
+    Every client has a buffer keyed by (event, printer). A newer update for
+    the same key replaces the held one, and a client's buffer is capped at
+    MAX_BUFFERED_BYTES by dropping its oldest entries. One sender thread
+    hands buffers to Socket.IO only while the client's engine.io queue is
+    short. A fast client therefore sees every update right away. A slow one
+    gets the newest state per printer, and the memory it can hold stays
+    bounded. If engine.io's queue cannot be inspected, each client is instead
+    limited to FALLBACK_BYTES_PER_SECOND.
+
+    Payloads are encoded once per publish as PreEncodedJSON, and clients that
+    are ready for the same payload share one emit, so its Socket.IO packet is
+    built once per flush rather than once per client.
+
+    With a message queue (scale-out), clients of other workers are reached with
+    one room emit that skips this worker's sids. Those clients are buffered by
+    Socket.IO as before.
+    """
+
+    def __init__(self):
+        self.lock = threading.Condition()
+        self.clients = {}       # sid -> ClientBuffer
+        self.rooms = {}         # printer ip -> set of sids
+        self.thread = None
+        self.remote_fanout = False
+        self.counters = {"delivered": 0, "replaced": 0, "merged": 0, "dropped": 0, "deferred": 0}
+
+    def join(self, sid, printer_ip):
+        with self.lock:
+            self.clients.setdefault(sid, ClientBuffer())
+            self.rooms.setdefault(printer_ip, set()).add(sid)
+
+    def register(self, sid):
+        with self.lock:
+            self.clients.setdefault(sid, ClientBuffer())
+
+    def leave(self, sid):
+        with self.lock:
+            self.clients.pop(sid, None)
+            for ip in [ip for ip, sids in self.rooms.items() if sid in sids]:
+                self.rooms[ip].discard(sid)
+                if not self.rooms[ip]:
+                    del self.rooms[ip]
+
+    def publish(self, printer_ip, event, data):
+        """Queue data for every local client watching printer_ip (latest wins)."""
+        if not isinstance(data, PreEncodedJSON):
+            data = PreEncodedJSON(json.dumps(data))
+        with self.lock:
+            sids = list(self.rooms.get(printer_ip, ()))
+            for sid in sids:
+                self._put(sid, (event, printer_ip), event, data, len(data))
+            if sids:
+                self._wake()
+        if self.remote_fanout:
+            from extensions import socketio
+            socketio.emit(event, data, room=printer_ip, skip_sid=sids or None)
+            _record_emit(event, len(data))
+
+    def push(self, sid, key, event, data, size, merge=None):
+        """
+        Queue one update for a single client. If an update with the same key
+        is still held, merge(old, new) combines them (or new replaces old).
+        """
+        with self.lock:
+            self._put(sid, key, event, data, size, merge)
+            self._wake()
+
+    def _put(self, sid, key, event, data, size, merge=None):
+        buffer = self.clients.get(sid)
+        if buffer is None:
+            return
+        held = buffer.pending.pop(key, None)
+        if held is not None:
+            buffer.bytes -= held[2]
+            if merge is not None:
+                data = merge(held[1], data)
+                size += held[2]
+                self.counters["merged"] += 1
+            else:
+                self.counters["replaced"] += 1
+        buffer.pending[key] = (event, data, size)
+        buffer.bytes += size
+        while buffer.bytes > MAX_BUFFERED_BYTES and len(buffer.pending) > 1:
+            _, (_, _, dropped) = buffer.pending.popitem(last=False)
+            buffer.bytes -= dropped
+            self.counters["dropped"] += 1
+
+    def _wake(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run_loop, daemon=True)
+            self.thread.start()
+        self.lock.notify()
+
+    def run_loop(self):
+        from extensions import socketio
+
+        while True:
+            with self.lock:
+                ready, waiting = [], False
+                now = time.monotonic()
+                for sid, buffer in self.clients.items():
+                    if not buffer.pending:
+                        continue
+                    queued = _queued_packets(socketio, sid)
+                    if buffer.over_budget(now) if queued is None else queued > MAX_QUEUED_PACKETS:
+                        waiting = True
+                        self.counters["deferred"] += 1
+                        continue
+                    ready.append((sid, list(buffer.pending.values())))
+                    buffer.window_bytes += buffer.bytes
+                    buffer.pending.clear()
+                    buffer.bytes = 0
+                if not ready:
+                    # Nothing sendable: retry slow clients shortly, otherwise
+                    # sleep until the next publish.
+                    self.lock.wait(timeout=RETRY_INTERVAL if waiting else None)
+                    continue
+
+            for event, data, size, sids in _batches(ready):
+                try:
+                    socketio.emit(event, data, room=sids)
+                    _record_emit(event, size, len(sids))
+                except Exception as e:
+                    print(f"[Outbox] Error emitting to {sids}: {e}")
+                with self.lock:
+                    self.counters["delivered"] += len(sids)
+            if waiting:
+                with self.lock:
+                    self.lock.wait(timeout=RETRY_INTERVAL)
+
+    def stats(self):
+        with self.lock:
+            return dict(
+                self.counters,
+                clients=len(self.clients),
+                held_updates=sum(len(b.pending) for b in self.clients.values()),
+                held_bytes=sum(b.bytes for b in self.clients.values()),
+                backpressure="rate" if _queue_unavailable else "engineio",
+            )
+
+
+def _batches(ready):
+    """
+    [(sid, items)] -> [(event, data, size, sids)]. Clients holding the same
+    payload (one publish to a printer's watchers) are sent it in one emit to
+    all their sids, so Socket.IO encodes the packet once however many
+    clients are waiting. Order is kept per payload, not across printers.
+    """
+    batches = {}
+    for sid, items in ready:
+        for event, data, size in items:
+            batch = batches.get((event, id(data)))
+            if batch is None:
+                batch = batches[(event, id(data))] = (event, data, size, [])
+            batch[3].append(sid)
+    return list(batches.values())
+
+
+_queue_unavailable = False
+
+def _queued_packets(socketio, sid, namespace="/"):
+    """
+    Packets waiting in a client's engine.io send queue: 0 for a client that
+    has already gone, None if the queue cannot be inspected. The queue is
+    internal to python-engineio; if it is missing (a changed API), that is
+    logged once and the caller falls back to rate limiting.
+    """
+    global _queue_unavailable
+    if _queue_unavailable:
+        return None
+    try:
+        server = socketio.server
+        eio_sid = server.manager.eio_sid_from_sid(sid, namespace)
+        if eio_sid is None:
+            return 0
+        socket = server.eio._get_socket(eio_sid)
+    except KeyError:
+        return 0
+    except AttributeError as e:
+        return _queue_missing(e)
+    try:
+        return socket.queue.qsize()
+    except AttributeError as e:
+        return _queue_missing(e)
+
+
+def _queue_missing(error):
+    global _queue_unavailable
+    _queue_unavailable = True
+    print(f"[Outbox] engine.io send queue not available ({error}); limiting each client "
+          f"to {FALLBACK_BYTES_PER_SECOND} bytes/s instead.")
+    return None
+
+
+outbox = Outbox()
+metrics.gauge("socketio_clients", "Socket.IO clients with an outbound buffer.", lambda: len(outbox.clients))
+metrics.gauge("socketio_held_bytes", "Bytes held for slow Socket.IO clients.",
+              lambda: sum(b.bytes for b in list(outbox.clients.values())))
@@ -0,0 +1,216 @@
+import math
+import os
+import socket
+import threading
+import time
+from datetime import timedelta
+
+from sqlalchemy import func, or_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from models import db
+from models.printers import Printer
+from models.poller_lease import PollerWorker, PollerLease
+
+# The lease manager running in this process, if scale-out mode is enabled.
+_LEASE_MANAGER = None
+
+def set_lease_manager(manager):
+    global _LEASE_MANAGER
+    _LEASE_MANAGER = manager
+
+def get_lease_manager():
+    return _LEASE_MANAGER
+
+
+class PollerLeaseManager:
+    """
+    Shares printer polling between several server processes through leases
+    stored in Postgres.
+
+    Every heartbeat the worker:
+      - records itself in poller_workers,
+      - renews the leases it holds (dropping printers no longer auto_connect),
+      - releases leases above its fair share (flagged printers / live workers),
+      - claims unowned or expired leases up to its fair share.
+
+    A lease is only taken over once it has expired, so each printer is polled
+    by exactly one worker, and a dead worker's printers are picked up by the
+    survivors within lease_ttl + heartbeat_interval seconds.
+    """
+
+    def __init__(self, app, worker_id=None, lease_ttl=10, heartbeat_interval=3):
+        self.app = app
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.lease_ttl = lease_ttl
+        self.heartbeat_interval = heartbeat_interval
+        # printer_id -> ip_address for printers this worker polls.
+        self.owned = {}
+        self.lock = threading.Lock()
+        self.thread = None
+        self.running = False
+
+    # -- lease bookkeeping (must run inside an app context) -------------------
+
+    def _expiry(self):
+        return func.now() + timedelta(seconds=self.lease_ttl)
+
+    def _claim(self, printer_ids):
+        """Take over the given leases if they are free or expired; return the ids won."""
+        if not printer_ids:
+            return set()
+        stmt = pg_insert(PollerLease.__table__).values([
+            {"printer_id": pid, "owner": self.worker_id, "expires_at": self._expiry()}
+            for pid in printer_ids
+        ])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["printer_id"],
+            set_={"owner": stmt.excluded.owner, "expires_at": stmt.excluded.expires_at},
+            where=or_(
+                PollerLease.__table__.c.expires_at < func.now(),
+                PollerLease.__table__.c.owner == self.worker_id
+            )
+        ).returning(PollerLease.__table__.c.printer_id)
+        return {row[0] for row in db.session.execute(stmt)}
+
+    def _release(self, printer_ids):
+        if printer_ids:
+            PollerLease.query.filter(
+                PollerLease.owner == self.worker_id,
+                PollerLease.printer_id.in_(printer_ids)
+            ).delete(synchronize_session=False)
+
+    def heartbeat(self):
+        """One lease round; returns (acquired Printer instances, lost printer ids)."""
+        with self.app.app_context():
+            table = PollerWorker.__table__
+            stmt = pg_insert(table).values(worker_id=self.worker_id, heartbeat_at=func.now())
+            db.session.execute(stmt.on_conflict_do_update(
+                index_elements=["worker_id"], set_={"heartbeat_at": func.now()}
+            ))
+
+            # Drop leases for printers that were disconnected since the last round.
+            unflagged = db.session.query(Printer.printer_id).filter(Printer.auto_connect.is_(False))
+            PollerLease.query.filter(
+                PollerLease.owner == self.worker_id,
+                PollerLease.printer_id.in_(unflagged)
+            ).delete(synchronize_session=False)
+
+            leases = PollerLease.__table__
+            renewed = {
+                row[0] for row in db.session.execute(
+                    leases.update()
+                    .where(leases.c.owner == self.worker_id)
+                    .values(expires_at=self._expiry())
+                    .returning(leases.c.printer_id)
+                )
+            }
+
+            live_workers = PollerWorker.query.filter(
+                PollerWorker.heartbeat_at > func.now() - timedelta(seconds=self.lease_ttl)
+            ).count()
+            flagged = Printer.query.filter_by(auto_connect=True).count()
+            share = math.ceil(flagged / max(live_workers, 1))
+
+            if len(renewed) > share:
+                extra = sorted(renewed)[share:]
+                self._release(extra)
+                renewed -= set(extra)
+            elif len(renewed) < share:
+                candidates = [
+                    row[0] for row in db.session.query(Printer.printer_id)
+                    .outerjoin(PollerLease, PollerLease.printer_id == Printer.printer_id)
+                    .filter(Printer.auto_connect.is_(True))
+                    .filter(or_(PollerLease.printer_id.is_(None), PollerLease.expires_at < func.now()))
+                    .order_by(Printer.printer_id)
+                    .limit(share - len(renewed))
+                ]
+                renewed |= self._claim(candidates)
+
+            # Forget workers that have been silent for a long time.
+            PollerWorker.query.filter(
+                PollerWorker.heartbeat_at < func.now() - timedelta(seconds=self.lease_ttl * 10)
+            ).delete(synchronize_session=False)
+            db.session.commit()
+
+            with self.lock:
+                lost = set(self.owned) - renewed
+                new_ids = renewed - set(self.owned)
+            acquired = Printer.query.filter(Printer.printer_id.in_(new_ids)).all() if new_ids else []
+            db.session.expunge_all()
+        return acquired, lost
+
+    # -- local pollers ---------------------------------------------------------
+
+    def try_acquire(self, printer):
+        """
+        Claim a single printer immediately (used by /printers/connect) and start
+        its poller here if we won it. Must be called inside an app context.
+        """
+        won = printer.printer_id in self._claim([printer.printer_id])
+        db.session.commit()
+        if won:
+            from api.printers import _start_poller
+            _start_poller(printer)
+            with self.lock:
+                self.owned[printer.printer_id] = printer.ip_address
+        return won
+
+    def _reconcile(self, acquired, lost):
+        from api.printers import printerPollers, attach_printers
+
+        for printer_id in lost:
+            with self.lock:
+                ip = self.owned.pop(printer_id, None)
+            poller = printerPollers.pop(ip, None) if ip else None
+            if poller:
+                poller.stop()
+        if lost:
+            print(f"[Lease][{self.worker_id}] Released {len(lost)} printer(s).")
+
+        if acquired:
+            attached = set(attach_printers(self.app, acquired))
+            with self.lock:
+                for printer in acquired:
+                    if printer.printer_id in attached:
+                        self.owned[printer.printer_id] = printer.ip_address
+            unreachable = [p.printer_id for p in acquired if p.printer_id not in attached]
+            if unreachable:
+                # Hand unreachable printers back so the next round retries them.
+                with self.app.app_context():
+                    self._release(unreachable)
+                    db.session.commit()
+            print(f"[Lease][{self.worker_id}] Acquired {len(attached)} printer(s); "
+                  f"{len(unreachable)} unreachable.")
+
+    def run_loop(self):
+        while self.running:
+            try:
+                acquired, lost = self.heartbeat()
+                self._reconcile(acquired, lost)
+            except Exception as e:
+                print(f"[Lease][{self.worker_id}] Heartbeat error: {e}")
+                with self.app.app_context():
+                    db.session.rollback()
+            time.sleep(self.heartbeat_interval)
+
+    def start(self):
+        """Start the heartbeat loop in a daemon thread."""
+        self.running = True
+        self.thread = threading.Thread(target=self.run_loop, daemon=True)
+        self.thread.start()
+        print(f"[Lease][{self.worker_id}] Started (ttl={self.lease_ttl}s, heartbeat={self.heartbeat_interval}s).")
+
+    def stop(self):
+        """Stop local pollers and hand every lease back for immediate takeover."""
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=1)
+        with self.lock:
+            owned = list(self.owned)
+        self._reconcile([], owned)
+        with self.app.app_context():
+            PollerLease.query.filter_by(owner=self.worker_id).delete(synchronize_session=False)
+            PollerWorker.query.filter_by(worker_id=self.worker_id).delete(synchronize_session=False)
+            db.session.commit()
+        print(f"[Lease][{self.worker_id}] Stopped.")
@@ -0,0 +1,74 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from services import moonraker_rpc
+
+# Moonraker job-control methods; values in "params" name the request
+# fields each command needs.
+COMMANDS = {
+    "start": {"method": "printer.print.start", "params": ("filename",)},
+    "pause": {"method": "printer.print.pause", "params": ()},
+    "resume": {"method": "printer.print.resume", "params": ()},
+    "cancel": {"method": "printer.print.cancel", "params": ()},
+    "emergency_stop": {"method": "printer.emergency_stop", "params": ()},
+    "gcode": {"method": "printer.gcode.script", "params": ("script",)},
+}
+
+DEFAULT_TIMEOUT = 5
+MIN_TIMEOUT = 0.5
+MAX_TIMEOUT = 30
+MAX_CONCURRENCY = 32
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """One pooled HTTP session shared by all fan-outs, sized for MAX_CONCURRENCY."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=MAX_CONCURRENCY, pool_maxsize=MAX_CONCURRENCY)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+def send_command(target, command, params, timeout=DEFAULT_TIMEOUT):
+    """
+    Send one command to one printer. target is a dict with printer_id,
+    ip_address and port. Never raises; returns a per-printer result dict.
+    """
+    started = time.monotonic()
+    result = {"printer_id": target["printer_id"], "ip_address": target["ip_address"]}
+    try:
+        moonraker_rpc.call(target["ip_address"], target["port"], COMMANDS[command]["method"], params, timeout)
+        result["ok"] = True
+    except moonraker_rpc.MoonrakerError as e:
+        result["ok"] = False
+        result["error"] = str(e)
+        if e.code is not None:
+            result["code"] = e.code
+    result["elapsed_ms"] = round((time.monotonic() - started) * 1000, 1)
+    return result
+
+
+def fan_out(targets, command, params=None, timeout=DEFAULT_TIMEOUT, max_workers=MAX_CONCURRENCY):
+    """
+    Dispatch command to every target with at most max_workers requests in
+    flight, yielding each printer's result as soon as it completes. The whole
+    fan-out is bounded by roughly ceil(len / max_workers) * timeout.
+    """
+    if not targets:
+        return
+    params = params or {}
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(targets))) as pool:
+        futures = [pool.submit(send_command, t, command, params, timeout) for t in targets]
+        for future in as_completed(futures):
+            yield future.result()
@@ -0,0 +1,186 @@
+"""
+Opt-in per-request instrumentation (REQUEST_PROFILING = "true").
+
+Every request is timed in four buckets: SQL statements (SQLAlchemy cursor
+events), outbound HTTP (requests.Session.send), JSON serialization (the
+app's JSON provider) and the total. The result goes into a Server-Timing
+header, X-SQL-Count, and a "[Profile]" log line. Only work done on the
+request's own thread is attributed. Fan-outs that run on pool threads show
+up in the total but not in the http bucket.
+
+Adding ?__profile=1 or the header "X-Profile: 1" also samples the request's
+stack every SAMPLE_INTERVAL seconds. The response is then the profile in
+folded-stack format ("frame;frame;frame count" per line), which
+flamegraph.pl, speedscope and inferno read directly.
+"""
+import sys
+import threading
+import time
+from collections import Counter
+
+SAMPLE_INTERVAL = 0.002
+PROFILE_QUERY_ARG = "__profile"
+PROFILE_HEADER = "X-Profile"
+
+_local = threading.local()
+
+
+def _current():
+    return getattr(_local, "stats", None)
+
+
+class RequestStats:
+    __slots__ = ("started", "sql_count", "sql_time", "http_count", "http_time", "json_time")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.http_count = 0
+        self.http_time = 0.0
+        self.json_time = 0.0
+
+    def server_timing(self, total):
+        return ", ".join([
+            f'sql;dur={self.sql_time * 1000:.2f};desc="{self.sql_count} statements"',
+            f'http;dur={self.http_time * 1000:.2f};desc="{self.http_count} calls"',
+            f"json;dur={self.json_time * 1000:.2f}",
+            f"total;dur={total * 1000:.2f}",
+        ])
+
+
+def _real_threading():
+    """OS-level thread primitives, even when eventlet has patched threading."""
+    try:
+        from eventlet import patcher
+        if patcher.is_monkey_patched("thread"):
+            return patcher.original("threading"), patcher.original("_thread").get_ident
+    except ImportError:
+        pass
+    import _thread
+    return threading, _thread.get_ident
+
+
+class StackSampler:
+    """
+    Samples one OS thread's stack from a real (non-green) thread. Under
+    eventlet, other greenlets share that OS thread, so a sample only counts
+    when the stack passes through marker, the frame that is running the
+    profiled request.
+    """
+
+    def __init__(self, marker, interval=SAMPLE_INTERVAL):
+        real_threading, get_ident = _real_threading()
+        self.thread_id = get_ident()
+        self.marker = marker
+        self.interval = interval
+        self.samples = Counter()
+        self.stopped = real_threading.Event()
+        self.thread = real_threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack, inside = [], False
+            while frame is not None:
+                if frame is self.marker:
+                    inside = True
+                    break
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if inside and stack and not self.stopped.is_set():
+                self.samples[";".join(reversed(stack))] += 1
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stopped.set()
+        self.thread.join()
+
+    def folded(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+
+def _profile_requested(request):
+    return request.args.get(PROFILE_QUERY_ARG) == "1" or request.headers.get(PROFILE_HEADER) == "1"
+
+
+def install(app, db):
+    """Hook SQL, outbound HTTP, JSON and request timing into app."""
+    from flask import request, Response
+    from flask.json.provider import DefaultJSONProvider
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    # The start time lives on the statement's execution context, which is
+    # discarded with it, so a statement that fails leaves nothing behind.
+    @event.listens_for(Engine, "before_cursor_execute")
+    def _sql_started(conn, cursor, statement, parameters, context, executemany):
+        if context is not None and _current() is not None:
+            context._profile_started = time.perf_counter()
+
+    @event.listens_for(Engine, "after_cursor_execute")
+    def _sql_finished(conn, cursor, statement, parameters, context, executemany):
+        stats = _current()
+        started = getattr(context, "_profile_started", None)
+        if stats is not None and started is not None:
+            stats.sql_count += 1
+            stats.sql_time += time.perf_counter() - started
+
+    import requests
+    original_send = requests.Session.send
+    if not getattr(original_send, "_profiled", False):
+        def send(session, req, **kwargs):
+            stats = _current()
+            if stats is None:
+                return original_send(session, req, **kwargs)
+            started = time.perf_counter()
+            try:
+                return original_send(session, req, **kwargs)
+            finally:
+                stats.http_count += 1
+                stats.http_time += time.perf_counter() - started
+        send._profiled = True
+        requests.Session.send = send
+
+    class TimedJSONProvider(DefaultJSONProvider):
+        def dumps(self, obj, **kwargs):
+            stats = _current()
+            if stats is None:
+                return super().dumps(obj, **kwargs)
+            started = time.perf_counter()
+            try:
+                return super().dumps(obj, **kwargs)
+            finally:
+                stats.json_time += time.perf_counter() - started
+
+    app.json = TimedJSONProvider(app)
+
+    full_dispatch_request = app.full_dispatch_request
+
+    def profiled_dispatch():
+        stats = _local.stats = RequestStats()
+        try:
+            if not _profile_requested(request):
+                response = full_dispatch_request()
+            else:
+                with StackSampler(sys._getframe()) as sampler:
+                    full_dispatch_request()
+                response = Response(sampler.folded(), mimetype="text/plain")
+                response.headers["X-Profile-Samples"] = str(sum(sampler.samples.values()))
+            total = time.perf_counter() - stats.started
+            response.headers["Server-Timing"] = stats.server_timing(total)
+            response.headers["X-SQL-Count"] = str(stats.sql_count)
+            print(
+                f"[Profile] {request.method} {request.path} {response.status_code} "
+                f"{total * 1000:.1f}ms sql={stats.sql_count}/{stats.sql_time * 1000:.1f}ms "
+                f"http={stats.http_count}/{stats.http_time * 1000:.1f}ms json={stats.json_time * 1000:.1f}ms"
+            )
+            return response
+        finally:
+            _local.stats = None
+
+    app.full_dispatch_request = profiled_dispatch
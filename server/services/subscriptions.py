@@ -0,0 +1,181 @@
+import json
+import threading
+import time
+
+from extensions import PreEncodedJSON
+
+# Frame rate limits a client may ask for (frames per second).
+DEFAULT_FPS = 2.0
+MIN_FPS = 0.2
+MAX_FPS = 30.0
+ALL_PRINTERS = "*"
+
+
+def parse_fields(fields):
+    """
+    ["print_stats.state", "extruder", ...] -> {"print_stats": {"state"}, "extruder": None}.
+    None means the whole object. An empty/missing list keeps everything.
+    """
+    if not fields:
+        return None
+    spec = {}
+    for field in fields:
+        obj, _, key = str(field).partition(".")
+        if not key:
+            spec[obj] = None
+        elif obj not in spec or spec[obj] is not None:
+            spec.setdefault(obj, set()).add(key)
+    return spec
+
+
+def filter_status(status, spec):
+    """Project a Moonraker status dict onto a parse_fields() spec."""
+    if spec is None:
+        return status
+    out = {}
+    for obj, keys in spec.items():
+        values = status.get(obj)
+        if values is None:
+            continue
+        if keys is None or not isinstance(values, dict):
+            out[obj] = values
+        else:
+            picked = {k: values[k] for k in keys if k in values}
+            if picked:
+                out[obj] = picked
+    return out
+
+
+def _status_of(payload):
+    if isinstance(payload, str):
+        try:
+            payload = json.loads(payload)
+        except ValueError:
+            return None
+    try:
+        return payload["result"]["status"]
+    except (KeyError, TypeError):
+        return None
+
+
+def _merge_frames(old, new):
+    merged = json.loads(old)
+    update = json.loads(new)
+    merged["t"] = update["t"]
+    merged["printers"].update(update["printers"])
+    return PreEncodedJSON(json.dumps(merged))
+
+
+class Subscription:
+    __slots__ = ("sid", "printers", "spec", "fields_key", "interval", "next_at", "seen")
+
+    def __init__(self, sid, printers, fields, max_fps):
+        self.sid = sid
+        self.printers = printers            # set of IPs, or ALL_PRINTERS
+        self.spec = parse_fields(fields)
+        self.fields_key = tuple(sorted(fields)) if fields else None
+        self.interval = 1.0 / max_fps
+        self.next_at = 0.0
+        self.seen = {}                      # ip -> version last sent
+
+    def wants(self, ip):
+        return self.printers == ALL_PRINTERS or ip in self.printers
+
+
+class SubscriptionHub:
+    """
+    Fan-in of printer telemetry to Socket.IO clients that subscribed to
+    many printers over one connection.
+
+    publish() only stores the latest payload per printer and bumps its
+    version. A single flush thread wakes at the earliest client deadline and,
+    for each client that is due, sends one "printers_update" frame holding
+    every subscribed printer that changed since that client's last frame,
+    projected onto the client's fields, through the latest-wins outbox. Raw
+    websocket payloads are decoded at most once per flush, and only when
+    somebody subscribed to that printer.
+    """
+
+    def __init__(self):
+        self.lock = threading.Condition()
+        self.clients = {}      # sid -> Subscription
+        self.latest = {}       # ip -> payload (dict or raw JSON text)
+        self.versions = {}     # ip -> int
+        self.thread = None
+
+    def publish(self, printer_ip, payload):
+        if not self.clients:
+            return
+        with self.lock:
+            self.latest[printer_ip] = payload
+            self.versions[printer_ip] = self.versions.get(printer_ip, 0) + 1
+
+    def subscribe(self, sid, printers=ALL_PRINTERS, fields=None, max_fps=DEFAULT_FPS):
+        if printers != ALL_PRINTERS:
+            printers = set(printers)
+        max_fps = max(MIN_FPS, min(float(max_fps), MAX_FPS))
+        from services.outbox import outbox
+        outbox.register(sid)
+        with self.lock:
+            self.clients[sid] = Subscription(sid, printers, fields, max_fps)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run_loop, daemon=True)
+                self.thread.start()
+            self.lock.notify()
+        return {"printers": printers if printers == ALL_PRINTERS else sorted(printers),
+                "fields": fields or None, "max_fps": max_fps}
+
+    def unsubscribe(self, sid):
+        with self.lock:
+            self.clients.pop(sid, None)
+
+    def _collect(self, now):
+        """Frames due now as [(sid, {ip: status})], decoded/filtered once per (ip, fields)."""
+        with self.lock:
+            due = [c for c in self.clients.values() if c.next_at <= now]
+            latest = dict(self.latest)
+            versions = dict(self.versions)
+            if not self.clients:
+                self.latest.clear()
+                self.versions.clear()
+
+        decoded, projected, frames = {}, {}, []
+        for client in due:
+            client.next_at = now + client.interval
+            changed = {}
+            for ip, version in versions.items():
+                if not client.wants(ip) or client.seen.get(ip) == version:
+                    continue
+                client.seen[ip] = version
+                key = (ip, client.fields_key)
+                if key not in projected:
+                    if ip not in decoded:
+                        decoded[ip] = _status_of(latest[ip])
+                    status = decoded[ip]
+                    projected[key] = filter_status(status, client.spec) if status is not None else None
+                if projected[key]:
+                    changed[ip] = projected[key]
+            if changed:
+                frames.append((client.sid, changed))
+        return frames
+
+    def run_loop(self):
+        from services.outbox import outbox
+
+        while True:
+            now = time.monotonic()
+            for sid, printers in self._collect(now):
+                frame = PreEncodedJSON(json.dumps({"t": time.time(), "printers": printers}))
+                # A frame still held for a slow client is merged, not replaced,
+                # so printers that only changed in the older frame are kept.
+                outbox.push(sid, "printers_update", "printers_update", frame, len(frame),
+                            merge=_merge_frames)
+            with self.lock:
+                # With no clients, sleep until the next subscribe().
+                wait = None
+                if self.clients:
+                    wait = max(0.0, min(c.next_at for c in self.clients.values()) - time.monotonic())
+                self.lock.wait(timeout=wait)
+
+
+hub = SubscriptionHub()
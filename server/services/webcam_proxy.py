@@ -0,0 +1,272 @@
+import io
+import threading
+import time
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional; frames are relayed unscaled without it.
+    Image = None
+
+# JPEG start/end-of-image markers used to cut frames out of an MJPEG stream.
+SOI = b"\xff\xd8"
+EOI = b"\xff\xd9"
+BOUNDARY = "frame"
+READ_CHUNK = 64 * 1024
+# Drop the upstream buffer if no complete frame shows up within this many bytes.
+MAX_BUFFER = 8 * 1024 * 1024
+RECONNECT_DELAY = 2
+JPEG_QUALITY = 80
+
+
+def webcam_url(ip_address, webcam_address, webcam_port, action="stream"):
+    """
+    Build the upstream camera URL from the Printer webcam fields.
+    webcam_address may be a full URL, a path on the printer host ("/"), or a
+    separate host name. An mjpg-streamer ?action= already in the address is
+    replaced by action, and paths without a query get one.
+    """
+    from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+    address = (webcam_address or "/").strip()
+    full = address.startswith(("http://", "https://"))
+    if full:
+        url = address
+    elif address.startswith("/"):
+        url = f"http://{ip_address}:{webcam_port}{address}"
+    else:
+        url = f"http://{address}:{webcam_port}/"
+
+    parts = urlsplit(url)
+    query = parse_qsl(parts.query, keep_blank_values=True)
+    if any(key == "action" for key, _ in query):
+        query = [(key, action if key == "action" else value) for key, value in query]
+    elif not query and not full:
+        query = [("action", action)]
+    else:
+        return url
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+_warned_no_pillow = False
+
+def _warn_no_pillow():
+    global _warned_no_pillow
+    if not _warned_no_pillow:
+        _warned_no_pillow = True
+        print("[Webcam] Pillow is not installed; camera frames are relayed unscaled.")
+
+
+def scaled_size(width, height, factor=None, resolution=None):
+    """
+    Output size for a width x height frame, or None to keep it as is.
+
+    The frame is first fitted within resolution (the printer's
+    camera_resolution_width/height) when one is configured. camera_scaling_factor
+    then shrinks it further: a factor above 1 divides the size (printers.csv
+    uses 1.3), one below 1 multiplies it. 1 or unset leaves it. Frames are
+    never enlarged.
+    """
+    scale = 1.0
+    if resolution and all(resolution):
+        scale = min(scale, resolution[0] / width, resolution[1] / height)
+    if factor and factor > 0:
+        scale *= factor if factor < 1 else 1 / factor
+    if scale >= 1:
+        return None
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
+
+def scale_jpeg(frame, factor=None, resolution=None, quality=JPEG_QUALITY):
+    """Downscale a JPEG as described in scaled_size(). Returns the frame unchanged if it can't."""
+    if (not factor or factor == 1) and not (resolution and all(resolution)):
+        return frame
+    if Image is None:
+        _warn_no_pillow()
+        return frame
+    try:
+        image = Image.open(io.BytesIO(frame))
+        size = scaled_size(image.width, image.height, factor, resolution)
+        if size is None:
+            return frame
+        # draft() lets libjpeg decode at reduced size, which is most of the saving.
+        image.draft("RGB", size)
+        image = image.convert("RGB").resize(size)
+        out = io.BytesIO()
+        image.save(out, format="JPEG", quality=quality)
+        return out.getvalue()
+    except Exception:
+        return frame
+
+
+def iter_jpeg_frames(chunks):
+    """Cut complete JPEG images out of an MJPEG byte stream."""
+    buffer = b""
+    for chunk in chunks:
+        if not chunk:
+            continue
+        buffer += chunk
+        while True:
+            start = buffer.find(SOI)
+            if start < 0:
+                buffer = buffer[-1:]
+                break
+            end = buffer.find(EOI, start + 2)
+            if end < 0:
+                buffer = buffer[start:]
+                break
+            yield buffer[start:end + 2]
+            buffer = buffer[end + 2:]
+        if len(buffer) > MAX_BUFFER:
+            buffer = b""
+
+
+class CameraStream:
+    """
+    One upstream MJPEG connection to a printer camera, shared by all viewers.
+
+    The reader thread keeps only the newest (already scaled) frame. Viewers
+    wait for a frame newer than the last one they sent, so a slow viewer
+    skips frames instead of queueing them and never slows anyone else down.
+    The upstream is closed when the last viewer leaves.
+    """
+
+    def __init__(self, key, url, scaling_factor=None, resolution=None, on_idle=None):
+        self.key = key
+        self.url = url
+        self.scaling_factor = scaling_factor
+        self.resolution = resolution
+        self.on_idle = on_idle
+        self.frame = None
+        self.frame_id = 0
+        self.viewers = 0
+        self.running = False
+        # Bumped on every (re)open so a reader from a previous open exits.
+        self.generation = 0
+        self.thread = None
+        self.response = None
+        self.condition = threading.Condition()
+
+    def add_viewer(self):
+        with self.condition:
+            self.viewers += 1
+            if not self.running:
+                self.running = True
+                self.generation += 1
+                self.thread = threading.Thread(target=self.read_loop, args=(self.generation,), daemon=True)
+                self.thread.start()
+                print(f"[Webcam][{self.key}] Opened upstream {self.url}")
+
+    def remove_viewer(self):
+        with self.condition:
+            self.viewers -= 1
+            idle = self.viewers <= 0
+            if idle:
+                self.running = False
+                response = self.response
+                self.condition.notify_all()
+        if idle:
+            if response is not None:
+                try:
+                    response.close()
+                except Exception:
+                    pass
+            print(f"[Webcam][{self.key}] Last viewer left; closed upstream.")
+            if self.on_idle:
+                self.on_idle(self)
+
+    def _active(self, generation):
+        return self.running and self.generation == generation
+
+    def read_loop(self, generation):
+        import requests
+
+        while self._active(generation):
+            try:
+                with requests.get(self.url, stream=True, timeout=(3, 10)) as response:
+                    response.raise_for_status()
+                    self.response = response
+                    for frame in iter_jpeg_frames(response.iter_content(READ_CHUNK)):
+                        if not self._active(generation):
+                            break
+                        # Scale once here, not once per viewer.
+                        frame = scale_jpeg(frame, self.scaling_factor, self.resolution)
+                        with self.condition:
+                            self.frame = frame
+                            self.frame_id += 1
+                            self.condition.notify_all()
+            except Exception as e:
+                if self._active(generation):
+                    print(f"[Webcam][{self.key}] Upstream error: {e}")
+            finally:
+                self.response = None
+            if self._active(generation):
+                time.sleep(RECONNECT_DELAY)
+
+    def wait_frame(self, last_id, timeout=10):
+        """Block until a frame newer than last_id exists; returns (id, frame) or (last_id, None)."""
+        with self.condition:
+            self.condition.wait_for(lambda: self.frame_id > last_id or not self.running, timeout)
+            if self.frame_id > last_id:
+                return self.frame_id, self.frame
+            return last_id, None
+
+    def parts(self):
+        """Generator yielding multipart MJPEG parts for one (already added) viewer."""
+        last_id = 0
+        while self.running:
+            last_id, frame = self.wait_frame(last_id)
+            if frame is None:
+                continue
+            yield (
+                f"--{BOUNDARY}\r\nContent-Type: image/jpeg\r\n"
+                f"Content-Length: {len(frame)}\r\n\r\n"
+            ).encode() + frame + b"\r\n"
+
+
+class WebcamProxy:
+    """Registry of shared CameraStreams keyed by printer IP."""
+
+    def __init__(self):
+        self.streams = {}
+        self.lock = threading.Lock()
+
+    def mjpeg(self, printer):
+        """
+        Generator yielding multipart MJPEG parts of printer's camera for one
+        viewer. The printer's fields are read here, so the generator needs no
+        app context and printer may be discarded once this returns.
+        """
+        return self._view(
+            printer.ip_address,
+            webcam_url(printer.ip_address, printer.webcam_address, printer.webcam_port),
+            printer.camera_scaling_factor,
+            (printer.camera_resolution_width, printer.camera_resolution_height)
+        )
+
+    def _view(self, key, url, scaling_factor, resolution):
+        # Lookup and viewer registration share one lock hold, so a stream
+        # going idle meanwhile can't be discarded out from under this viewer.
+        # Nothing is registered until the response is actually iterated.
+        with self.lock:
+            stream = self.streams.get(key)
+            if stream is None:
+                stream = CameraStream(key, url, scaling_factor, resolution, on_idle=self._discard)
+                self.streams[key] = stream
+            stream.add_viewer()
+        try:
+            yield from stream.parts()
+        finally:
+            stream.remove_viewer()
+
+    def _discard(self, stream):
+        with self.lock:
+            if self.streams.get(stream.key) is stream and stream.viewers <= 0:
+                del self.streams[stream.key]
+
+    def stats(self):
+        with self.lock:
+            return {key: {"viewers": s.viewers, "frames": s.frame_id} for key, s in self.streams.items()}
+
+
+# Shared instance used by the API.
+webcam_proxy = WebcamProxy()
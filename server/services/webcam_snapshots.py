@@ -0,0 +1,196 @@
+import hashlib
+import io
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from services.webcam_proxy import Image, JPEG_QUALITY, iter_jpeg_frames, webcam_url
+
+# Seconds between snapshots, by whether the printer is printing (per the
+# print_stats.state the consumption tracker last saw in its telemetry).
+PRINTING_INTERVAL = 5
+IDLE_INTERVAL = 30
+# How often the printer list is re-read from the database.
+REFRESH_INTERVAL = 15
+TICK = 1
+MAX_CONCURRENT = 8
+SNAPSHOT_TIMEOUT = 3
+# A camera that answers with a stream instead of a still is read only up to
+# its first JPEG frame, and never past this many bytes.
+MAX_SNAPSHOT_BYTES = 4 * 1024 * 1024
+SNAPSHOT_CHUNK = 8 * 1024
+THUMBNAIL_WIDTH = 320
+CACHE_TTL = 120
+CACHE_MAX_ENTRIES = 500
+
+
+def _capped(chunks, limit):
+    """Pass chunks through until more than limit bytes have been read."""
+    total = 0
+    for chunk in chunks:
+        total += len(chunk)
+        if total > limit:
+            raise ValueError(f"snapshot exceeds {limit} bytes")
+        yield chunk
+
+
+def make_thumbnail(frame, max_width=THUMBNAIL_WIDTH, quality=JPEG_QUALITY):
+    """Shrink a JPEG to at most max_width pixels wide. Returns it unchanged if it can't."""
+    if Image is None:
+        return frame
+    try:
+        image = Image.open(io.BytesIO(frame))
+        if image.width <= max_width:
+            return frame
+        size = (max_width, max(1, image.height * max_width // image.width))
+        image.draft("RGB", size)
+        image = image.convert("RGB").resize(size)
+        out = io.BytesIO()
+        image.save(out, format="JPEG", quality=quality)
+        return out.getvalue()
+    except Exception:
+        return frame
+
+
+class SnapshotCache:
+    """Bounded LRU of small JPEGs keyed by printer IP, with a TTL per entry."""
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def put(self, key, image):
+        entry = {
+            "image": image,
+            "etag": hashlib.sha1(image).hexdigest()[:16],
+            "captured_at": time.time(),
+        }
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return entry
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if time.time() - entry["captured_at"] > self.ttl:
+                del self.entries[key]
+                return None
+            return entry
+
+    def snapshot(self):
+        """All fresh entries as {key: entry}, dropping expired ones."""
+        now = time.time()
+        with self.lock:
+            for key in [k for k, e in self.entries.items() if now - e["captured_at"] > self.ttl]:
+                del self.entries[key]
+            return dict(self.entries)
+
+
+class SnapshotSampler:
+    """
+    Background thread that grabs a still from every printer camera on a
+    bounded schedule (PRINTING_INTERVAL while printing, IDLE_INTERVAL
+    otherwise) with at most MAX_CONCURRENT requests in flight, and keeps a
+    thumbnail of each in the cache.
+    """
+
+    def __init__(self, app, cache=None):
+        self.app = app
+        self.cache = cache or SnapshotCache()
+        self.printers = []
+        self.next_due = {}
+        self.in_flight = set()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.running = False
+
+    def refresh_printers(self):
+        from models.printers import Printer
+
+        with self.app.app_context():
+            rows = Printer.query.with_entities(
+                Printer.ip_address, Printer.webcam_address, Printer.webcam_port
+            ).all()
+        self.printers = [
+            (ip, webcam_url(ip, address, port, action="snapshot"))
+            for ip, address, port in rows
+        ]
+
+    def capture(self, ip, url):
+        import requests
+
+        try:
+            with requests.get(url, stream=True, timeout=SNAPSHOT_TIMEOUT) as response:
+                response.raise_for_status()
+                chunks = _capped(response.iter_content(SNAPSHOT_CHUNK), MAX_SNAPSHOT_BYTES)
+                if response.headers.get("Content-Type", "").startswith("multipart/"):
+                    frame = next(iter_jpeg_frames(chunks), None)
+                else:
+                    frame = b"".join(chunks) or None
+            if frame is not None:
+                self.cache.put(ip, make_thumbnail(frame))
+        except Exception:
+            pass
+        finally:
+            with self.lock:
+                self.in_flight.discard(ip)
+
+    def run_loop(self):
+        from services.consumption import tracker
+
+        last_refresh = 0
+        with ThreadPoolExecutor(max_workers=MAX_CONCURRENT) as pool:
+            while self.running:
+                now = time.time()
+                if now - last_refresh >= REFRESH_INTERVAL:
+                    try:
+                        self.refresh_printers()
+                    except Exception as e:
+                        print(f"[Snapshots] Error loading printers: {e}")
+                    last_refresh = now
+
+                for ip, url in self.printers:
+                    with self.lock:
+                        if ip in self.in_flight or self.next_due.get(ip, 0) > now:
+                            continue
+                        # Never queue more than the pool can run; the rest wait for the next tick.
+                        if len(self.in_flight) >= MAX_CONCURRENT:
+                            break
+                        self.in_flight.add(ip)
+                    printing = tracker.print_state(ip) == "printing"
+                    interval = PRINTING_INTERVAL if printing else IDLE_INTERVAL
+                    self.next_due[ip] = now + interval
+                    pool.submit(self.capture, ip, url)
+                time.sleep(TICK)
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.run_loop, daemon=True)
+        self.thread.start()
+        print("[Snapshots] Sampler started.")
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=1)
+
+
+_SAMPLER = None
+_SAMPLER_LOCK = threading.Lock()
+
+def get_snapshot_sampler(app):
+    """Return the process-wide sampler, starting it on first use."""
+    global _SAMPLER
+    with _SAMPLER_LOCK:
+        if _SAMPLER is None:
+            _SAMPLER = SnapshotSampler(app)
+            _SAMPLER.start()
+        return _SAMPLER
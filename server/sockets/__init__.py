@@ -1,2 +1,9 @@
 # sockets/__init__.py
-from sockets.moonraker_socket import MoonrakerSocket
+# MoonrakerSocket pulls in websocket-client and the models; load it on first
+# access so importing sockets.utils stays cheap.
+def __getattr__(name):
+    if name == "MoonrakerSocket":
+        from sockets.moonraker_socket import MoonrakerSocket
+        return MoonrakerSocket
+    raise AttributeError(f"module 'sockets' has no attribute {name!r}")
+
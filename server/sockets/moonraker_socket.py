@@ -2,12 +2,51 @@ import threading
 import time
 import json
 import random
+import re
 import websocket
 from flask import current_app
 from models import db
 from models.printers import Printer
-from extensions import socketio
+from extensions import PreEncodedJSON
 from sockets.utils import get_app_instance  # import the getter
+from services.subscriptions import hub
+from services.outbox import outbox
+from services import metrics
+
+# JSON-RPC notifications carry "method" right after "jsonrpc", so only the
+# head of the message is searched for it.
+_METHOD_RE = re.compile(r'"method"\s*:\s*"([^"]+)"')
+_METHOD_SCAN_LIMIT = 128
+# Moonraker emits print_stats.state before the nested "info" object.
+_PRINT_STATE_RE = re.compile(r'"print_stats"\s*:\s*\{[^{}]*?"state"\s*:\s*"([^"]*)"')
+_PRINT_STATS_RE = re.compile(r'"print_stats"\s*:\s*(?=\{)')
+_decoder = json.JSONDecoder()
+
+
+def scan_routing_fields(message):
+    """
+    Extract (method, print_stats.state) from a raw Moonraker message without
+    decoding it. When the fast scan finds no state (a partial
+    notify_status_update usually has none), only the print_stats object is
+    decoded, never the whole message. Either value may be None.
+    """
+    match = _METHOD_RE.search(message, 0, _METHOD_SCAN_LIMIT)
+    method = match.group(1) if match else None
+
+    state = None
+    if '"print_stats"' in message:
+        match = _PRINT_STATE_RE.search(message)
+        if match:
+            state = match.group(1)
+        else:
+            match = _PRINT_STATS_RE.search(message)
+            if match:
+                try:
+                    state = _decoder.raw_decode(message, match.end())[0].get("state")
+                except ValueError:
+                    state = None
+    return method, state
+
 
 class MoonrakerSocket:
     PAYLOAD_TEMPLATE = {
@@ -34,51 +73,68 @@ class MoonrakerSocket:
         self.ws = None
         self.thread = None
         self.connected = False
+        # Last print_stats.state seen, so the DB is only touched on transitions.
+        self.last_state = None
+        self.opened = False
 
     def on_message(self, ws, message):
-        try:
-            data = json.loads(message)
-        except Exception as e:
-            print(f"[WS][{self.printer_ip}] Error parsing message: {e}")
+        if isinstance(message, bytes):
+            message = message.decode("utf-8", errors="replace")
+
+        # Only the routing fields are needed here, so scan for them instead of
+        # decoding the whole status tree on every message.
+        method, new_state = scan_routing_fields(message)
+
+        if method == "notify_history_changed":
+            from services import job_history
+            try:
+                job_history.on_notification(self.printer_ip, method, json.loads(message).get("params"))
+            except ValueError:
+                pass
             return
 
         # Filter messages if needed; only process messages with method "printer.objects.query".
-        method = data.get("method")
         if method and method != "printer.objects.query":
-            print(f"[WS][{self.printer_ip}] Filtering out method: {method}")
             return
 
-        # Check if the response contains printer status info.
-        if "result" in data and "status" in data["result"]:
-            status_obj = data["result"]["status"]
-            if "print_stats" in status_obj and status_obj["print_stats"].get("state"):
-                new_state = status_obj["print_stats"]["state"]
-                print(f"[WS][{self.printer_ip}] Detected print state: {new_state}")
-                # Update printer status in DB using the global app instance.
-                threading.Thread(
-                    target=self.update_printer_status,
-                    args=(new_state,),
-                    daemon=True
-                ).start()
-            if "display_status" in status_obj:
-                display_status = status_obj["display_status"]
-                print(f"[WS][{self.printer_ip}] Display status: {display_status}")
-                    
-        # Emit update via Socket.IO to clients in the room for this printer.
+        if new_state and new_state != self.last_state:
+            self.last_state = new_state
+            print(f"[WS][{self.printer_ip}] Detected print state: {new_state}")
+            from services.dispatcher import get_dispatcher
+            job_dispatcher = get_dispatcher()
+            if job_dispatcher is not None:
+                job_dispatcher.on_state(self.printer_ip, new_state)
+            # Update printer status in DB using the global app instance.
+            threading.Thread(
+                target=self.update_printer_status,
+                args=(new_state,),
+                daemon=True
+            ).start()
+
+        # Relay the original text; it is spliced into each Socket.IO packet
+        # as-is, and slow clients only keep the newest one.
         try:
-            socketio.emit("printer_update", data, room=self.printer_ip)
+            outbox.publish(self.printer_ip, "printer_update", PreEncodedJSON(message))
         except Exception as e:
             print(f"[WS][{self.printer_ip}] Error emitting Socket.IO event: {e}")
+        # Multi-printer subscribers get the raw text; it is only decoded if
+        # somebody is subscribed to this printer.
+        hub.publish(self.printer_ip, message)
 
     def on_error(self, ws, error):
         print(f"[WS][{self.printer_ip}] Error: {error}")
 
     def on_close(self, ws, close_status_code, close_msg):
         print(f"[WS][{self.printer_ip}] Connection closed: code={close_status_code}, msg={close_msg}")
+        if self.opened:
+            self.opened = False
+            metrics.MOONRAKER_SOCKETS.dec()
         self.connected = False
 
     def on_open(self, ws):
         print(f"[WS][{self.printer_ip}] Connection opened. Sending initial polling query.")
+        self.opened = True
+        metrics.MOONRAKER_SOCKETS.inc()
         payload = self.PAYLOAD_TEMPLATE.copy()
         payload["id"] = 1
         ws.send(json.dumps(payload))
@@ -92,7 +148,6 @@ class MoonrakerSocket:
                 payload = self.PAYLOAD_TEMPLATE.copy()
                 payload["id"] = counter
                 counter += 1
-                print(f"[WS][{self.printer_ip}] Sending polling payload: {json.dumps(payload)}")
                 self.ws.send(json.dumps(payload))
             except Exception as e:
                 print(f"[WS][{self.printer_ip}] Polling error: {e}")
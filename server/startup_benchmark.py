@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+"""
+Startup-time benchmark.
+
+Runs each target in a fresh interpreter with `python -X importtime` and
+reports wall time plus the slowest modules by cumulative import time. A
+target is a module to import, or a script invocation ("update_db.py --help").
+
+Usage:
+    python startup_benchmark.py                      # default targets
+    python startup_benchmark.py -t api -t http_poller --top 15
+    python startup_benchmark.py -t "server.py --init base --help"
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+# Module imports and script runs that correspond to the server's entry points.
+# The --help runs go through a script's real startup and stop at argparse,
+# before any database work.
+DEFAULT_TARGETS = [
+    "config",                # argument / config parsing only
+    "models",                # what `-i base`, `migrate` and update_db.py need
+    "server.py --migrate --help",  # maintenance path: no eventlet, no blueprints
+    "update_db.py --help",   # standalone migration script
+    "server",                # server module as imported: serve path (eventlet patched)
+    "extensions",            # Flask-SocketIO
+    "api",                   # all blueprints
+    "http_poller",           # pollers and the HTTP client stack
+    "sockets.moonraker_socket",
+]
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Measure import time of server modules.")
+    parser.add_argument('-t', '--target', action='append', help='Module to import (repeatable)')
+    parser.add_argument('--top', type=int, default=10, help='Number of slowest modules to list per target')
+    parser.add_argument('--runs', type=int, default=3, help='Runs per target; the fastest is reported')
+    return parser.parse_args()
+
+def parse_importtime(stderr):
+    """Return [(module, self_us, cumulative_us)] from -X importtime output."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        try:
+            _, rest = line.split(":", 1)
+            self_us, cumulative_us, name = rest.split("|", 2)
+            rows.append((name.strip(), int(self_us), int(cumulative_us)))
+        except ValueError:
+            continue
+    return rows
+
+def command_for(target):
+    """Interpreter arguments that run a script target or import a module target."""
+    argv = target.split()
+    if argv[0].endswith(".py"):
+        return argv
+    return ["-c", f"import {target}"]
+
+def measure(target, runs):
+    """Run target in a fresh interpreter; return (wall_seconds, rows, error)."""
+    best = None
+    here = os.path.dirname(os.path.abspath(__file__))
+    for _ in range(runs):
+        started = time.perf_counter()
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime"] + command_for(target),
+            cwd=here, capture_output=True, text=True
+        )
+        elapsed = time.perf_counter() - started
+        if proc.returncode != 0:
+            last = proc.stderr.strip().splitlines()[-1:] or ["unknown error"]
+            return elapsed, [], last[0]
+        if best is None or elapsed < best[0]:
+            best = (elapsed, parse_importtime(proc.stderr))
+    return best[0], best[1], None
+
+def main():
+    args = parse_arguments()
+    targets = args.target or DEFAULT_TARGETS
+
+    print(f"{'target':<28}{'wall [ms]':>12}{'imports [ms]':>14}{'modules':>10}")
+    details = []
+    for target in targets:
+        elapsed, rows, error = measure(target, args.runs)
+        if error:
+            print(f"{target:<28}{'-':>12}{'-':>14}{'-':>10}  ({error})")
+            continue
+        total_us = sum(r[1] for r in rows)
+        print(f"{target:<28}{elapsed * 1000:>12.1f}{total_us / 1000:>14.1f}{len(rows):>10}")
+        details.append((target, rows))
+
+    for target, rows in details:
+        print(f"\nSlowest imports for {target} (cumulative):")
+        # Only top-level packages, so nested submodules don't repeat their parent's cost.
+        top_level = [r for r in rows if "." not in r[0]]
+        for name, self_us, cumulative_us in sorted(top_level, key=lambda r: r[2], reverse=True)[:args.top]:
+            print(f"  {cumulative_us / 1000:>9.1f} ms  {name}  (self {self_us / 1000:.1f} ms)")
+
+if __name__ == '__main__':
+    main()
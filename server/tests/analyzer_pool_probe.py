@@ -0,0 +1,41 @@
+"""
+Run by test_gcode_analyzer.py in a fresh interpreter, because
+eventlet.monkey_patch() is process-wide.
+
+    python analyzer_pool_probe.py <gcode file> [<gcode file> ...]
+
+Monkey patches like server.py, then runs analyze_many() over the files (so
+the process pool is used) while a green thread keeps ticking. Prints a JSON
+report: the results, and how many ticks the green thread got in meanwhile.
+"""
+import json
+import os
+import sys
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+
+import eventlet  # noqa: E402
+
+eventlet.monkey_patch(psycopg=False)
+
+from services.gcode_analyzer import analyze_many  # noqa: E402
+
+
+def main(paths):
+    ticks = []
+
+    def ticker():
+        while True:
+            ticks.append(1)
+            eventlet.sleep(0.01)
+
+    thread = eventlet.spawn(ticker)
+    eventlet.sleep(0)
+    results = analyze_many(paths, max_workers=2)
+    thread.kill()
+    print(json.dumps({"results": results, "ticks": len(ticks)}))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
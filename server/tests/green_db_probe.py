@@ -0,0 +1,64 @@
+"""
+Run by test_green_db.py in a fresh interpreter, because eventlet.monkey_patch()
+and psycopg2's wait callback are process-wide.
+
+    python green_db_probe.py <config file> <sleep seconds>
+
+Builds the app the way server.py does, starts a pg_sleep query in one green
+thread and, while it runs, serves a request that needs no database and one
+that does. Prints a JSON report of the timings.
+"""
+import json
+import os
+import sys
+import time
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+os.chdir(SERVER_DIR)
+
+import server  # monkey patches, as when serving  # noqa: E402
+
+import eventlet  # noqa: E402
+from psycopg2 import extensions  # noqa: E402
+from sqlalchemy import event, text  # noqa: E402
+from models import db  # noqa: E402
+
+
+def main(config_file, sleep_seconds):
+    app = server.create_app(config_file)
+    report = {"callback_at_create": extensions.get_wait_callback() is not None}
+
+    with app.app_context():
+        engine = db.engine
+        report["connections_at_create"] = engine.pool.checkedin() + engine.pool.checkedout()
+        callbacks_at_connect = []
+        event.listen(engine, "connect",
+                     lambda *_: callbacks_at_connect.append(extensions.get_wait_callback() is not None))
+
+    def slow_query():
+        with app.app_context():
+            db.session.execute(text("SELECT pg_sleep(:s)"), {"s": sleep_seconds})
+            db.session.remove()
+
+    client = app.test_client()
+    started = time.monotonic()
+    slow = eventlet.spawn(slow_query)
+    eventlet.sleep(0.1)  # let the slow query reach the server
+
+    plain = client.get("/metrics")
+    report["plain_status"] = plain.status_code
+    report["plain_done_after"] = time.monotonic() - started
+
+    with_db = client.get("/products/")
+    report["db_status"] = with_db.status_code
+    report["db_done_after"] = time.monotonic() - started
+
+    slow.wait()
+    report["slow_done_after"] = time.monotonic() - started
+    report["callbacks_at_connect"] = callbacks_at_connect
+    print(json.dumps(report))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1], float(sys.argv[2]))
@@ -0,0 +1,111 @@
+"""ConsumptionTracker: consumption is charged exactly once, across failed flushes and restarts."""
+import pytest
+
+PRINTER_IP = "192.0.2.39"
+
+
+@pytest.fixture
+def printer(app):
+    from sqlalchemy import text
+    from models import db
+    from models.spool import Spool
+
+    printer_id = db.session.execute(text("""
+        INSERT INTO printers (ip_address, port, webcam_address, webcam_port, printer_name,
+                              printer_model, supported_materials, status, heated_chamber, auto_connect)
+        VALUES (:ip, 7125, '', 80, 'consumption', 'Voron 2.4', 'PLA', 'disconnected', false, false)
+        RETURNING printer_id
+    """), {"ip": PRINTER_IP}).scalar()
+    spool = Spool(material="PLA", printer_id=printer_id, consumed_length=0.0)
+    db.session.add(spool)
+    db.session.commit()
+    yield printer_id, spool.spool_id
+    db.session.execute(text("DELETE FROM printers WHERE printer_id = :id"), {"id": printer_id})
+    db.session.execute(text("DELETE FROM spools WHERE spool_id = :id"), {"id": spool.spool_id})
+    db.session.commit()
+
+
+def telemetry(state, used):
+    return {"result": {"status": {"print_stats": {"filename": "part.gcode", "state": state,
+                                                  "filament_used": used}}}}
+
+
+def stored(spool_id):
+    from models import db
+    from models.filament_usage import JobFilamentUsage
+    from models.spool import Spool
+
+    db.session.expire_all()
+    return (db.session.get(Spool, spool_id).consumed_length,
+            [(row.state, row.filament_used) for row in JobFilamentUsage.query.all()])
+
+
+def test_failed_commit_is_retried(app, printer, monkeypatch):
+    from models import db
+    from services.consumption import ConsumptionTracker
+
+    _, spool_id = printer
+    tracker = ConsumptionTracker()
+    tracker.observe(PRINTER_IP, telemetry("standby", 0.0))
+    tracker.observe(PRINTER_IP, telemetry("printing", 100.0))
+
+    def fail():
+        raise RuntimeError("connection lost")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(db.session, "commit", fail)
+        with pytest.raises(RuntimeError):
+            tracker.flush(app)
+
+    counters = tracker.printers[PRINTER_IP]
+    assert counters.unattributed == 100.0
+    assert counters.job.dirty and counters.job.usage_id is None
+    assert stored(spool_id) == (0.0, [])
+
+    tracker.flush(app)
+    assert stored(spool_id) == (100.0, [("printing", 100.0)])
+
+    # The committed row is the one later flushes update.
+    tracker.observe(PRINTER_IP, telemetry("printing", 150.0))
+    tracker.observe(PRINTER_IP, telemetry("complete", 150.0))
+    with monkeypatch.context() as patch:
+        patch.setattr(db.session, "commit", fail)
+        with pytest.raises(RuntimeError):
+            tracker.flush(app)
+    assert tracker.finished
+    tracker.flush(app)
+    assert stored(spool_id) == (150.0, [("complete", 150.0)])
+
+
+def test_restart_mid_print_continues_the_job(app, printer):
+    from services.consumption import ConsumptionTracker
+
+    _, spool_id = printer
+    before = ConsumptionTracker()
+    before.observe(PRINTER_IP, telemetry("standby", 0.0))
+    before.observe(PRINTER_IP, telemetry("printing", 1000.0))
+    before.flush(app)
+    assert stored(spool_id) == (1000.0, [("printing", 1000.0)])
+
+    # A new process (or the worker that took over the lease) sees the print
+    # already running: the 5000 mm so far are not charged a second time.
+    after = ConsumptionTracker()
+    after.observe(PRINTER_IP, telemetry("printing", 5000.0))
+    assert after.printers[PRINTER_IP].unattributed == 0.0
+    after.flush(app)
+    assert stored(spool_id) == (1000.0, [("printing", 5000.0)])
+
+    after.observe(PRINTER_IP, telemetry("printing", 5200.0))
+    after.observe(PRINTER_IP, telemetry("complete", 5200.0))
+    after.flush(app)
+    assert stored(spool_id) == (1200.0, [("complete", 5200.0)])
+
+
+def test_first_sample_without_state_is_a_baseline(app, printer):
+    from services.consumption import ConsumptionTracker
+
+    tracker = ConsumptionTracker()
+    # Websocket notifications only carry changed fields.
+    tracker.observe(PRINTER_IP, {"result": {"status": {"print_stats": {"filament_used": 750.0}}}})
+    tracker.observe(PRINTER_IP, {"result": {"status": {"print_stats": {"filament_used": 800.0}}}})
+    assert tracker.printers[PRINTER_IP].unattributed == 50.0
@@ -0,0 +1,127 @@
+"""JobDispatcher: claiming, starting and finishing scheduled prints."""
+from datetime import datetime, timedelta
+
+import pytest
+
+IP = "192.0.2.60"
+
+
+@pytest.fixture
+def dispatcher(app, monkeypatch):
+    """(dispatcher, add_print, sent, replies): send_command is stubbed, records its calls in
+    sent and answers with the next callable queued in replies (ok by default)."""
+    from sqlalchemy import text
+    from models import db
+    from models.scheduled_print import ScheduledPrint
+    from services import printer_commands
+    from services.dispatcher import JobDispatcher
+
+    printer_id = db.session.execute(text("""
+        INSERT INTO printers (ip_address, port, webcam_address, webcam_port, printer_name,
+                              printer_model, supported_materials, status, heated_chamber, auto_connect)
+        VALUES (:ip, 7125, '', 80, 'dispatch', 'Voron 2.4', 'PLA', 'standby', false, false)
+        RETURNING printer_id
+    """), {"ip": IP}).scalar()
+    gcode_id = db.session.execute(text("""
+        INSERT INTO gcodes (printer_id, gcode_name, estimated_print_time, material)
+        VALUES (:printer_id, 'dispatch.gcode', interval '1 hour', 'PLA') RETURNING gcode_id
+    """), {"printer_id": printer_id}).scalar()
+    db.session.commit()
+
+    def add_print():
+        row = ScheduledPrint(deadline=datetime(2030, 1, 1), gcode_id=gcode_id, assigned_printer_id=printer_id,
+                             scheduled_start_time=datetime.now() - timedelta(minutes=1), status="pending")
+        db.session.add(row)
+        db.session.commit()
+        return row.scheduled_id
+
+    d = JobDispatcher(app)
+    d.on_state(IP, "standby")
+    sent, replies = [], []
+
+    def send_command(target, command, params):
+        sent.append((target["ip_address"], command, params))
+        return replies.pop(0)() if replies else {"ok": True}
+
+    monkeypatch.setattr(printer_commands, "send_command", send_command)
+    yield d, add_print, sent, replies
+
+    db.session.execute(text("DELETE FROM scheduled_prints WHERE gcode_id = :id"), {"id": gcode_id})
+    db.session.execute(text("DELETE FROM gcodes WHERE gcode_id = :id"), {"id": gcode_id})
+    db.session.execute(text("DELETE FROM printers WHERE printer_id = :id"), {"id": printer_id})
+    db.session.commit()
+
+
+def status(scheduled_id):
+    from models import db
+    from models.scheduled_print import ScheduledPrint
+
+    db.session.expire_all()
+    return db.session.get(ScheduledPrint, scheduled_id).status
+
+
+def test_claimed_row_is_not_started_twice(dispatcher):
+    from models import db
+    from models.scheduled_print import ScheduledPrint
+
+    d, add_print, sent, _ = dispatcher
+    taken, free = add_print(), add_print()
+    d._queue(d._printer(IP)[0], d.generation)
+    # Another worker claims the head of the queue after it was loaded.
+    ScheduledPrint.query.filter_by(scheduled_id=taken).update({"status": "printing"})
+    db.session.commit()
+
+    d._dispatch(IP, d.generation)
+    assert [params["filename"] for _, _, params in sent] == ["dispatch.gcode"]
+    assert d.running[IP][0] == free
+    assert status(free) == "printing"
+
+
+def test_printing_reported_before_start_returns(dispatcher):
+    d, add_print, sent, replies = dispatcher
+    scheduled_id = add_print()
+
+    def start():
+        # The poller sees the print before the HTTP call returns.
+        d.on_state(IP, "printing")
+        return {"ok": True}
+
+    replies.append(start)
+    d._dispatch(IP, d.generation)
+    assert d.running[IP][::2] == [scheduled_id, True]
+
+    d.on_state(IP, "complete")
+    assert IP not in d.running
+    d._record(d.finished)
+    assert status(scheduled_id) == "done"
+
+
+def test_started_job_records_its_final_state(dispatcher):
+    d, add_print, sent, _ = dispatcher
+    scheduled_id = add_print()
+
+    d._dispatch(IP, d.generation)
+    assert sent == [(IP, "start", {"filename": "dispatch.gcode"})]
+    assert status(scheduled_id) == "printing"
+    assert d.running[IP][::2] == [scheduled_id, False]
+
+    # A final state before the job was seen printing belongs to an earlier print.
+    d.on_state(IP, "complete")
+    assert d.running[IP][0] == scheduled_id
+    d.on_state(IP, "printing")
+    d.on_state(IP, "error")
+    assert d.finished == [(scheduled_id, "failed")]
+    d._record(d.finished)
+    assert status(scheduled_id) == "failed"
+
+
+def test_failed_start_is_released(dispatcher):
+    d, add_print, sent, replies = dispatcher
+    scheduled_id = add_print()
+
+    replies.append(lambda: {"ok": False, "error": "Klippy not ready"})
+    d._dispatch(IP, d.generation)
+    assert IP not in d.running
+    assert IP in d.not_before
+    assert status(scheduled_id) == "pending"
+    assert d._ready() == []
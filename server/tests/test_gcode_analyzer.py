@@ -0,0 +1,65 @@
+"""Extraction and caching in services/gcode_analyzer.py."""
+import json
+import os
+import subprocess
+import sys
+
+from services.gcode_analyzer import AnalysisCache, analyze_file
+
+PROBE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "analyzer_pool_probe.py")
+
+RETRACTING = """\
+; generated by PrusaSlicer 2.7.1+linux-x64 on 2024-05-01 at 10:00:00 UTC
+; filament_type = PETG
+M83
+G1 X10 E2.0 F1200
+G1 E-0.8
+G1 X20
+G1 E0.8
+G1 X30 E2.0
+"""
+
+
+def write(tmp_path, name, text):
+    path = tmp_path / name
+    path.write_text(text)
+    return str(path)
+
+
+def test_retracts_are_not_counted_twice(tmp_path):
+    result = analyze_file(write(tmp_path, "relative.gcode", RETRACTING))
+    assert result["filament_total"] == 4.0
+
+    absolute = "M82\nG1 X10 E2.0 F1200\nG1 E1.2\nG1 X20\nG1 E2.0\nG92 E0\nG1 X30 E2.0\n"
+    assert analyze_file(write(tmp_path, "absolute.gcode", absolute))["filament_total"] == 4.0
+
+
+def test_slicer_from_generator_comment(tmp_path):
+    result = analyze_file(write(tmp_path, "prusa.gcode", RETRACTING))
+    assert result["slicer"].startswith("PrusaSlicer 2.7.1")
+    assert result["material"] == "PETG"
+
+    cura = ";FLAVOR:Marlin\n;Generated with Cura_SteamEngine 5.4.0\nG1 X1 E1\n"
+    assert analyze_file(write(tmp_path, "cura.gcode", cura))["slicer"] == "Cura_SteamEngine 5.4.0"
+    assert analyze_file(write(tmp_path, "plain.gcode", "G1 X1 E1\n"))["slicer"] is None
+
+
+def test_hash_memo_is_bounded(tmp_path):
+    cache = AnalysisCache(max_entries=3)
+    paths = [write(tmp_path, f"{i}.gcode", f"G1 X{i}\n") for i in range(5)]
+    for path in paths:
+        cache.hash_for(path)
+    assert len(cache.hashes) == 3
+    assert [key[0] for key in cache.hashes] == [os.path.abspath(p) for p in paths[2:]]
+
+
+def test_pool_under_eventlet(tmp_path):
+    """The process pool works in a monkey-patched process and does not block its hub."""
+    paths = [write(tmp_path, f"{i}.gcode", RETRACTING * 2000) for i in range(3)]
+    result = subprocess.run([sys.executable, PROBE, *paths], capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+
+    for path in paths:
+        assert report["results"][path]["filament_total"] == 8000.0
+    assert report["ticks"] > 1
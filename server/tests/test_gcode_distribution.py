@@ -0,0 +1,134 @@
+"""Distributions record each placement as its upload succeeds."""
+import io
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+
+class FakeMoonraker(ThreadingHTTPServer):
+    """Accepts /server/files/upload; holds each request until release is set."""
+
+    def __init__(self, host):
+        self.release = threading.Event()
+        self.uploads = 0
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(handler):
+                handler.rfile.read(int(handler.headers["Content-Length"]))
+                self.release.wait(10)
+                self.uploads += 1
+                handler.send_response(201)
+                handler.send_header("Content-Length", "2")
+                handler.end_headers()
+                handler.wfile.write(b"{}")
+
+            def log_message(handler, *args):
+                pass
+
+        super().__init__((host, 0), Handler)
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+
+@pytest.fixture
+def distribution(app, tmp_path):
+    from sqlalchemy import text
+    from models import db
+    from models.gcode_store import GcodeBlob
+    from services.gcode_store import DistributionManager, GcodeStore
+
+    fast, slow = FakeMoonraker("127.0.0.2"), FakeMoonraker("127.0.0.3")
+    fast.release.set()
+    printers, targets = {}, []
+    for name, server in (("fast", fast), ("slow", slow)):
+        ip, port = server.server_address
+        printers[name] = db.session.execute(text("""
+            INSERT INTO printers (ip_address, port, webcam_address, webcam_port, printer_name,
+                                  printer_model, supported_materials, status, heated_chamber, auto_connect)
+            VALUES (:ip, :port, '', 80, :name, 'Voron 2.4', 'PLA', 'disconnected', false, false)
+            RETURNING printer_id
+        """), {"ip": ip, "port": port, "name": name}).scalar()
+        targets.append({"printer_id": printers[name], "ip_address": ip, "port": port})
+
+    store = GcodeStore(str(tmp_path))
+    digest, size = store.ingest(io.BytesIO(b"G1 X1 E1\n" * 1000))
+    blob = GcodeBlob(content_hash=digest, filename="part.gcode", size=size, created_at=datetime.utcnow())
+    db.session.add(blob)
+    db.session.commit()
+
+    yield DistributionManager(app, store), blob, targets, printers, fast, slow
+
+    slow.release.set()
+    for server in (fast, slow):
+        server.shutdown()
+    db.session.execute(text("DELETE FROM printers WHERE printer_id = ANY(:ids)"), {"ids": list(printers.values())})
+    db.session.delete(blob)
+    db.session.commit()
+
+
+def placed(printer_ids):
+    from models import db
+    from models.gcode_store import GcodePlacement
+
+    db.session.expire_all()
+    return sorted(pid for (pid,) in db.session.query(GcodePlacement.printer_id)
+                  .filter(GcodePlacement.printer_id.in_(printer_ids)))
+
+
+def wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.05)
+
+
+def test_placement_recorded_per_upload(distribution):
+    manager, blob, targets, printers, fast, slow = distribution
+    ids = sorted(printers.values())
+
+    first = manager.start(blob, targets, concurrency=2)
+    # The slow printer is still receiving; the fast one is already on record.
+    wait_for(lambda: placed(ids) == [printers["fast"]])
+    assert first.finished_at is None
+
+    # A second distribution meanwhile does not upload to the fast printer again.
+    second = manager.start(blob, targets[:1], concurrency=1)
+    wait_for(lambda: second.finished_at is not None)
+    assert second.to_dict()["printers"][0]["state"] == "skipped"
+    assert fast.uploads == 1
+
+    slow.release.set()
+    wait_for(lambda: first.finished_at is not None)
+    assert placed(ids) == ids
+    assert first.to_dict()["counts"] == {"done": 2}
+
+
+def test_same_name_and_size_is_not_a_placement(distribution, monkeypatch):
+    from flask import Flask
+    from conftest import TEST_DATABASE_URL
+    from models import db
+    from models.gcode_metadata import GcodeMetadataCache
+    from api.gcode import gcode_bp
+    from services import gcode_store
+
+    manager, blob, targets, printers, fast, slow = distribution
+    monkeypatch.setattr(gcode_store, "_manager", manager)
+    # The fast printer lists a different file under the same name and size.
+    db.session.add(GcodeMetadataCache(printer_id=printers["fast"], path=blob.filename, modified=0.0,
+                                      size=blob.size, file_metadata={}, last_used_at=datetime.utcnow()))
+    db.session.commit()
+
+    api = Flask(__name__)
+    api.config["SQLALCHEMY_DATABASE_URI"] = TEST_DATABASE_URL
+    db.init_app(api)
+    api.register_blueprint(gcode_bp)
+    response = api.test_client().post(f"/gcode/store/{blob.content_hash}/distribute",
+                                      json={"printers": [printers["fast"]]})
+    assert response.status_code == 202
+
+    dist = manager.get(response.get_json()["distribution_id"])
+    wait_for(lambda: dist.finished_at is not None)
+    assert dist.to_dict()["counts"] == {"done": 1}
+    assert fast.uploads == 1
@@ -0,0 +1,55 @@
+"""
+A slow query must not freeze the rest of the server (DB_GREEN).
+
+Each case runs tests/green_db_probe.py in its own interpreter: it builds the
+app like server.py, holds one connection in pg_sleep and checks when two
+concurrent requests finish.
+"""
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from conftest import TEST_DATABASE_URL
+
+SLEEP_SECONDS = 3
+PROBE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "green_db_probe.py")
+
+
+def run_probe(tmp_path, db_green):
+    config = tmp_path / "green.conf"
+    config.write_text("\n".join([
+        'HOST = "127.0.0.1"', 'DB_HOST = ""', 'DB_PORT = ""', 'FLASK_PORT = "0"',
+        'DB_NAME = ""', 'DB_USER = ""', 'DB_PASSWORD = ""', 'DEBUG = "False"',
+        f'DB_URI = "{TEST_DATABASE_URL}"',
+        f'DB_GREEN = "{db_green}"',
+    ]))
+    result = subprocess.run([sys.executable, PROBE, str(config), str(SLEEP_SECONDS)],
+                            capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_slow_query_does_not_block_requests(app, tmp_path):
+    report = run_probe(tmp_path, "True")
+
+    # The wait callback is in place before the engine opens any connection.
+    assert report["callback_at_create"]
+    assert report["connections_at_create"] == 0
+    assert report["callbacks_at_connect"] and all(report["callbacks_at_connect"])
+
+    assert report["plain_status"] == 200
+    assert report["db_status"] == 200
+    assert report["plain_done_after"] < 1
+    assert report["db_done_after"] < 1
+    assert report["slow_done_after"] >= SLEEP_SECONDS
+
+
+def test_blocking_driver_freezes_requests(app, tmp_path):
+    """Without DB_GREEN the same requests wait for pg_sleep: the probe can tell the difference."""
+    report = run_probe(tmp_path, "False")
+
+    assert not report["callback_at_create"]
+    assert report["plain_done_after"] >= SLEEP_SECONDS
@@ -0,0 +1,66 @@
+"""
+The simulator answers the HTTP calls the server makes (moonraker_rpc._http_call).
+
+It monkey-patches the interpreter with eventlet on import, so it runs as a
+subprocess on a free loopback port.
+"""
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import pytest
+
+SIMULATOR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "moonraker_simulator.py")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture(scope="module")
+def simulator():
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, SIMULATOR, "--count", "1", "--address", "127.0.0.1", "--port", str(port),
+         "--control-port", str(free_port()), "--seed", "1"],
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+    )
+    deadline = time.monotonic() + 10
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            break
+        except OSError:
+            assert process.poll() is None, process.stderr.read().decode()
+            assert time.monotonic() < deadline, "simulator did not start"
+            time.sleep(0.05)
+    yield "127.0.0.1", port
+    process.terminate()
+    process.wait(5)
+
+
+def test_post_takes_json_params(simulator):
+    from services.moonraker_rpc import _http_call
+
+    ip, port = simulator
+    assert _http_call(ip, port, "printer.print.start", {"filename": "clip_ASA.gcode"}, 5) == "ok"
+    status = _http_call(ip, port, "printer.objects.query", {"objects": {"print_stats": None}}, 5)["status"]
+    assert status["print_stats"]["state"] == "printing"
+    assert status["print_stats"]["filename"] == "clip_ASA.gcode"
+    assert _http_call(ip, port, "printer.print.cancel", {}, 5) == "ok"
+
+
+def test_query_selects_fields(simulator):
+    from services.moonraker_rpc import _http_call
+
+    ip, port = simulator
+    objects = {"extruder": ["temperature", "target"], "print_stats": ["state"], "toolhead": None}
+    status = _http_call(ip, port, "printer.objects.query", {"objects": objects}, 5)["status"]
+    assert set(status) == set(objects)
+    assert set(status["extruder"]) == {"temperature", "target"}
+    assert set(status["print_stats"]) == {"state"}
+    assert "homed_axes" in status["toolhead"]
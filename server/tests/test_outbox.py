@@ -0,0 +1,82 @@
+"""Backpressure in services/outbox.py when engine.io's queue can or cannot be read."""
+import queue
+from types import SimpleNamespace
+
+from services import outbox as outbox_module
+from services.outbox import FALLBACK_BYTES_PER_SECOND, ClientBuffer, _queued_packets
+
+
+def fake_socketio(sockets):
+    def get_socket(eio_sid):
+        if eio_sid not in sockets:
+            raise KeyError("Session not found")
+        return sockets[eio_sid]
+
+    manager = SimpleNamespace(eio_sid_from_sid=lambda sid, namespace: f"eio-{sid}" if sid != "unknown" else None)
+    return SimpleNamespace(server=SimpleNamespace(manager=manager, eio=SimpleNamespace(_get_socket=get_socket)))
+
+
+def test_queue_depth(monkeypatch):
+    monkeypatch.setattr(outbox_module, "_queue_unavailable", False)
+    packets = queue.Queue()
+    for _ in range(3):
+        packets.put(object())
+    socketio = fake_socketio({"eio-a": SimpleNamespace(queue=packets)})
+
+    assert _queued_packets(socketio, "a") == 3
+    # Clients that already disconnected have nothing queued.
+    assert _queued_packets(socketio, "b") == 0
+    assert _queued_packets(socketio, "unknown") == 0
+    assert not outbox_module._queue_unavailable
+
+
+def test_changed_engineio_api_falls_back(monkeypatch, capsys):
+    monkeypatch.setattr(outbox_module, "_queue_unavailable", False)
+    socketio = fake_socketio({"eio-a": SimpleNamespace(), "eio-b": SimpleNamespace()})
+
+    assert _queued_packets(socketio, "a") is None
+    assert _queued_packets(socketio, "b") is None
+    assert capsys.readouterr().out.count("send queue not available") == 1
+    assert outbox_module.Outbox().stats()["backpressure"] == "rate"
+
+
+def test_rate_budget():
+    buffer = ClientBuffer()
+    assert not buffer.over_budget(100.0)
+    buffer.window_bytes += FALLBACK_BYTES_PER_SECOND
+    assert buffer.over_budget(100.5)
+    assert not buffer.over_budget(101.0)
+
+
+def test_shared_payload_is_emitted_once(monkeypatch):
+    import threading
+    import time
+    import extensions
+
+    monkeypatch.setattr(outbox_module, "_queue_unavailable", False)
+    emitted, done = [], threading.Event()
+    sockets = {f"eio-{sid}": SimpleNamespace(queue=queue.Queue()) for sid in ("a", "b", "c", "d")}
+    socketio = fake_socketio(sockets)
+
+    def emit(event, data, room=None):
+        emitted.append((event, str(data), sorted(room)))
+        if len(emitted) == 2:
+            done.set()
+
+    socketio.emit = emit
+    monkeypatch.setattr(extensions, "socketio", socketio)
+
+    box = outbox_module.Outbox()
+    for sid in ("a", "b", "c"):
+        box.join(sid, "10.0.0.1")
+    box.join("d", "10.0.0.2")
+    box.publish("10.0.0.1", "printer_update", {"n": 1})
+    box.publish("10.0.0.2", "printer_update", {"n": 2})
+
+    assert done.wait(5)
+    assert sorted(emitted) == [("printer_update", '{"n": 1}', ["a", "b", "c"]),
+                               ("printer_update", '{"n": 2}', ["d"])]
+    deadline = time.monotonic() + 5
+    while box.stats()["delivered"] < 4 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert box.stats()["delivered"] == 4
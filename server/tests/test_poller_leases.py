@@ -0,0 +1,116 @@
+"""Lease claims, fair share and failover between scale-out workers (services/poller_leases.py)."""
+import threading
+import time
+
+import pytest
+
+PRINTERS = 4
+
+
+@pytest.fixture
+def printers(app):
+    from sqlalchemy import text
+    from models import db
+
+    ids = [
+        db.session.execute(text("""
+            INSERT INTO printers (ip_address, port, webcam_address, webcam_port, printer_name,
+                                  printer_model, supported_materials, status, heated_chamber, auto_connect)
+            VALUES (:ip, 7125, '', 80, :name, 'Voron 2.4', 'PLA', 'disconnected', false, true)
+            RETURNING printer_id
+        """), {"ip": f"192.0.2.{100 + i}", "name": f"leased-{i}"}).scalar()
+        for i in range(PRINTERS)
+    ]
+    db.session.commit()
+    yield ids
+    db.session.execute(text("DELETE FROM poller_leases"))
+    db.session.execute(text("DELETE FROM poller_workers"))
+    db.session.execute(text("DELETE FROM printers WHERE printer_id = ANY(:ids)"), {"ids": ids})
+    db.session.commit()
+
+
+def manager(app, name, lease_ttl=10):
+    from services.poller_leases import PollerLeaseManager
+
+    return PollerLeaseManager(app, worker_id=name, lease_ttl=lease_ttl, heartbeat_interval=0.1)
+
+
+def beat(manager):
+    """One heartbeat, applied to manager.owned as _reconcile would, without starting pollers."""
+    acquired, lost = manager.heartbeat()
+    for printer_id in lost:
+        manager.owned.pop(printer_id, None)
+    for printer in acquired:
+        manager.owned[printer.printer_id] = printer.ip_address
+    return {p.printer_id for p in acquired}, lost
+
+
+def owners():
+    from models import db
+    from models.poller_lease import PollerLease
+
+    db.session.expire_all()
+    return {lease.printer_id: lease.owner for lease in PollerLease.query.all()}
+
+
+def test_one_claimant_wins(app, printers):
+    first, second = manager(app, "first"), manager(app, "second")
+    barrier = threading.Barrier(2)
+    won = {}
+
+    def claim(m):
+        from models import db
+
+        with app.app_context():
+            barrier.wait()
+            won[m.worker_id] = m._claim(printers)
+            db.session.commit()
+
+    threads = [threading.Thread(target=claim, args=(m,)) for m in (first, second)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert sorted(won["first"] | won["second"]) == sorted(printers)
+    assert not won["first"] & won["second"]
+    assert set(owners().values()) <= {"first", "second"}
+
+
+def test_fair_share(app, printers):
+    first, second = manager(app, "first"), manager(app, "second")
+
+    assert beat(first)[0] == set(printers)
+    # Live leases are never taken over: the newcomer waits for a release.
+    assert beat(second) == (set(), set())
+    acquired, lost = beat(first)
+    assert not acquired and len(lost) == PRINTERS // 2
+    assert beat(second)[0] == lost
+
+    held = owners()
+    assert sorted(held) == sorted(printers)
+    assert list(held.values()).count("first") == list(held.values()).count("second") == PRINTERS // 2
+
+
+def test_expired_lease_is_taken_over(app, printers):
+    dead, survivor = manager(app, "dead", lease_ttl=1), manager(app, "survivor", lease_ttl=1)
+    assert beat(dead)[0] == set(printers)
+    assert beat(survivor)[0] == set()
+
+    time.sleep(1.5)  # "dead" stops heartbeating; its leases run out
+    assert beat(survivor)[0] == set(printers)
+    assert set(owners().values()) == {"survivor"}
+    # The old owner learns it lost them on its next round.
+    assert beat(dead)[1] == set(printers)
+
+
+def test_stop_hands_leases_back(app, printers):
+    from models.poller_lease import PollerWorker
+
+    leaving, staying = manager(app, "leaving"), manager(app, "staying")
+    beat(leaving)
+    leaving.stop()
+    assert owners() == {}
+    assert PollerWorker.query.filter_by(worker_id="leaving").count() == 0
+    # Released leases can be claimed right away, without waiting for the ttl.
+    assert beat(staying)[0] == set(printers)
@@ -0,0 +1,82 @@
+"""POST /printers/commands: target selection, limits and streaming."""
+import threading
+
+import pytest
+
+from conftest import TEST_DATABASE_URL
+
+
+@pytest.fixture
+def commands(app, monkeypatch):
+    """(test client, pool, calls): fan_out is stubbed and records its arguments."""
+    from flask import Flask
+    from sqlalchemy import text
+    from models import db
+    from api.printers import printer_bp
+    from services import printer_commands
+
+    api = Flask(__name__)
+    api.config["SQLALCHEMY_DATABASE_URI"] = TEST_DATABASE_URL
+    db.init_app(api)
+    api.register_blueprint(printer_bp)
+    with api.app_context():
+        pool = db.engine.pool
+
+    ids = [
+        db.session.execute(text("""
+            INSERT INTO printers (ip_address, port, webcam_address, webcam_port, printer_name,
+                                  printer_model, supported_materials, status, heated_chamber, auto_connect)
+            VALUES (:ip, 7125, '', 80, :name, 'Voron 2.4', 'PLA', 'standby', false, false)
+            RETURNING printer_id
+        """), {"ip": f"192.0.2.{40 + i}", "name": f"commands-{i}"}).scalar()
+        for i in range(2)
+    ]
+    db.session.commit()
+
+    calls, release = [], threading.Event()
+
+    def fan_out(targets, command, params, timeout, max_workers):
+        calls.append({"targets": targets, "timeout": timeout})
+        for i, target in enumerate(targets):
+            if i:  # the first printer answers at once, the rest wait for release
+                release.wait(5)
+            yield {"printer_id": target["printer_id"], "ip_address": target["ip_address"], "ok": True}
+
+    monkeypatch.setattr(printer_commands, "fan_out", fan_out)
+    yield api.test_client(), pool, calls, release, ids
+    release.set()
+    db.session.execute(text("DELETE FROM printers WHERE printer_id = ANY(:ids)"), {"ids": ids})
+    db.session.commit()
+
+
+def test_timeout_is_clamped(commands):
+    from services.printer_commands import MAX_TIMEOUT, MIN_TIMEOUT
+
+    client, _, calls, release, ids = commands
+    release.set()
+    for asked, used in [(-5, MIN_TIMEOUT), (0, MIN_TIMEOUT), (10, 10), (1000, MAX_TIMEOUT)]:
+        response = client.post("/printers/commands", json={"command": "pause", "printers": ids, "timeout": asked})
+        assert response.status_code == 200
+        assert calls[-1]["timeout"] == used
+
+
+def test_booleans_are_not_printer_ids(commands):
+    client, _, calls, release, ids = commands
+    response = client.post("/printers/commands", json={"command": "pause", "printers": [ids[0], True]})
+    assert response.status_code == 404
+    assert not calls
+
+
+def test_stream_holds_no_connection(commands):
+    client, pool, calls, release, ids = commands
+    response = client.post("/printers/commands", json={"command": "pause", "printers": ids, "stream": True},
+                           buffered=False)
+    assert response.status_code == 200
+    lines = iter(response.response)
+    next(lines)
+    # The fan-out is still waiting on the second printer, and no connection is held for it.
+    assert pool.checkedout() == 0
+    release.set()
+    assert len(list(lines)) == 1
+    assert pool.checkedout() == 0
+    response.close()
@@ -0,0 +1,39 @@
+"""Request profiling: SQL statement timing."""
+import pytest
+
+from conftest import TEST_DATABASE_URL
+
+
+@pytest.fixture
+def client(app):
+    from flask import Flask, jsonify
+    from sqlalchemy import text
+    from sqlalchemy.exc import ProgrammingError
+    from models import db
+    from services.profiling import install
+
+    api = Flask(__name__)
+    api.config["SQLALCHEMY_DATABASE_URI"] = TEST_DATABASE_URL
+    db.init_app(api)
+    install(api, db)
+
+    @api.route("/failing")
+    def failing():
+        for _ in range(3):
+            try:
+                db.session.execute(text("SELECT * FROM no_such_table"))
+            except ProgrammingError:
+                db.session.rollback()
+        db.session.execute(text("SELECT 1"))
+        info = db.session.connection().info
+        return jsonify(sorted(k for k in info if k.startswith("_profile")))
+
+    return api.test_client()
+
+
+def test_failed_statements_leave_nothing_behind(client):
+    response = client.get("/failing")
+    assert response.status_code == 200
+    assert response.get_json() == []
+    # Only the statement that completed is counted.
+    assert response.headers["X-SQL-Count"] == "1"
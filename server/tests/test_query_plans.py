@@ -0,0 +1,236 @@
+"""
+The hot API lookups must be served by an index, not a sequential scan.
+
+The schema is seeded with a synthetic farm large enough that PostgreSQL's
+planner prefers an index whenever a usable one exists, then each query the
+API actually issues is run through EXPLAIN and its plan checked.
+"""
+import importlib.util
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+from conftest import SERVER_DIR
+
+PRINTERS = 200
+GCODES_PER_PRINTER = 500
+PRODUCTS = 5000
+COMPONENTS_PER_PRODUCT = 10
+SCHEDULED_PRINTS = 200000
+
+INDEX_SCANS = ("Index Scan", "Index Only Scan", "Bitmap Index Scan")
+
+SEED = [
+    # Ids below assume fresh sequences, whatever earlier tests left behind.
+    "TRUNCATE printers, gcodes, products, scheduled_prints, spools RESTART IDENTITY CASCADE",
+    f"""
+    INSERT INTO printers (ip_address, port, webcam_address, webcam_port, printer_name,
+                          printer_model, supported_materials, status, heated_chamber, auto_connect)
+    SELECT '10.0.' || (i / 256) || '.' || (i % 256), 7125, '/webcam/?action=snapshot', 80,
+           'printer-' || i, 'Voron 2.4', 'PLA,PETG', 'disconnected', false, false
+    FROM generate_series(1, {PRINTERS}) AS i
+    """,
+    f"""
+    INSERT INTO gcodes (printer_id, gcode_name, estimated_print_time, material)
+    SELECT p, 'part-' || g || '.gcode', make_interval(mins => 30 + g % 240), 'PLA'
+    FROM generate_series(1, {PRINTERS}) AS p, generate_series(1, {GCODES_PER_PRINTER}) AS g
+    """,
+    f"""
+    INSERT INTO products (product_name, due_date)
+    SELECT 'product-' || i, now() + make_interval(days => i % 30)
+    FROM generate_series(1, {PRODUCTS}) AS i
+    """,
+    f"""
+    INSERT INTO product_components (product_id, component_name, required_material)
+    SELECT p, 'component-' || c, 'PLA'
+    FROM generate_series(1, {PRODUCTS}) AS p, generate_series(1, {COMPONENTS_PER_PRODUCT}) AS c
+    """,
+    """
+    INSERT INTO component_gcode_association (product_component_id, gcode_id)
+    SELECT id, 1 + (id * 7919) % (SELECT count(*) FROM gcodes) FROM product_components
+    """,
+    # Mostly finished history with a thin band of pending work, like a real farm.
+    f"""
+    INSERT INTO scheduled_prints (deadline, gcode_id, assigned_printer_id, scheduled_start_time,
+                                  status, product_id, created_at)
+    SELECT start + interval '1 day', 1 + i % ({PRINTERS} * {GCODES_PER_PRINTER}), 1 + i % {PRINTERS},
+           start, CASE WHEN i % 100 = 0 THEN 'pending' ELSE 'done' END,
+           1 + i % {PRODUCTS}, start - interval '1 hour'
+    FROM (SELECT i, now() - make_interval(mins => 10 * ({SCHEDULED_PRINTS} - i)) AS start
+          FROM generate_series(1, {SCHEDULED_PRINTS}) AS i) AS s
+    """,
+    # A handful of multi-day outliers among the estimates, one of them printing now.
+    f"""
+    UPDATE gcodes SET estimated_print_time = interval '5 days'
+    WHERE gcode_id % ({PRINTERS} * {GCODES_PER_PRINTER} / 10) = 0
+    """,
+    f"""
+    INSERT INTO scheduled_prints (deadline, gcode_id, assigned_printer_id, scheduled_start_time, status)
+    VALUES (now() + interval '4 days', {PRINTERS} * {GCODES_PER_PRINTER} / 10, 1, now() - interval '2 days', 'printing')
+    """,
+]
+
+
+@pytest.fixture(scope="module")
+def farm(app):
+    from sqlalchemy import text
+    from models import db
+
+    for statement in SEED:
+        db.session.execute(text(statement))
+    db.session.commit()
+    db.session.execute(text("ANALYZE"))
+    db.session.commit()
+    return app
+
+
+def explain(statement):
+    """EXPLAIN (FORMAT JSON) for a SQLAlchemy statement; returns the root plan node."""
+    from models import db
+
+    compiled = statement.compile(dialect=db.engine.dialect)
+    result = db.session.connection().exec_driver_sql("EXPLAIN (FORMAT JSON) " + str(compiled), compiled.params)
+    return result.scalar()[0]["Plan"]
+
+
+def plan_nodes(node):
+    yield node
+    for child in node.get("Plans", ()):
+        yield from plan_nodes(child)
+
+
+def assert_index_scan(statement, table, index):
+    nodes = list(plan_nodes(explain(statement)))
+    seq_scans = [n for n in nodes if n["Node Type"] == "Seq Scan" and n.get("Relation Name") == table]
+    assert not seq_scans, f"sequential scan on {table}: {nodes}"
+    assert any(n["Node Type"] in INDEX_SCANS and n.get("Index Name") == index for n in nodes), \
+        f"{index} not used: {nodes}"
+
+
+def test_gcodes_by_printer(farm):
+    # api/gcode.py: Gcode.query.filter_by(printer_id=...)
+    from models.gcode import Gcode
+
+    statement = Gcode.query.filter_by(printer_id=PRINTERS // 2).statement
+    assert_index_scan(statement, "gcodes", "ix_gcodes_printer_id_gcode_name")
+
+
+def test_pending_queue_of_printer(farm):
+    # services/dispatcher.py: a printer's pending jobs with their gcode names
+    from models import db
+    from models.gcode import Gcode
+    from models.scheduled_print import ScheduledPrint
+
+    statement = (
+        db.session.query(ScheduledPrint.scheduled_start_time, ScheduledPrint.deadline,
+                         ScheduledPrint.scheduled_id, Gcode.gcode_name)
+        .join(Gcode, Gcode.gcode_id == ScheduledPrint.gcode_id)
+        .filter(ScheduledPrint.assigned_printer_id == PRINTERS // 2,
+                ScheduledPrint.status == "pending",
+                ScheduledPrint.scheduled_start_time.isnot(None))
+        .statement
+    )
+    nodes = list(plan_nodes(explain(statement)))
+    assert not [n for n in nodes if n["Node Type"] == "Seq Scan"], nodes
+    assert any(n.get("Index Name") in ("ix_scheduled_prints_printer_start", "ix_scheduled_prints_status_start")
+               for n in nodes), nodes
+
+
+def test_pending_window(farm):
+    from models.scheduled_print import ScheduledPrint
+
+    now = datetime.now()
+    statement = (
+        ScheduledPrint.query
+        .filter(ScheduledPrint.status == "pending",
+                ScheduledPrint.scheduled_start_time >= now - timedelta(days=1),
+                ScheduledPrint.scheduled_start_time < now)
+        .order_by(ScheduledPrint.scheduled_start_time)
+        .statement
+    )
+    assert_index_scan(statement, "scheduled_prints", "ix_scheduled_prints_status_start")
+
+
+def test_scheduled_prints_by_product(farm):
+    from models.scheduled_print import ScheduledPrint
+
+    statement = ScheduledPrint.query.filter_by(product_id=PRODUCTS // 2).statement
+    assert_index_scan(statement, "scheduled_prints", "ix_scheduled_prints_product_id")
+
+
+def test_components_of_product(farm):
+    # Product.components, loaded by GET /products and the analysis endpoint
+    from models.product import ProductComponent
+
+    statement = ProductComponent.query.filter(ProductComponent.product_id == PRODUCTS // 2).statement
+    assert_index_scan(statement, "product_components", "ix_product_components_product_id")
+
+
+def test_components_using_gcode(farm):
+    # The reverse side of component_gcode_association: gcode.product_components
+    from models.gcode import Gcode
+
+    gcode = Gcode.query.get(PRINTERS * GCODES_PER_PRINTER // 2)
+    assert_index_scan(gcode.product_components.statement, "component_gcode_association",
+                      "ix_component_gcode_association_gcode_id")
+
+
+def test_timeline_window(farm):
+    # api/scheduled_print.py: /scheduled_prints/timeline without a printers filter
+    from api.scheduled_print import timeline_query
+
+    now = datetime.now()
+    nodes = list(plan_nodes(explain(timeline_query(now - timedelta(hours=6), now).statement)))
+    scanned = {n.get("Relation Name") for n in nodes if n["Node Type"] == "Seq Scan"}
+    assert not scanned & {"scheduled_prints", "gcodes"}, nodes
+
+
+def test_longest_estimate(farm):
+    from sqlalchemy import func
+    from models import db
+    from models.gcode import Gcode
+
+    statement = db.session.query(func.max(Gcode.estimated_print_time)).statement
+    assert_index_scan(statement, "gcodes", "ix_gcodes_estimated_print_time")
+
+
+def test_timeline_matches_full_scan(farm):
+    """Splitting off the long prints finds exactly what a plain overlap test does."""
+    from sqlalchemy import text
+    from models import db
+    from api.scheduled_print import timeline_query
+
+    now = datetime.now()
+    for window_start, window_end in [(now - timedelta(hours=6), now),
+                                     (now - timedelta(days=3), now - timedelta(days=2, hours=20))]:
+        expected = db.session.execute(text("""
+            SELECT sp.scheduled_id FROM scheduled_prints sp JOIN gcodes g ON g.gcode_id = sp.gcode_id
+            WHERE sp.assigned_printer_id IS NOT NULL
+              AND sp.scheduled_start_time < :window_end
+              AND sp.scheduled_start_time + coalesce(g.estimated_print_time, interval '0') > :window_start
+        """), {"window_start": window_start, "window_end": window_end}).scalars().all()
+        found = timeline_query(window_start, window_end).all()
+        assert sorted(row.scheduled_id for row in found) == sorted(expected)
+        # The first window is overlapped by the print started two days ago.
+        assert window_end < now or any(row.end_time - row.scheduled_start_time > timedelta(days=1)
+                                       for row in found)
+
+
+@pytest.mark.parametrize("migration_file", ["current_models_010.py", "current_models_019.py"])
+def test_migration_matches_models(migration_file):
+    """The indexes an index migration creates are the ones the models declare (and create_all builds)."""
+    from models import db
+
+    path = os.path.join(SERVER_DIR, "migrations", "versions", migration_file)
+    spec = importlib.util.spec_from_file_location(migration_file[:-3], path)
+    migration = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(migration)
+
+    declared = {
+        index.name: (table.name, [column.name for column in index.columns])
+        for table in db.metadata.tables.values()
+        for index in table.indexes
+    }
+    for name, table, columns in migration.INDEXES:
+        assert declared.get(name) == (table, columns), name
@@ -0,0 +1,118 @@
+"""Bulk create and update of scheduled prints (/scheduled_prints/bulk)."""
+from datetime import datetime
+
+import pytest
+
+from conftest import TEST_DATABASE_URL
+
+
+@pytest.fixture
+def client(app):
+    from flask import Flask
+    from sqlalchemy import text
+    from models import db
+    from api.scheduled_print import scheduled_print_bp
+
+    api = Flask(__name__)
+    api.config["SQLALCHEMY_DATABASE_URI"] = TEST_DATABASE_URL
+    db.init_app(api)
+    api.register_blueprint(scheduled_print_bp)
+
+    printer_id = db.session.execute(text("""
+        INSERT INTO printers (ip_address, port, webcam_address, webcam_port, printer_name,
+                              printer_model, supported_materials, status, heated_chamber, auto_connect)
+        VALUES ('192.0.2.50', 7125, '', 80, 'bulk', 'Voron 2.4', 'PLA', 'disconnected', false, false)
+        RETURNING printer_id
+    """)).scalar()
+    gcode_id = db.session.execute(text("""
+        INSERT INTO gcodes (printer_id, gcode_name, estimated_print_time, material)
+        VALUES (:printer_id, 'bulk.gcode', interval '1 hour', 'PLA') RETURNING gcode_id
+    """), {"printer_id": printer_id}).scalar()
+    db.session.commit()
+    yield api.test_client(), gcode_id
+
+    db.session.execute(text("DELETE FROM scheduled_prints WHERE gcode_id = :id"), {"id": gcode_id})
+    db.session.execute(text("DELETE FROM gcodes WHERE gcode_id = :id"), {"id": gcode_id})
+    db.session.execute(text("DELETE FROM printers WHERE printer_id = :id"), {"id": printer_id})
+    db.session.commit()
+
+
+def add_print(gcode_id, status, started_at=None):
+    from models import db
+    from models.scheduled_print import ScheduledPrint
+
+    row = ScheduledPrint(deadline=datetime(2030, 1, 1), gcode_id=gcode_id, status=status, started_at=started_at)
+    db.session.add(row)
+    db.session.commit()
+    return row.scheduled_id
+
+
+def test_resending_a_status_keeps_its_timestamp(client):
+    from models import db
+    from models.scheduled_print import ScheduledPrint
+
+    client, gcode_id = client
+    earlier = datetime(2025, 1, 1, 12, 0)
+    already = add_print(gcode_id, "printing", started_at=earlier)
+    pending = add_print(gcode_id, "pending")
+
+    response = client.patch("/scheduled_prints/bulk", json={"ids": [already, pending], "status": "printing"})
+    assert response.status_code == 200, response.get_json()
+    assert response.get_json()["statements"] == 1
+
+    db.session.expire_all()
+    rows = {r.scheduled_id: r for r in ScheduledPrint.query.filter(
+        ScheduledPrint.scheduled_id.in_([already, pending]))}
+    assert rows[already].status == rows[pending].status == "printing"
+    assert rows[already].started_at == earlier
+    assert rows[pending].started_at is not None and rows[pending].started_at > earlier
+
+
+def test_bulk_create_matches_rows_to_items(client):
+    from models import db
+    from models.scheduled_print import ScheduledPrint
+
+    client, gcode_id = client
+    statuses = ["pending", "printing", "done", "pending", "failed", "queued"]
+    items = [
+        {"deadline": f"2030-01-0{i + 1}T00:00:00", "gcode_id": gcode_id, "status": status,
+         "scheduled_start_time": f"2029-12-31T0{i}:30:00" if i % 2 else None}
+        for i, status in enumerate(statuses)
+    ]
+
+    response = client.post("/scheduled_prints/bulk", json={"items": items})
+    assert response.status_code == 201, response.get_json()
+    body = response.get_json()
+    assert body["created"] == len(items)
+
+    created = [r["scheduled_print"] for r in body["results"]]
+    assert [r["index"] for r in body["results"]] == list(range(len(items)))
+    for item, row in zip(items, created):
+        assert row["deadline"] == item["deadline"]
+        assert row["status"] == item["status"]
+        assert row["scheduled_start_time"] == item["scheduled_start_time"]
+
+    ids = [row["scheduled_id"] for row in created]
+    assert len(set(ids)) == len(ids)
+    db.session.expire_all()
+    stored = {r.scheduled_id: r for r in ScheduledPrint.query.filter(ScheduledPrint.scheduled_id.in_(ids))}
+    assert {sid: stored[sid].deadline.isoformat() for sid in ids} == \
+        {row["scheduled_id"]: row["deadline"] for row in created}
+
+    # The ids came from the column's sequence, so ordinary inserts carry on after them.
+    later = add_print(gcode_id, "pending")
+    assert later > max(ids)
+
+
+def test_bulk_create_is_all_or_nothing(client):
+    from models.scheduled_print import ScheduledPrint
+
+    client, gcode_id = client
+    before = ScheduledPrint.query.count()
+    response = client.post("/scheduled_prints/bulk", json={"items": [
+        {"deadline": "2030-01-01T00:00:00", "gcode_id": gcode_id},
+        {"deadline": "2030-01-01T00:00:00", "gcode_id": gcode_id + 1000},
+    ]})
+    assert response.status_code == 400
+    assert [r["ok"] for r in response.get_json()["results"]] == [True, False]
+    assert ScheduledPrint.query.count() == before
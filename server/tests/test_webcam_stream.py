@@ -0,0 +1,89 @@
+"""An open MJPEG stream must not hold a pooled database connection."""
+import io
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from conftest import TEST_DATABASE_URL
+
+
+def jpeg():
+    """A noisy VGA frame, about the size a real camera sends."""
+    from PIL import Image
+
+    out = io.BytesIO()
+    Image.frombytes("RGB", (640, 480), os.urandom(640 * 480 * 3)).save(out, "JPEG", quality=90)
+    return out.getvalue()
+
+
+class FakeCamera(ThreadingHTTPServer):
+    """An endless mjpg-streamer style multipart stream."""
+
+    daemon_threads = True
+
+    def __init__(self):
+        frame = jpeg()
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(handler):
+                handler.send_response(200)
+                handler.send_header("Content-Type", "multipart/x-mixed-replace; boundary=frame")
+                handler.end_headers()
+                try:
+                    while True:
+                        handler.wfile.write(b"--frame\r\nContent-Type: image/jpeg\r\n\r\n" + frame + b"\r\n")
+                        time.sleep(0.05)
+                except OSError:
+                    pass
+
+            def log_message(handler, *args):
+                pass
+
+        super().__init__(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+
+@pytest.fixture
+def camera_client(app):
+    from flask import Flask
+    from sqlalchemy import text
+    from models import db
+    from api.printers import printer_bp
+
+    camera = FakeCamera()
+    api = Flask(__name__)
+    api.config["SQLALCHEMY_DATABASE_URI"] = TEST_DATABASE_URL
+    db.init_app(api)
+    api.register_blueprint(printer_bp)
+
+    db.session.execute(text("""
+        INSERT INTO printers (ip_address, port, webcam_address, webcam_port, printer_name, printer_model,
+                              supported_materials, status, heated_chamber, auto_connect, camera_scaling_factor)
+        VALUES ('192.0.2.34', 7125, :url, 80, 'camera', 'Voron 2.4', 'PLA', 'disconnected', false, false, 2)
+    """), {"url": f"http://127.0.0.1:{camera.server_address[1]}/stream"})
+    db.session.commit()
+    yield api
+    camera.shutdown()
+    db.session.execute(text("DELETE FROM printers WHERE ip_address = '192.0.2.34'"))
+    db.session.commit()
+
+
+def test_stream_holds_no_connection(camera_client):
+    from models import db
+
+    with camera_client.app_context():
+        pool = db.engine.pool
+    client = camera_client.test_client()
+    response = client.get("/printers/192.0.2.34/webcam", buffered=False)
+    assert response.status_code == 200
+    parts = iter(response.response)
+    assert next(parts).startswith(b"--")
+
+    # Mid-stream: the lookup's connection is back in the pool.
+    assert pool.checkedout() == 0
+    next(parts)
+    assert pool.checkedout() == 0
+    response.close()